@@ -0,0 +1,74 @@
+# ==============================================
+# BOT SETTINGS
+# ==============================================
+# The admin-editable settings (/setsetting) as an immutable snapshot. It is
+# loaded once at startup and replaced only when a setting changes (see
+# config_sync.py), so handlers read settings without touching the database.
+# The values in config.py are the defaults the settings table is seeded with.
+from dataclasses import dataclass
+
+import config
+
+# Editable keys, in /viewsettings order: key -> (group, description)
+SETTING_KEYS = {
+    'upi_id': ("Payment Settings", "UPI payment ID"),
+    'binance_id': ("Payment Settings", "Binance Pay ID"),
+    'paypal_email': ("Payment Settings", "PayPal email"),
+    'admin_username': ("Admin Settings", "Admin username"),
+    'tutorial_link': ("Admin Settings", "Tutorial URL"),
+    'start_image_url': ("Images", "/start image (URL or file_id)"),
+    'premium_image_url': ("Images", "Plans image (URL or file_id)"),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    upi_id: str
+    binance_id: str
+    paypal_email: str
+    admin_username: str
+    tutorial_link: str
+    start_image_url: str
+    premium_image_url: str
+
+    @classmethod
+    def defaults(cls) -> "Settings":
+        """Settings from config.py / the environment."""
+        return cls(
+            upi_id=config.UPI_ID,
+            binance_id=config.BINANCE_ID,
+            paypal_email=config.PAYPAL_EMAIL,
+            admin_username=config.ADMIN_USERNAME,
+            tutorial_link=config.TUTORIAL_LINK,
+            start_image_url=config.START_IMAGE_URL,
+            premium_image_url=config.PREMIUM_IMAGE_URL,
+        )
+
+    @classmethod
+    def from_rows(cls, rows: dict) -> "Settings":
+        """Build from settings table rows, falling back to the defaults."""
+        defaults = cls.defaults()
+        return cls(**{key: rows.get(key, getattr(defaults, key)) for key in SETTING_KEYS})
+
+    def get(self, key: str) -> str:
+        """Value of an editable setting by its key."""
+        return getattr(self, key)
+
+    @property
+    def admin_url(self) -> str:
+        """Link to the admin's Telegram chat."""
+        return f"https://t.me/{self.admin_username}"
+
+
+_current = Settings.defaults()
+
+
+def current() -> Settings:
+    """The settings in use."""
+    return _current
+
+
+def swap(settings: Settings):
+    """Make a freshly loaded snapshot the current one."""
+    global _current
+    _current = settings
@@ -0,0 +1,90 @@
+"""Benchmark UPI QR rendering.
+
+Measures raw renders/sec, renders/sec through the process pool, and the
+latency the QR adds to the UPI payment screen with a warm cache (prices
+prerendered at startup) and a cold cache (every request renders). The cold
+cache is also measured rendering inline on the event loop, which is what
+the process pool avoids: throughput is about the same, but an inline render
+stalls every other update for the whole render.
+
+Usage: python bench_qr.py [renders]
+"""
+import asyncio
+import sys
+import time
+
+import qr_service
+
+UPI_ID = "bench@upi"
+PRICES = [120, 199, 249, 299, 349, 399, 499, 699, 799, 899, 999, 1499]
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct))]
+
+
+def bench_inline(renders: int):
+    start = time.perf_counter()
+    for i in range(renders):
+        qr_service.render_png(qr_service.build_upi_string(UPI_ID, 100 + i))
+    elapsed = time.perf_counter() - start
+    print(f"inline render:       {renders / elapsed:8.1f} renders/sec")
+
+
+async def bench_pool(renders: int):
+    start = time.perf_counter()
+    await asyncio.gather(*(qr_service.get_qr(UPI_ID, 10000 + i) for i in range(renders)))
+    elapsed = time.perf_counter() - start
+    print(f"process pool render: {renders / elapsed:8.1f} renders/sec")
+
+
+async def render_inline(upi_id: str, amount: int) -> bytes:
+    return qr_service.render_png(qr_service.build_upi_string(upi_id, amount))
+
+
+async def screen_latency(label: str, amounts, get_qr=qr_service.get_qr):
+    """Time spent waiting for the QR per UPI screen, plus event loop stalls."""
+    samples = []
+    stalls = []
+
+    async def ticker():
+        # Measures how late the loop runs a 1ms sleep while QRs are rendered
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - t - 0.001)
+
+    tick = asyncio.create_task(ticker())
+    for amount in amounts:
+        t = time.perf_counter()
+        await get_qr(UPI_ID, amount)
+        samples.append(time.perf_counter() - t)
+        await asyncio.sleep(0)  # Other updates get their turn between screens
+    tick.cancel()
+
+    print(
+        f"{label:<20} p50 {percentile(samples, 0.5) * 1000:7.2f} ms"
+        f"  p99 {percentile(samples, 0.99) * 1000:7.2f} ms"
+        f"  loop stall p99 {percentile(stalls, 0.99) * 1000:6.2f} ms"
+    )
+
+
+async def main(renders: int):
+    qr_service.start()
+    try:
+        bench_inline(renders)
+        await bench_pool(renders)
+
+        await qr_service.prerender(PRICES, UPI_ID)
+        await screen_latency("UPI screen (warm):", [PRICES[i % len(PRICES)] for i in range(renders)])
+        await screen_latency("UPI screen (cold):", [20000 + i for i in range(renders)])
+        await screen_latency("inline (cold):", [30000 + i for i in range(renders)], render_inline)
+    finally:
+        qr_service.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -1,1209 +1,2927 @@
-import io
-import logging
-import random
-import string
-from datetime import datetime
-
-import qrcode
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    Application,
-    CommandHandler,
-    CallbackQueryHandler,
-    MessageHandler,
-    filters,
-    ContextTypes,
-)
-
-import config
-import database as db
-
-# Logging setup
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
-
-
-def generate_trx_id() -> str:
-    """Generate a unique transaction ID."""
-    timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-    random_part = "".join(random.choices(string.digits, k=6))
-    return f"TRX{timestamp}{random_part}"
-
-
-def generate_upi_qr(amount: int, trx_id: str) -> io.BytesIO:
-    """Generate UPI QR code."""
-    upi_string = f"upi://pay?pa={config.UPI_ID}&pn=Premium&am={amount}&tn={trx_id}&cu=INR"
-    
-    qr = qrcode.QRCode(version=1, box_size=10, border=5)
-    qr.add_data(upi_string)
-    qr.make(fit=True)
-    
-    img = qr.make_image(fill_color="black", back_color="white")
-    bio = io.BytesIO()
-    img.save(bio, "PNG")
-    bio.seek(0)
-    return bio
-
-
-def get_upi_link(amount: int, trx_id: str) -> str:
-    """Generate UPI deep link."""
-    return f"upi://pay?pa={config.UPI_ID}&pn=Premium&am={amount}&tn={trx_id}&cu=INR"
-
-
-def is_admin(user_id: int) -> bool:
-    """Check if user is admin."""
-    return user_id in config.ADMIN_IDS
-
-
-def is_checker(user_id: int) -> bool:
-    """Check if user can use /checkuser command (admins + checkers)."""
-    return user_id in config.ADMIN_IDS or user_id in config.CHECKER_IDS
-
-
-# ==============================================
-# USER HANDLERS
-# ==============================================
-
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command."""
-    user = update.effective_user
-    db.add_user(user.id, user.username, user.first_name)
-    
-    # Check if there's a file ID in the start parameter
-    # Format: <channel_code>_<message_id> e.g., ch1_123
-    if context.args and len(context.args) > 0:
-        file_param = context.args[0]
-        
-        # Parse channel and message ID
-        try:
-            if '_' in file_param:
-                channel_code, msg_id_str = file_param.split('_', 1)
-                msg_id = int(msg_id_str)
-            else:
-                # Legacy format - just message ID, assume ch1
-                channel_code = 'ch1'
-                msg_id = int(file_param)
-        except ValueError:
-            await update.message.reply_text("Invalid link.")
-            return
-        
-        # Get the channel ID for this content
-        channel_id_map = {
-            'ch1': config.CHANNEL_1_ID,
-            'ch2': config.CHANNEL_2_ID,
-            'ch3': config.CHANNEL_3_ID,
-        }
-        from_channel_id = channel_id_map.get(channel_code, config.CHANNEL_1_ID)
-        channel_name = config.CHANNEL_NAME_MAP.get(channel_code, 'Unknown')
-        
-        # Check if user has access to this specific channel
-        if db.has_channel_access(user.id, channel_code) or is_admin(user.id):
-            # Forward file from channel
-            try:
-                await context.bot.copy_message(
-                    chat_id=user.id,
-                    from_chat_id=from_channel_id,
-                    message_id=msg_id
-                )
-                return
-            except Exception as e:
-                logger.error(f"Error forwarding file: {e}")
-                await update.message.reply_text("File not found or expired.")
-                return
-        else:
-            # Show channel-specific premium required message
-            keyboard = [
-                [InlineKeyboardButton("Get Premium", callback_data="show_plans")],
-                [InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}")],
-            ]
-            await update.message.reply_text(
-                config.NOT_PREMIUM_MESSAGE,
-                reply_markup=InlineKeyboardMarkup(keyboard),
-                parse_mode="Markdown"
-            )
-            return
-    
-    # Normal start - show menu with image
-    if db.is_premium(user.id):
-        # Premium user
-        expiry = db.get_premium_expiry(user.id)
-        keyboard = [
-            [InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}")],
-        ]
-        await update.message.reply_text(
-            config.PREMIUM_MESSAGE.format(name=user.first_name, expiry=expiry),
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    else:
-        # Non-premium user - show payment options with image
-        keyboard = [
-            [InlineKeyboardButton("Get Premium", callback_data="show_plans")],
-            [
-                InlineKeyboardButton("Tutorial", url=config.TUTORIAL_LINK),
-                InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}"),
-            ],
-        ]
-        
-        # Check if there's a start image configured
-        start_image = getattr(config, 'START_IMAGE_URL', '') or ''
-        
-        if start_image:
-            try:
-                await update.message.reply_photo(
-                    photo=start_image,
-                    caption=config.START_MESSAGE.format(name=user.first_name),
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-            except Exception as e:
-                logger.error(f"Error sending start image: {e}")
-                # Fallback to text message
-                await update.message.reply_text(
-                    config.START_MESSAGE.format(name=user.first_name),
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-        else:
-            await update.message.reply_text(
-                config.START_MESSAGE.format(name=user.first_name),
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-
-
-async def plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /plans command."""
-    await show_plans(update, context)
-
-
-async def show_plans(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Show channel selection menu."""
-    # Get user's name for personalized greeting
-    if update.callback_query:
-        user = update.callback_query.from_user
-    else:
-        user = update.effective_user
-    
-    name = user.first_name or user.username or "User"
-    
-    keyboard = [
-        [InlineKeyboardButton("HASEENA MAIN", callback_data="channel_1")],
-        [InlineKeyboardButton("HASEENA 2.0", callback_data="channel_2")],
-        [InlineKeyboardButton("SHEEP", callback_data="channel_3")],
-        [InlineKeyboardButton("ALL IN ONE (Discount)", callback_data="channel_all")],
-        [InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}")],
-    ]
-    
-    text = f"""👋 Hello {name}
-
-🎖️ Want Premium?
-Choose a Plan below:
-
-• 💳 Pay with UPI (Instant activation)
-• 📁 Pay with Binance (instant)
-• 🔖 Pay with PayPal 
-• 📥 Any other Payment Method we accept worldwide
-
-———————————————————
-
-🔖 Choose Your Preferred Channel:"""
-    
-    if update.callback_query:
-        await update.callback_query.answer()
-        await update.callback_query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    else:
-        await update.message.reply_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-
-
-async def show_channel_plans(update: Update, context: ContextTypes.DEFAULT_TYPE, channel_type: str):
-    """Show plans for a specific channel with image."""
-    query = update.callback_query
-    await query.answer()
-    
-    if channel_type == "1":
-        plans = config.CHANNEL_1_PLANS
-        title = "HASEENA MAIN"
-    elif channel_type == "2":
-        plans = config.CHANNEL_2_PLANS
-        title = "HASEENA 2.0"
-    elif channel_type == "3":
-        plans = config.CHANNEL_3_PLANS
-        title = "SHEEP"
-    else:  # all
-        plans = config.ALL_IN_ONE_PLANS
-        title = "ALL IN ONE (Discount)"
-    
-    keyboard = []
-    for plan_id, plan in plans.items():
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{plan['label']} : ₹{plan['price']}",
-                callback_data=f"plan_{plan_id}"
-            )
-        ])
-    
-    keyboard.append([InlineKeyboardButton("Back to Channels", callback_data="show_plans")])
-    keyboard.append([InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}")])
-    
-    # Build the plan details message
-    plan_lines = []
-    for plan_id, plan in plans.items():
-        plan_lines.append(f"›› {plan['label']} : ₹{plan['price']}")
-    
-    text = f"""✦{title}  𝗣𝗟𝗔𝗡𝗦
-ᴅᴜʀᴀᴛɪᴏɴ & ᴘʀɪᴄᴇ
-────────────────────
-
-{chr(10).join(plan_lines)}
-
-❐ 𝗣𝗔𝗬𝗠𝗘𝗡𝗧 𝗠𝗘𝗧𝗛𝗢𝗗𝗦
-❐ 𝗎𝗉𝗂 • binance •paypal• 𝗉𝗁𝗈𝗇𝖾 𝗉𝖺𝗒 • other payment write in inbox us
-────────────────────
-✦Contact Admin Before Payment 
-
-✦ 𝗔𝗙𝗧𝗘𝗥 𝗣𝗔𝗬𝗠𝗘𝗡𝗧:
-❐ Sᴇɴᴅ ᴀ ꜱᴄʀᴇᴇɴꜱʜᴏᴛ & ᴡᴀɪᴛ ᴀ ꜰᴇᴡ ᴍɪɴᴜᴛᴇꜱ ғᴏʀ ᴀᴄᴛɪᴠᴀᴛɪᴏɴ ✓"""
-    
-    # Check if there's a premium image configured
-    premium_image = getattr(config, 'PREMIUM_IMAGE_URL', '') or ''
-    
-    if premium_image:
-        try:
-            # Delete the current message and send photo with caption
-            await query.message.delete()
-            await context.bot.send_photo(
-                chat_id=query.from_user.id,
-                photo=premium_image,
-                caption=text,
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-        except Exception as e:
-            logger.error(f"Error sending photo: {e}")
-            # Fallback to text message
-            await query.message.reply_text(
-                text,
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
-    else:
-        # No image configured, just show text
-        await query.edit_message_text(
-            text,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-
-
-async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle plan selection callback - show payment methods."""
-    query = update.callback_query
-    await query.answer()
-    
-    plan_id = query.data.replace("plan_", "")
-    plan = config.PLANS.get(plan_id)
-    
-    if not plan:
-        await query.edit_message_text("Invalid plan selected.")
-        return
-    
-    # Store plan in user_data for later
-    context.user_data["selected_plan_id"] = plan_id
-    
-    amount = plan["price"]
-    validity = plan["label"]
-    channel = plan.get("channel", "Premium")
-    
-    # Show payment method selection
-    keyboard = [
-        [InlineKeyboardButton("1. UPI", callback_data="pay_upi")],
-        [InlineKeyboardButton("2. Binance", callback_data="pay_binance")],
-        [InlineKeyboardButton("3. PayPal", callback_data="pay_paypal")],
-        [InlineKeyboardButton("4. Other Payment Method", callback_data="pay_other")],
-        [InlineKeyboardButton("Back", callback_data="show_plans")],
-    ]
-    
-    await query.edit_message_text(
-        f"**PAYMENT**\n"
-        f"--------------------\n"
-        f"Channel: {channel}\n"
-        f"Plan: {validity}\n"
-        f"Amount: Rs.{amount}\n\n"
-        f"Select payment method:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TYPE, payment_type: str):
-    """Handle payment method selection - show admin contact."""
-    query = update.callback_query
-    await query.answer()
-    
-    plan_id = context.user_data.get("selected_plan_id")
-    plan = config.PLANS.get(plan_id)
-    
-    if not plan:
-        await query.edit_message_text("Session expired. Please start again.")
-        return
-    
-    trx_id = generate_trx_id()
-    amount = plan["price"]
-    validity = plan["label"]
-    channel = plan.get("channel", "Premium")
-    
-    # Payment type labels
-    payment_labels = {
-        "upi": "UPI",
-        "binance": "Binance",
-        "paypal": "PayPal",
-        "other": "Other"
-    }
-    payment_label = payment_labels.get(payment_type, "Payment")
-    
-    keyboard = [
-        [InlineKeyboardButton("Contact Admin", url=f"https://t.me/{config.ADMIN_USERNAME}?text={payment_label}%20Payment%20-%20TRX:%20{trx_id}%20-%20{channel}%20-%20{validity}%20-%20Rs.{amount}")],
-        [InlineKeyboardButton("Back", callback_data="show_plans")],
-    ]
-    
-    await query.edit_message_text(
-        f"✦ 𝗣𝗥𝗘𝗠𝗜𝗨𝗠 𝗣𝗔𝗬𝗠𝗘𝗡𝗧\n\n"
-        f"❐ Channel: {channel}\n"
-        f"≡ Validity: {validity}\n"
-        f"≡ Amount: Rs.{amount}\n"
-        f"❐ Transaction ID: `{trx_id}`\n\n"
-        f"────────────────────\n"
-        f"≡ Contact Admin to Complete Payment.\n\n"
-        f"✦ Premium will be added automatically if paid within 5 minutes...",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def handle_upi_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle UPI payment selection."""
-    await handle_payment_method(update, context, "upi")
-
-
-async def handle_binance_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle Binance payment selection."""
-    await handle_payment_method(update, context, "binance")
-
-
-async def handle_paypal_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle PayPal payment selection."""
-    await handle_payment_method(update, context, "paypal")
-
-
-async def handle_other_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle Other payment selection."""
-    await handle_payment_method(update, context, "other")
-
-
-async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle all callback queries."""
-    query = update.callback_query
-    data = query.data
-    
-    # User callbacks
-    if data == "show_plans":
-        await show_plans(update, context)
-    elif data.startswith("channel_"):
-        channel_type = data.replace("channel_", "")
-        await show_channel_plans(update, context, channel_type)
-    elif data.startswith("plan_"):
-        await handle_plan_selection(update, context)
-    
-    # Payment method callbacks
-    elif data == "pay_upi":
-        await handle_upi_payment(update, context)
-    elif data == "pay_binance":
-        await handle_binance_payment(update, context)
-    elif data == "pay_paypal":
-        await handle_paypal_payment(update, context)
-    elif data == "pay_other":
-        await handle_other_payment(update, context)
-    
-    # Admin callbacks
-    elif data.startswith("admin_ch_"):
-        await admin_channel_selection(update, context)
-    elif data.startswith("admin_plan_"):
-        await admin_plan_selection(update, context)
-    elif data == "admin_back_channels":
-        await admin_back_to_channels(update, context)
-    elif data == "admin_cancel":
-        await admin_cancel(update, context)
-
-
-# ==============================================
-# ADMIN HANDLERS
-# ==============================================
-
-async def add_premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /addpremium command - Admin only with interactive UI."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("Not authorized.")
-        return
-    
-    # Show channel selection menu
-    keyboard = [
-        [InlineKeyboardButton("HASEENA MAIN", callback_data="admin_ch_1")],
-        [InlineKeyboardButton("HASEENA 2.0", callback_data="admin_ch_2")],
-        [InlineKeyboardButton("SHEEP", callback_data="admin_ch_3")],
-        [InlineKeyboardButton("ALL IN ONE", callback_data="admin_ch_all")],
-        [InlineKeyboardButton("Cancel", callback_data="admin_cancel")],
-    ]
-    
-    await update.message.reply_text(
-        "**ADD PREMIUM**\n"
-        "--------------------\n"
-        "Select a channel:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def admin_channel_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle admin channel selection for adding premium."""
-    query = update.callback_query
-    await query.answer()
-    
-    channel_type = query.data.replace("admin_ch_", "")
-    
-    # Store selected channel in user_data
-    context.user_data["admin_add_channel"] = channel_type
-    
-    # Get plans based on channel
-    if channel_type == "1":
-        plans = config.CHANNEL_1_PLANS
-        title = "HASEENA MAIN"
-    elif channel_type == "2":
-        plans = config.CHANNEL_2_PLANS
-        title = "HASEENA 2.0"
-    elif channel_type == "3":
-        plans = config.CHANNEL_3_PLANS
-        title = "SHEEP"
-    else:  # all
-        plans = config.ALL_IN_ONE_PLANS
-        title = "ALL CHANNELS"
-    
-    # Build plan selection keyboard
-    keyboard = []
-    for plan_id, plan in plans.items():
-        keyboard.append([
-            InlineKeyboardButton(
-                f"{plan['label']} : Rs.{plan['price']} ({plan['days']} days)",
-                callback_data=f"admin_plan_{plan_id}"
-            )
-        ])
-    
-    keyboard.append([InlineKeyboardButton("Back", callback_data="admin_back_channels")])
-    keyboard.append([InlineKeyboardButton("Cancel", callback_data="admin_cancel")])
-    
-    await query.edit_message_text(
-        f"**ADD PREMIUM**\n"
-        f"--------------------\n"
-        f"Channel: {title}\n\n"
-        f"Select a plan:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def admin_plan_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle admin plan selection - ask for user ID."""
-    query = update.callback_query
-    await query.answer()
-    
-    plan_id = query.data.replace("admin_plan_", "")
-    plan = config.PLANS.get(plan_id)
-    
-    if not plan:
-        await query.edit_message_text("Invalid plan selected.")
-        return
-    
-    # Store selected plan in user_data
-    context.user_data["admin_add_plan"] = plan_id
-    context.user_data["admin_add_days"] = plan["days"]
-    context.user_data["admin_add_channel_name"] = plan["channel"]
-    context.user_data["admin_add_label"] = plan["label"]
-    context.user_data["awaiting_user_id"] = True
-    
-    keyboard = [[InlineKeyboardButton("Cancel", callback_data="admin_cancel")]]
-    
-    await query.edit_message_text(
-        f"**ADD PREMIUM**\n"
-        f"--------------------\n"
-        f"Channel: {plan['channel']}\n"
-        f"Plan: {plan['label']} ({plan['days']} days)\n"
-        f"Price: Rs.{plan['price']}\n\n"
-        f"**Now send the User ID:**\n"
-        f"(Forward a message from the user or type their ID)",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def admin_handle_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle user ID input from admin."""
-    if not is_admin(update.effective_user.id):
-        return
-    
-    if not context.user_data.get("awaiting_user_id"):
-        return
-    
-    # Check if it's a forwarded message - extract user ID
-    user_id = None
-    
-    # Method 1: Check forward_origin (newer Telegram API - PTB v20+)
-    if hasattr(update.message, 'forward_origin') and update.message.forward_origin:
-        origin = update.message.forward_origin
-        # MessageOriginUser type has sender_user attribute
-        if hasattr(origin, 'sender_user') and origin.sender_user:
-            user_id = origin.sender_user.id
-            logger.info(f"Got user ID from forward_origin: {user_id}")
-    
-    # Method 2: Check forward_from (legacy - older PTB versions, user has privacy disabled)
-    if user_id is None and hasattr(update.message, 'forward_from') and update.message.forward_from:
-        user_id = update.message.forward_from.id
-        logger.info(f"Got user ID from forward_from: {user_id}")
-    
-    # Method 3: Try to parse as user ID from text
-    if user_id is None:
-        try:
-            # Try to extract user ID from the message text
-            text = update.message.text or update.message.caption or ""
-            text = text.strip()
-            
-            # Handle cases where text might contain other content
-            # Look for a standalone number
-            if text.isdigit():
-                user_id = int(text)
-                logger.info(f"Got user ID from text: {user_id}")
-            else:
-                # Try to find a user ID in the text (e.g., "User ID: 123456")
-                import re
-                match = re.search(r'\b(\d{6,15})\b', text)
-                if match:
-                    user_id = int(match.group(1))
-                    logger.info(f"Got user ID from regex match: {user_id}")
-    
-        except (ValueError, AttributeError):
-            pass
-    
-    # If still no user ID, show error
-    if user_id is None:
-        await update.message.reply_text(
-            "Could not extract User ID!\n\n"
-            "Possible reasons:\n"
-            "- User has privacy settings enabled (forward won't work)\n"
-            "- Invalid User ID format\n\n"
-            "Please ask the user for their ID (they can get it from @userinfobot) and send it directly."
-        )
-        return
-    
-    # Get stored plan info
-    days = context.user_data.get("admin_add_days")
-    channel_name = context.user_data.get("admin_add_channel_name")
-    label = context.user_data.get("admin_add_label")
-    admin_channel = context.user_data.get("admin_add_channel")  # '1', '2', '3', or 'all'
-    
-    if not days:
-        await update.message.reply_text("Session expired. Please start again with /addpremium")
-        return
-    
-    # Map channel selection to channel_id
-    channel_id_map = {'1': 'ch1', '2': 'ch2', '3': 'ch3', 'all': 'all'}
-    channel_id = channel_id_map.get(admin_channel, 'all')
-    
-    # Check if user exists
-    user = db.get_user(user_id)
-    if not user:
-        db.add_user(user_id)
-    
-    # Add premium for specific channel(s)
-    db.add_premium(user_id, days, channel_id)
-    expiry = db.get_premium_expiry(user_id, channel_id if channel_id != 'all' else None)
-    
-    # Clear admin session
-    context.user_data.pop("awaiting_user_id", None)
-    context.user_data.pop("admin_add_plan", None)
-    context.user_data.pop("admin_add_days", None)
-    context.user_data.pop("admin_add_channel", None)
-    context.user_data.pop("admin_add_channel_name", None)
-    context.user_data.pop("admin_add_label", None)
-    
-    await update.message.reply_text(
-        f"**PREMIUM ADDED**\n"
-        f"--------------------\n"
-        f"User ID: `{user_id}`\n"
-        f"Channel: {channel_name}\n"
-        f"Plan: {label} ({days} days)\n"
-        f"Expires: {expiry}",
-        parse_mode="Markdown"
-    )
-    
-    try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text=f"**Congratulations!**\n\n"
-                 f"Your premium has been activated!\n\n"
-                 f"Channel: {channel_name}\n"
-                 f"Validity: {days} days\n"
-                 f"Expires: {expiry}\n\n"
-                 f"Enjoy your premium access!",
-            parse_mode="Markdown"
-        )
-        await update.message.reply_text("User has been notified!")
-    except Exception as e:
-        logger.error(f"Could not notify user: {e}")
-        await update.message.reply_text("Could not notify user (they may have blocked the bot)")
-
-
-async def admin_back_to_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Go back to channel selection."""
-    query = update.callback_query
-    await query.answer()
-    
-    keyboard = [
-        [InlineKeyboardButton("HASEENA MAIN", callback_data="admin_ch_1")],
-        [InlineKeyboardButton("HASEENA 2.0", callback_data="admin_ch_2")],
-        [InlineKeyboardButton("SHEEP", callback_data="admin_ch_3")],
-        [InlineKeyboardButton("ALL IN ONE", callback_data="admin_ch_all")],
-        [InlineKeyboardButton("Cancel", callback_data="admin_cancel")],
-    ]
-    
-    await query.edit_message_text(
-        "**ADD PREMIUM**\n"
-        "--------------------\n"
-        "Select a channel:",
-        reply_markup=InlineKeyboardMarkup(keyboard),
-        parse_mode="Markdown"
-    )
-
-
-async def admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Cancel admin operation."""
-    query = update.callback_query
-    await query.answer()
-    
-    # Clear admin session
-    context.user_data.pop("awaiting_user_id", None)
-    context.user_data.pop("admin_add_plan", None)
-    context.user_data.pop("admin_add_days", None)
-    context.user_data.pop("admin_add_channel", None)
-    context.user_data.pop("admin_add_channel_name", None)
-    context.user_data.pop("admin_add_label", None)
-    
-    await query.edit_message_text("Operation cancelled.")
-
-
-async def remove_premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /removepremium command - Admin only."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    if len(context.args) < 1:
-        await update.message.reply_text(
-            "Usage: /removepremium <user_id>\n"
-            "Example: /removepremium 123456789"
-        )
-        return
-    
-    try:
-        user_id = int(context.args[0])
-    except ValueError:
-        await update.message.reply_text("Invalid user_id.")
-        return
-    
-    db.remove_premium(user_id)
-    await update.message.reply_text(f"Premium removed from user `{user_id}`", parse_mode="Markdown")
-
-
-async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /checkuser command - Admin and Checker users."""
-    if not is_checker(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    if len(context.args) < 1:
-        await update.message.reply_text(
-            "Usage: /checkuser <user_id>\n"
-            "Example: /checkuser 123456789"
-        )
-        return
-    
-    try:
-        user_id = int(context.args[0])
-    except ValueError:
-        await update.message.reply_text("Invalid user_id.")
-        return
-    
-    user = db.get_user(user_id)
-    if not user:
-        await update.message.reply_text("User not found in database.")
-        return
-    
-    # Get per-channel subscriptions
-    subscriptions = db.get_user_subscriptions(user_id)
-    has_any_premium = len(subscriptions) > 0
-    
-    # Build subscription details
-    if subscriptions:
-        sub_lines = []
-        for sub in subscriptions:
-            ch_name = config.CHANNEL_NAME_MAP.get(sub['channel_id'], sub['channel_id'])
-            sub_lines.append(f"  - {ch_name}: {sub['expiry']}")
-        subs_text = "\n".join(sub_lines)
-    else:
-        subs_text = "  No active subscriptions"
-    
-    status = "Premium" if has_any_premium else "Free"
-    
-    await update.message.reply_text(
-        f"**User Info**\n\n"
-        f"ID: `{user['user_id']}`\n"
-        f"Name: {user['first_name'] or 'N/A'}\n"
-        f"Username: @{user['username'] or 'N/A'}\n"
-        f"Status: {status}\n\n"
-        f"**Subscriptions:**\n{subs_text}\n\n"
-        f"Joined: {user['joined_at']}",
-        parse_mode="Markdown"
-    )
-
-
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /stats command - Admin only."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    stats = db.get_stats()
-    channel_stats = stats.get('channel_stats', {})
-    
-    await update.message.reply_text(
-        f"**Bot Statistics**\n\n"
-        f"Total Users: {stats['total_users']}\n"
-        f"Premium Users: {stats['premium_users']}\n"
-        f"Free Users: {stats['free_users']}\n\n"
-        f"**Per-Channel Subscriptions:**\n"
-        f"  - HASEENA MAIN: {channel_stats.get('ch1', 0)}\n"
-        f"  - HASEENA 2.0: {channel_stats.get('ch2', 0)}\n"
-        f"  - SHEEP: {channel_stats.get('ch3', 0)}",
-        parse_mode="Markdown"
-    )
-
-
-async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /broadcast command - Admin only."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    if not context.args:
-        await update.message.reply_text(
-            "Usage: /broadcast <message>\n"
-            "Example: /broadcast Hello everyone!"
-        )
-        return
-    
-    message = " ".join(context.args)
-    users = db.get_all_users()
-    
-    success = 0
-    failed = 0
-    
-    status_msg = await update.message.reply_text("Please wait... Broadcasting...")
-    
-    for user_id in users:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message)
-            success += 1
-        except Exception:
-            failed += 1
-    
-    await status_msg.edit_text(
-        f"Broadcast complete!\n\n"
-        f"Sent: {success}\n"
-        f"Failed: {failed}"
-    )
-
-
-async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle new posts in the file channels - generate shareable link with channel code."""
-    chat_id = update.channel_post.chat.id
-    
-    # Skip if this is a reply message (the shareable link messages are replies)
-    if update.channel_post.reply_to_message:
-        return
-    
-    # Skip text-only messages that look like our own link messages
-    if update.channel_post.text and update.channel_post.text.startswith("**Shareable Link"):
-        return
-    
-    # Determine which channel this post is from
-    channel_code = config.CHANNEL_ID_MAP.get(chat_id)
-    if not channel_code:
-        return  # Not a monitored channel
-    
-    message_id = update.channel_post.message_id
-    bot_info = await context.bot.get_me()
-    bot_username = bot_info.username
-    
-    # Include channel code in the start parameter for channel-specific access
-    share_link = f"https://t.me/{bot_username}?start={channel_code}_{message_id}"
-    channel_name = config.CHANNEL_NAME_MAP.get(channel_code, 'Unknown')
-    
-    # Reply with the shareable link
-    await update.channel_post.reply_text(
-        f"**Shareable Link ({channel_name}):**\n`{share_link}`",
-        parse_mode="Markdown"
-    )
-
-
-async def view_plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /viewplans command - Admin only. View all current plans."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    plans = db.get_all_plans()
-    
-    if not plans:
-        await update.message.reply_text("No plans found.")
-        return
-    
-    # Group plans by channel
-    ch1_plans = []
-    ch2_plans = []
-    ch3_plans = []
-    all_plans = []
-    
-    for plan_id, plan in sorted(plans.items()):
-        line = f"`{plan_id}` - {plan['label']} - Rs.{plan['price']} ({plan['days']} days)"
-        if plan_id.startswith('ch1_'):
-            ch1_plans.append(line)
-        elif plan_id.startswith('ch2_'):
-            ch2_plans.append(line)
-        elif plan_id.startswith('ch3_'):
-            ch3_plans.append(line)
-        elif plan_id.startswith('all_'):
-            all_plans.append(line)
-    
-    text = "**ALL PLANS**\n--------------------\n\n"
-    
-    if ch1_plans:
-        text += "**HASEENA LINK (MAIN)**\n" + "\n".join(ch1_plans) + "\n\n"
-    if ch2_plans:
-        text += "**HASEENA(2.0)**\n" + "\n".join(ch2_plans) + "\n\n"
-    if ch3_plans:
-        text += "**SHEEP NEWS**\n" + "\n".join(ch3_plans) + "\n\n"
-    if all_plans:
-        text += "**ALL IN ONE**\n" + "\n".join(all_plans) + "\n\n"
-    
-    text += "--------------------\n"
-    text += "To update: `/setplan <plan_id> <days> <price>`\n"
-    text += "Example: `/setplan ch1_7_days 7 299`"
-    
-    await update.message.reply_text(text, parse_mode="Markdown")
-
-
-async def set_plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /setplan command - Admin only. Update a plan's days and price."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    if len(context.args) < 3:
-        await update.message.reply_text(
-            "Usage: /setplan <plan_id> <days> <price>\n\n"
-            "Example: /setplan ch1_7_days 7 299\n\n"
-            "Use /viewplans to see all plan IDs."
-        )
-        return
-    
-    plan_id = context.args[0]
-    
-    try:
-        days = int(context.args[1])
-        price = int(context.args[2])
-    except ValueError:
-        await update.message.reply_text("Days and price must be numbers.")
-        return
-    
-    if days <= 0 or price <= 0:
-        await update.message.reply_text("Days and price must be positive numbers.")
-        return
-    
-    # Check if plan exists
-    old_plan = db.get_plan(plan_id)
-    if not old_plan:
-        await update.message.reply_text(
-            f"Plan `{plan_id}` not found.\n\n"
-            "Use /viewplans to see all plan IDs.",
-            parse_mode="Markdown"
-        )
-        return
-    
-    # Update the plan
-    success = db.update_plan(plan_id, days=days, price=price)
-    
-    if success:
-        # Refresh config to use new values
-        db.refresh_config_plans()
-        
-        await update.message.reply_text(
-            f"**PLAN UPDATED**\n"
-            f"--------------------\n"
-            f"Plan ID: `{plan_id}`\n"
-            f"Channel: {old_plan['channel']}\n\n"
-            f"**OLD:**\n"
-            f"Days: {old_plan['days']}\n"
-            f"Price: Rs.{old_plan['price']}\n\n"
-            f"**NEW:**\n"
-            f"Days: {days}\n"
-            f"Price: Rs.{price}",
-            parse_mode="Markdown"
-        )
-    else:
-        await update.message.reply_text("Failed to update plan.")
-
-
-async def reset_plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /resetplans command - Admin only. Reset all plans from config.py."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    # Reset all plans
-    count = db.reset_all_plans()
-    
-    await update.message.reply_text(
-        f"**PLANS RESET**\n"
-        f"--------------------\n"
-        f"Deleted all old plans and loaded {count} plans from config.\n\n"
-        f"Use /viewplans to see the new plans.",
-        parse_mode="Markdown"
-    )
-
-
-
-async def view_settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /viewsettings command - Admin only. View all current settings."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    settings = db.get_all_settings()
-    
-    if not settings:
-        await update.message.reply_text("No settings found.")
-        return
-    
-    # Format settings nicely
-    text = "**BOT SETTINGS**\n--------------------\n\n"
-    
-    # Group by category
-    payment_keys = ['upi_id', 'binance_id', 'paypal_email']
-    admin_keys = ['admin_username', 'tutorial_link']
-    channel_keys = ['channel_1_name', 'channel_2_name', 'channel_3_name']
-    
-    text += "**Payment Settings**\n"
-    for key in payment_keys:
-        if key in settings:
-            text += f"`{key}`: {settings[key]}\n"
-    
-    text += "\n**Admin Settings**\n"
-    for key in admin_keys:
-        if key in settings:
-            text += f"`{key}`: {settings[key]}\n"
-    
-    text += "\n**Channel Names**\n"
-    for key in channel_keys:
-        if key in settings:
-            text += f"`{key}`: {settings[key]}\n"
-    
-    text += "\n--------------------\n"
-    text += "To update: `/setsetting <key> <value>`\n"
-    text += "Example: `/setsetting upi_id yourname@upi`"
-    
-    await update.message.reply_text(text, parse_mode="Markdown")
-
-
-async def set_setting_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /setsetting command - Admin only. Update a setting value."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("You are not authorized.")
-        return
-    
-    if len(context.args) < 2:
-        await update.message.reply_text(
-            "Usage: /setsetting <key> <value>\n\n"
-            "Available keys:\n"
-            "- `upi_id` - UPI payment ID\n"
-            "- `binance_id` - Binance Pay ID\n"
-            "- `paypal_email` - PayPal email\n"
-            "- `admin_username` - Admin username\n"
-            "- `tutorial_link` - Tutorial URL\n"
-            "- `channel_1_name` - Channel 1 name\n"
-            "- `channel_2_name` - Channel 2 name\n"
-            "- `channel_3_name` - Channel 3 name\n\n"
-            "Example: `/setsetting upi_id yourname@paytm`",
-            parse_mode="Markdown"
-        )
-        return
-    
-    key = context.args[0].lower()
-    value = " ".join(context.args[1:])  # Allow spaces in value
-    
-    # Valid keys
-    valid_keys = [
-        'upi_id', 'binance_id', 'paypal_email', 
-        'admin_username', 'tutorial_link',
-        'channel_1_name', 'channel_2_name', 'channel_3_name'
-    ]
-    
-    if key not in valid_keys:
-        await update.message.reply_text(
-            f"Invalid key `{key}`.\n\n"
-            f"Valid keys: {', '.join(valid_keys)}",
-            parse_mode="Markdown"
-        )
-        return
-    
-    # Get old value
-    old_value = db.get_setting(key, "Not set")
-    
-    # Update the setting
-    success = db.set_setting(key, value)
-    
-    if success:
-        # Refresh config to use new values
-        db.refresh_config_settings()
-        
-        await update.message.reply_text(
-            f"**SETTING UPDATED**\n"
-            f"--------------------\n"
-            f"Key: `{key}`\n\n"
-            f"**OLD:** {old_value}\n"
-            f"**NEW:** {value}",
-            parse_mode="Markdown"
-        )
-    else:
-        await update.message.reply_text("Failed to update setting.")
-
-
-# ==============================================
-# GET FILE ID COMMAND - For getting image file_ids
-# ==============================================
-
-async def getfileid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /getfileid command - Admin only. Enable file_id capture mode."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("Not authorized.")
-        return
-    
-    context.user_data["awaiting_file_id"] = True
-    await update.message.reply_text(
-        "**FILE ID CAPTURE MODE**\n"
-        "--------------------\n"
-        "Now send me any photo and I will give you its file_id.\n\n"
-        "Use this file_id in Render environment variables:\n"
-        "- `START_IMAGE_URL` for /start message\n"
-        "- `PREMIUM_IMAGE_URL` for plans page\n\n"
-        "Send /cancel to exit this mode.",
-        parse_mode="Markdown"
-    )
-
-
-async def handle_photo_for_fileid(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle photo messages to extract file_id."""
-    if not is_admin(update.effective_user.id):
-        return
-    
-    if not context.user_data.get("awaiting_file_id"):
-        return
-    
-    # Get the largest photo (best quality)
-    if update.message.photo:
-        photo = update.message.photo[-1]  # Last one is largest
-        file_id = photo.file_id
-        
-        await update.message.reply_text(
-            f"**FILE ID CAPTURED!**\n"
-            f"--------------------\n\n"
-            f"**Use this in Render:**\n"
-            f"`{file_id}`\n\n"
-            f"--------------------\n"
-            f"Send another photo or /cancel to exit.",
-            parse_mode="Markdown"
-        )
-
-
-async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /cancel command."""
-    context.user_data.pop("awaiting_file_id", None)
-    context.user_data.pop("awaiting_user_id", None)
-    await update.message.reply_text("Operation cancelled.")
-
-
-# ==============================================
-# APPLICATION SETUP
-# ==============================================
-
-# Initialize database
-db.init_db()
-
-# Create application
-application = Application.builder().token(config.BOT_TOKEN).build()
-
-# User handlers
-application.add_handler(CommandHandler("start", start_command))
-application.add_handler(CommandHandler("plans", plans_command))
-application.add_handler(CommandHandler("cancel", cancel_command))
-application.add_handler(CallbackQueryHandler(callback_handler))
-
-# Admin handlers
-application.add_handler(CommandHandler("addpremium", add_premium_command))
-application.add_handler(CommandHandler("removepremium", remove_premium_command))
-application.add_handler(CommandHandler("checkuser", check_user_command))
-application.add_handler(CommandHandler("stats", stats_command))
-application.add_handler(CommandHandler("broadcast", broadcast_command))
-application.add_handler(CommandHandler("viewplans", view_plans_command))
-application.add_handler(CommandHandler("setplan", set_plan_command))
-application.add_handler(CommandHandler("resetplans", reset_plans_command))
-application.add_handler(CommandHandler("viewsettings", view_settings_command))
-application.add_handler(CommandHandler("setsetting", set_setting_command))
-application.add_handler(CommandHandler("getfileid", getfileid_command))
-
-# Photo handler for file_id capture (must come before other handlers)
-application.add_handler(MessageHandler(
-    filters.PHOTO & filters.ChatType.PRIVATE,
-    handle_photo_for_fileid
-))
-
-# Admin message handler for user ID input (must come before channel post handler)
-application.add_handler(MessageHandler(
-    filters.TEXT & filters.ChatType.PRIVATE & ~filters.COMMAND,
-    admin_handle_user_id
-))
-
-# Channel post handler - monitor all 3 channels
-application.add_handler(MessageHandler(
-    filters.ChatType.CHANNEL & (filters.Chat(config.CHANNEL_1_ID) | filters.Chat(config.CHANNEL_2_ID) | filters.Chat(config.CHANNEL_3_ID)),
-    handle_channel_post
-))
-
-
-def main():
-    """Start the bot in polling mode (for local development)."""
-    logger.info("Bot started in polling mode!")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
-
-
-if __name__ == "__main__":
-    main()
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message
+from telegram.constants import ChatMemberStatus
+from telegram.error import BadRequest
+from telegram.ext import (
+    Application,
+    CommandHandler,
+    CallbackQueryHandler,
+    ChatJoinRequestHandler,
+    ChatMemberHandler,
+    MessageHandler,
+    filters,
+    ContextTypes,
+)
+
+import app_settings
+import bulk_grants
+import config
+import config_sync
+import database as db
+import invite_pool
+import media_cache
+import plan_catalog
+import qr_service
+import reconcile
+import scheduler
+import trx_ids
+import user_export
+from timer_wheel import TimerWheel
+
+# Logging setup
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Number of broadcast sends queued at once
+BROADCAST_CHUNK_SIZE = 500
+
+
+# Transaction IDs are unique across workers through the worker id lease
+trx_id_generator = trx_ids.TrxIdGenerator(
+    int(config.WORKER_ID) if config.WORKER_ID else None
+)
+_worker_lease_owner = uuid.uuid4().hex
+
+
+def generate_trx_id() -> str:
+    """Generate a unique, time-ordered transaction ID (no DB round trip)."""
+    return trx_id_generator.next_id()
+
+
+async def generate_upi_qr(upi_id: str, amount: int) -> bytes:
+    """Get the UPI QR code PNG for an amount (rendered off-loop and cached)."""
+    return await qr_service.get_qr(upi_id, amount)
+
+
+def get_upi_link(upi_id: str, amount: int, trx_id: str) -> str:
+    """Generate UPI deep link."""
+    return qr_service.build_upi_string(upi_id, amount, trx_id)
+
+
+def prerender_plan_qrs(application: Application, prices=None):
+    """Render UPI QR codes for plan prices in the background."""
+    if prices is None:
+        prices = plan_catalog.current().prices
+    application.create_task(qr_service.prerender(prices))
+
+
+def worker_lease_deadline(started: float) -> float:
+    """When to stop using a worker id whose heartbeat was written after `started`.
+    
+    The lease lapses WORKER_LEASE_SECONDS after the heartbeat; stopping at
+    90% of that leaves room for clock drift between workers.
+    """
+    return started + config.WORKER_LEASE_SECONDS * 0.9
+
+
+async def lease_worker_id():
+    """Claim a free worker id from the database for transaction IDs."""
+    started = time.monotonic()
+    worker_id = await asyncio.to_thread(
+        db.claim_worker_id, _worker_lease_owner, trx_ids.MAX_WORKER_ID, config.WORKER_LEASE_SECONDS
+    )
+    trx_id_generator.set_worker_id(worker_id, worker_lease_deadline(started))
+    logger.info(f"Leased worker id {worker_id} for transaction IDs")
+
+
+async def keep_worker_lease():
+    """Keep the worker id lease alive, claiming a new id if it was lost.
+    
+    Without a renewal the generator stops issuing ids at the lease deadline,
+    before another worker can take over the id.
+    """
+    while True:
+        await asyncio.sleep(config.WORKER_LEASE_SECONDS / 5)
+        try:
+            started = time.monotonic()
+            if await asyncio.to_thread(db.renew_worker_lease, trx_id_generator.worker_id, _worker_lease_owner):
+                trx_id_generator.extend_lease(worker_lease_deadline(started))
+            else:
+                await lease_worker_id()
+        except Exception as e:
+            logger.error(f"Could not renew worker id lease: {e}")
+
+
+# Pending orders expire from this wheel without polling the orders table
+async def expire_due_orders(due: list):
+    """Mark orders whose payment window has passed as expired."""
+    count = await asyncio.to_thread(db.expire_orders, [trx_id for trx_id, _ in due])
+    if count:
+        logger.info(f"Expired {count} pending orders")
+
+
+order_wheel = TimerWheel(expire_due_orders)
+
+
+def schedule_order_expiry(trx_id: str, created_at: datetime):
+    """Expire an order once its payment window has passed."""
+    expires_at = created_at + timedelta(minutes=config.ORDER_EXPIRY_MINUTES)
+    order_wheel.schedule(trx_id, expires_at.timestamp())
+
+
+def load_pending_orders():
+    """Expire stale orders and put the rest back on the wheel (once at startup)."""
+    db.expire_orders_before(datetime.now() - timedelta(minutes=config.ORDER_EXPIRY_MINUTES))
+    for order in db.get_pending_orders():
+        schedule_order_expiry(order['trx_id'], order['created_at'])
+
+
+def plan_channel_code(plan_id: str) -> str:
+    """Channel or bundle code a plan grants access to ('ch1', ..., or 'all')."""
+    return plan_id.split('_', 1)[0]
+
+
+def callback_channel_code(value: str) -> str:
+    """Channel or bundle code from callback data ('1' in menus sent before the registry means 'ch1')."""
+    return f"ch{value}" if value.isdigit() else value
+
+
+def is_admin(user_id: int) -> bool:
+    """Check if user is admin."""
+    return user_id in config.ADMIN_IDS
+
+
+def is_checker(user_id: int) -> bool:
+    """Check if user can use /checkuser command (admins + checkers)."""
+    return user_id in config.ADMIN_IDS or user_id in config.CHECKER_IDS
+
+
+def strip_markdown(text: str) -> str:
+    """Free text (captions, names) with Markdown control characters dropped."""
+    return re.sub(r"[_*`\[]", "", text)
+
+
+# /checkuser results per page, and ids accepted at once
+USER_PAGE_SIZE = 10
+MAX_CHECKUSER_IDS = 500
+
+
+# ==============================================
+# EXPIRY ENFORCEMENT
+# ==============================================
+# Subscriptions expire logically in the database; the sweeper removes the
+# user from the real channel. It walks channel_subscriptions in
+# (expiry, id) order from a stored checkpoint, so every run only reads the
+# subscriptions that expired since the last one. Workers take a lease on
+# the sweep job first, so two of them never sweep the same window.
+
+EXPIRY_SWEEP_JOB = "expiry_sweep"
+
+_sweep_lock = asyncio.Lock()
+
+
+async def revoke_channel_access(bot, user_id: int, channel_id: str) -> str:
+    """Remove a user from a channel (ban + unban, so they can rejoin after renewing).
+    
+    Returns:
+        'revoked', 'skipped' (nothing to remove) or 'failed'
+    """
+    chat_id = config.CHANNEL_CHAT_IDS.get(channel_id)
+    if chat_id is None or is_admin(user_id):
+        return "skipped"
+    try:
+        await bot.ban_chat_member(chat_id, user_id, rate_limit_args=scheduler.BULK)
+        await bot.unban_chat_member(chat_id, user_id, only_if_banned=True, rate_limit_args=scheduler.BULK)
+        return "revoked"
+    except BadRequest as e:
+        # Never joined, already left, or not removable - nothing to revoke
+        logger.info(f"Skipped revoking {user_id} from {channel_id}: {e}")
+        return "skipped"
+    except Exception as e:
+        logger.error(f"Could not revoke {user_id} from {channel_id}: {e}")
+        return "failed"
+
+
+async def revocations_for(rows: list) -> list:
+    """(user_id, channel code) pairs to revoke for expired subscription rows.
+    
+    Bundles are expanded into their channels; channels the user can still
+    access through another subscription are left alone.
+    """
+    expired = {}
+    for row in rows:
+        for channel_id in db.expand_channels(row['channel_id']):
+            expired.setdefault(channel_id, set()).add(row['user_id'])
+    
+    pairs = []
+    for channel_id, user_ids in expired.items():
+        still_active = await asyncio.to_thread(db.get_users_with_access, list(user_ids), channel_id)
+        pairs.extend((user_id, channel_id) for user_id in user_ids - still_active)
+    return pairs
+
+
+async def sweep_expired_subscriptions(bot) -> dict:
+    """Revoke channel access for subscriptions that expired since the last sweep.
+    
+    Returns None if another worker is sweeping.
+    """
+    async with _sweep_lock:
+        if not await asyncio.to_thread(
+            db.claim_job_lease, EXPIRY_SWEEP_JOB, _worker_lease_owner, config.EXPIRY_SWEEP_LEASE_SECONDS
+        ):
+            return None
+        try:
+            return await sweep_with_lease(bot)
+        finally:
+            await asyncio.to_thread(db.release_job_lease, EXPIRY_SWEEP_JOB, _worker_lease_owner)
+
+
+async def sweep_with_lease(bot) -> dict:
+    """The sweep itself - call with the sweep job's lease held."""
+    now = datetime.now()
+    checkpoint = await asyncio.to_thread(db.get_checkpoint, EXPIRY_SWEEP_JOB)
+    if checkpoint is None:
+        checkpoint = (now - timedelta(hours=config.EXPIRY_SWEEP_BACKFILL_HOURS), 0)
+    after, after_id = checkpoint
+    
+    counts = {"revoked": 0, "skipped": 0, "failed": 0}
+    while True:
+        rows = await asyncio.to_thread(
+            db.get_expired_subscriptions, after, after_id, now, config.EXPIRY_SWEEP_BATCH
+        )
+        if not rows:
+            break
+        
+        results = await asyncio.gather(*(
+            revoke_channel_access(bot, user_id, channel_id)
+            for user_id, channel_id in await revocations_for(rows)
+        ))
+        for result in results:
+            counts[result] += 1
+        
+        # Advance only after the whole batch was handled
+        after, after_id = rows[-1]['expiry'], rows[-1]['id']
+        await asyncio.to_thread(db.set_checkpoint, EXPIRY_SWEEP_JOB, after, after_id)
+        
+        if len(rows) < config.EXPIRY_SWEEP_BATCH:
+            break
+        # Extend the lease for the next batch; stop if it was lost
+        if not await asyncio.to_thread(
+            db.claim_job_lease, EXPIRY_SWEEP_JOB, _worker_lease_owner, config.EXPIRY_SWEEP_LEASE_SECONDS
+        ):
+            logger.warning("Lost the expiry sweep lease - stopping this sweep")
+            break
+    
+    if any(counts.values()):
+        logger.info(
+            f"Expiry sweep revoked {counts['revoked']} subscriptions "
+            f"({counts['skipped']} not in the channel, {counts['failed']} failed)"
+        )
+    return {**counts, "checkpoint": after}
+
+
+async def run_expiry_sweeper(application: Application):
+    """Sweep expired subscriptions every EXPIRY_SWEEP_INTERVAL seconds."""
+    while True:
+        try:
+            await sweep_expired_subscriptions(application.bot)
+        except Exception as e:
+            logger.error(f"Expiry sweep failed: {e}")
+        await asyncio.sleep(config.EXPIRY_SWEEP_INTERVAL)
+
+
+async def sweep_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /sweep command - Admin only. Run the expiry sweeper now."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    status_msg = await update.message.reply_text("Sweeping expired subscriptions...")
+    result = await sweep_expired_subscriptions(context.bot)
+    if result is None:
+        await status_msg.edit_text("Another worker is sweeping right now - try again in a minute.")
+        return
+    await status_msg.edit_text(
+        f"**EXPIRY SWEEP**\n"
+        f"--------------------\n"
+        f"Removed from channels: {result['revoked']}\n"
+        f"Not in the channel: {result['skipped']}\n"
+        f"Failed: {result['failed']}\n"
+        f"Processed up to: {result['checkpoint']:%d %b %Y, %I:%M %p}",
+        parse_mode="Markdown"
+    )
+
+
+async def compact_subscriptions() -> dict:
+    """Move long-expired subscriptions to the history table in small batches."""
+    before = datetime.now() - timedelta(days=config.COMPACT_AFTER_DAYS)
+    moved = 0
+    batch_ms = []
+    while True:
+        started = time.perf_counter()
+        count = await asyncio.to_thread(db.archive_expired_subscriptions, before, config.COMPACT_BATCH)
+        batch_ms.append((time.perf_counter() - started) * 1000)
+        moved += count
+        if count < config.COMPACT_BATCH:
+            break
+        # Let other writers in between batches
+        await asyncio.sleep(0.1)
+    
+    if moved:
+        logger.info(f"Compaction moved {moved} subscriptions to history in {len(batch_ms)} batches")
+    return {"moved": moved, "batches": len(batch_ms), "batch_ms": batch_ms}
+
+
+async def run_compaction():
+    """Compact the subscriptions table every COMPACT_INTERVAL_HOURS."""
+    while True:
+        try:
+            await compact_subscriptions()
+        except Exception as e:
+            logger.error(f"Subscription compaction failed: {e}")
+        await asyncio.sleep(config.COMPACT_INTERVAL_HOURS * 3600)
+
+
+async def compact_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /compact command - Admin only. Archive long-expired subscriptions now."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    status_msg = await update.message.reply_text("Compacting subscriptions...")
+    result = await compact_subscriptions()
+    batch_ms = result['batch_ms']
+    await status_msg.edit_text(
+        f"**COMPACTION**\n"
+        f"--------------------\n"
+        f"Moved to history: {result['moved']}\n"
+        f"Batches: {result['batches']} (up to {config.COMPACT_BATCH} rows each)\n"
+        f"Time per batch avg/max: {sum(batch_ms) / len(batch_ms):.1f}/{max(batch_ms):.1f} ms\n"
+        f"Expired more than {config.COMPACT_AFTER_DAYS} days ago",
+        parse_mode="Markdown"
+    )
+
+
+# ==============================================
+# RENEWAL REMINDERS
+# ==============================================
+# Reminders due within REMINDER_HORIZON_HOURS live on a timer wheel. The
+# horizon is extended by loading only the newly covered expiry range, and
+# every committed add/remove of premium reschedules that user's reminders
+# through database.subscription_listeners - nothing polls the table.
+# Every worker loads the same reminders, so each one is claimed in the
+# database before it is sent (database.claim_reminders).
+
+# Reminders firing up to this time have been loaded
+_reminders_loaded_until = None
+
+# Event loop the wheel runs on (subscription changes arrive from worker threads)
+_reminder_loop = None
+
+
+def schedule_reminders(user_id: int, channel_id: str, expiry: datetime):
+    """(Re)schedule the reminders for one subscription (expiry None cancels them)."""
+    now = datetime.now()
+    for hours in config.REMINDER_HOURS:
+        key = (user_id, channel_id, hours)
+        reminder_wheel.cancel(key)
+        if expiry is None:
+            continue
+        fire_at = expiry - timedelta(hours=hours)
+        if now < fire_at <= _reminders_loaded_until:
+            reminder_wheel.schedule(key, fire_at.timestamp(), expiry)
+
+
+def on_subscription_changes(changes: list):
+    """database.subscription_listeners hook - runs on any thread."""
+    if _reminder_loop is None or _reminders_loaded_until is None:
+        return
+    
+    def apply():
+        for user_id, channel_id, expiry in changes:
+            schedule_reminders(user_id, channel_id, expiry)
+    
+    _reminder_loop.call_soon_threadsafe(apply)
+
+
+async def send_due_reminders(due: list):
+    """Send one reminder per user and reminder time, listing all their channels."""
+    claimed = await asyncio.to_thread(
+        db.claim_reminders,
+        [(user_id, channel_id, expiry, hours) for (user_id, channel_id, hours), expiry in due]
+    )
+    grouped = {}
+    for user_id, channel_id, expiry, hours in claimed:
+        grouped.setdefault((user_id, hours), []).append(config.CHANNEL_NAME_MAP.get(channel_id, channel_id))
+    
+    keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("Renew Premium", callback_data="show_plans")]])
+    
+    async def remind(user_id, hours, channels):
+        try:
+            await application.bot.send_message(
+                chat_id=user_id,
+                text=f"Your premium for {', '.join(sorted(channels))} ends in {hours} hours.\n\n"
+                     f"Renew now to keep your access.",
+                reply_markup=keyboard,
+                rate_limit_args=scheduler.BULK
+            )
+        except Exception as e:
+            logger.info(f"Could not send renewal reminder to {user_id}: {e}")
+    
+    await asyncio.gather(*(remind(user_id, hours, channels) for (user_id, hours), channels in grouped.items()))
+
+
+reminder_wheel = TimerWheel(send_due_reminders, tick=30)
+
+
+async def load_reminders(until: datetime):
+    """Schedule reminders firing up to `until` that are not loaded yet."""
+    global _reminders_loaded_until
+    start = _reminders_loaded_until or datetime.now()
+    if until <= start:
+        return
+    
+    # Reminder `hours` before expiry fires in (start, until] when expiry is
+    # in (start + hours, until + hours]
+    low, high = min(config.REMINDER_HOURS), max(config.REMINDER_HOURS)
+    rows = await asyncio.to_thread(
+        db.get_expiring_subscriptions, start + timedelta(hours=low), until + timedelta(hours=high)
+    )
+    
+    _reminders_loaded_until = until
+    for user_id, channel_id, expiry in rows:
+        for hours in config.REMINDER_HOURS:
+            fire_at = expiry - timedelta(hours=hours)
+            if start < fire_at <= until:
+                reminder_wheel.schedule((user_id, channel_id, hours), fire_at.timestamp(), expiry)
+
+
+async def keep_reminders_loaded():
+    """Extend the reminder horizon as time passes."""
+    while True:
+        await asyncio.sleep(config.REMINDER_HORIZON_HOURS * 3600 / 12)
+        try:
+            await load_reminders(datetime.now() + timedelta(hours=config.REMINDER_HORIZON_HOURS))
+            await asyncio.to_thread(db.prune_sent_reminders, datetime.now())
+        except Exception as e:
+            logger.error(f"Could not load renewal reminders: {e}")
+
+
+async def start_reminders(application: Application):
+    """Load reminders for the horizon and start the wheel."""
+    global _reminder_loop
+    if not config.REMINDER_HOURS:
+        return
+    _reminder_loop = asyncio.get_running_loop()
+    db.subscription_listeners.append(on_subscription_changes)
+    await load_reminders(datetime.now() + timedelta(hours=config.REMINDER_HORIZON_HOURS))
+    application.create_task(reminder_wheel.run())
+    application.create_task(keep_reminders_loaded())
+
+
+# ==============================================
+# CHANNEL JOIN REQUESTS
+# ==============================================
+# Join requests are queued and answered in batches: access for everyone in
+# a batch is resolved with one query per channel (skipping users whose
+# access was confirmed in the last JOIN_ACCESS_CACHE_SECONDS), then all
+# approvals and declines go out concurrently through the rate limiter.
+# Only granted access is cached: a user who just paid through another
+# worker must not be declined from a stale entry.
+
+# (user_id, channel code) -> access confirmed until
+_access_cache = {}
+
+_join_requests = asyncio.Queue()
+
+join_request_stats = {"approved": 0, "declined": 0, "failed": 0, "cache_hits": 0}
+
+
+def forget_cached_access(changes: list):
+    """database.subscription_listeners hook - drop cached access of changed subscriptions."""
+    for user_id, channel_id, _ in changes:
+        for code in db.expand_channels(channel_id):
+            _access_cache.pop((user_id, code), None)
+
+
+async def resolve_channel_access(pairs: set) -> dict:
+    """Access for many (user_id, channel code) pairs, from cache or one query per channel."""
+    now = time.monotonic()
+    access = {}
+    missing = {}
+    for user_id, channel_id in pairs:
+        if _access_cache.get((user_id, channel_id), 0) > now:
+            access[(user_id, channel_id)] = True
+            join_request_stats["cache_hits"] += 1
+        else:
+            missing.setdefault(channel_id, []).append(user_id)
+    
+    for channel_id, user_ids in missing.items():
+        allowed = await asyncio.to_thread(db.get_users_with_access, user_ids, channel_id)
+        for user_id in user_ids:
+            has_access = user_id in allowed or is_admin(user_id)
+            access[(user_id, channel_id)] = has_access
+            if has_access:
+                _access_cache[(user_id, channel_id)] = now + config.JOIN_ACCESS_CACHE_SECONDS
+    
+    if len(_access_cache) > 50000:
+        for key in [k for k, until in list(_access_cache.items()) if until <= now]:
+            del _access_cache[key]
+    return access
+
+
+async def answer_join_requests(bot, batch: list):
+    """Approve or decline a batch of (chat_id, channel code, user_id) join requests."""
+    access = await resolve_channel_access({(user_id, channel_id) for _, channel_id, user_id in batch})
+    
+    async def answer(chat_id, channel_id, user_id):
+        approve = access[(user_id, channel_id)]
+        try:
+            if approve:
+                await bot.approve_chat_join_request(chat_id, user_id, rate_limit_args=scheduler.TRANSACTIONAL)
+            else:
+                await bot.decline_chat_join_request(chat_id, user_id, rate_limit_args=scheduler.TRANSACTIONAL)
+            join_request_stats["approved" if approve else "declined"] += 1
+        except BadRequest as e:
+            # Already answered (e.g. by an admin) or withdrawn
+            logger.info(f"Join request of {user_id} for {channel_id} not answered: {e}")
+        except Exception as e:
+            join_request_stats["failed"] += 1
+            logger.error(f"Could not answer join request of {user_id} for {channel_id}: {e}")
+    
+    await asyncio.gather(*(answer(*request) for request in batch))
+
+
+async def process_join_requests(bot):
+    """Collect queued join requests into batches and answer them."""
+    while True:
+        batch = [await _join_requests.get()]
+        # Give a burst a moment to arrive, then take everything queued
+        await asyncio.sleep(0.05)
+        while len(batch) < config.JOIN_REQUEST_BATCH and not _join_requests.empty():
+            batch.append(_join_requests.get_nowait())
+        try:
+            await answer_join_requests(bot, batch)
+        except Exception as e:
+            logger.error(f"Could not answer {len(batch)} join requests: {e}")
+
+
+async def handle_join_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Queue a join request to one of the premium channels."""
+    request = update.chat_join_request
+    channel_code = config.CHANNEL_ID_MAP.get(request.chat.id)
+    if channel_code:
+        _join_requests.put_nowait((request.chat.id, channel_code, request.from_user.id))
+
+
+# ==============================================
+# SCREEN RENDERING
+# ==============================================
+
+# Rendered menus: (screen, catalog version) -> (text, reply_markup).
+# config.CATALOG_VERSION is bumped whenever plans or settings are reloaded,
+# which makes every older entry stale.
+_render_cache = {}
+
+
+def cached_render(screen: str, render):
+    """Get a rendered screen, building it once per plan catalog version."""
+    key = (screen, config.CATALOG_VERSION)
+    rendered = _render_cache.get(key)
+    if rendered is None:
+        for stale in [k for k in _render_cache if k[1] != config.CATALOG_VERSION]:
+            del _render_cache[stale]
+        rendered = _render_cache[key] = render()
+    return rendered
+
+
+# Last screen shown per (chat_id, message_id): (hash of what we asked for,
+# hash of the message Telegram returned). An identical edit is skipped
+# without an API call as long as the message still looks like we left it.
+_screen_hashes = OrderedDict()
+SCREEN_HASHES_MAX = 10000
+
+# Callbacks currently running per (user_id, message_id) - duplicate taps
+# on the same message are collapsed into the running one
+_inflight_callbacks = set()
+
+# Calls saved by deduplication, reported by /sendstats
+suppressed_calls = {
+    "duplicate_taps": 0,
+    "unchanged_edits": 0,
+    "not_modified_errors": 0,
+}
+
+
+def _screen_hash(text: str, reply_markup, photo: str, parse_mode: str) -> str:
+    markup = reply_markup.to_json() if reply_markup else ""
+    return hashlib.sha1(f"{text}\x00{markup}\x00{photo}\x00{parse_mode}".encode()).hexdigest()
+
+
+def _message_hash(message: Message) -> str:
+    """Hash of a message as Telegram shows it - changes if anyone else edits it."""
+    markup = message.reply_markup.to_json() if message.reply_markup else ""
+    photo = message.photo[-1].file_unique_id if message.photo else ""
+    content = message.text or message.caption or ""
+    return hashlib.sha1(f"{content}\x00{markup}\x00{photo}".encode()).hexdigest()
+
+
+def _remember_screen(key: tuple, screen_hash: tuple):
+    _screen_hashes[key] = screen_hash
+    _screen_hashes.move_to_end(key)
+    while len(_screen_hashes) > SCREEN_HASHES_MAX:
+        _screen_hashes.popitem(last=False)
+
+
+async def edit_screen(query, text: str, reply_markup=None, photo: str = None, parse_mode: str = None):
+    """Show a screen by editing the callback's message with a single API call.
+    
+    Photo messages get their caption (or, with `photo`, the whole media)
+    edited; text messages get their text edited. Only turning a text message
+    into a photo message needs two calls, since Telegram cannot do that in
+    place. Edits identical to the last one shown are skipped.
+    """
+    message = query.message
+    key = (message.chat_id, message.message_id)
+    screen_hash = _screen_hash(text, reply_markup, photo, parse_mode)
+    
+    if _screen_hashes.get(key) == (screen_hash, _message_hash(message)):
+        suppressed_calls["unchanged_edits"] += 1
+        return None
+    
+    try:
+        result = await _edit_screen(query, text, reply_markup, photo, parse_mode)
+    except BadRequest as e:
+        if "not modified" not in str(e).lower():
+            raise
+        suppressed_calls["not_modified_errors"] += 1
+        result = message
+    
+    if isinstance(result, Message):
+        if result.message_id != message.message_id:
+            # The old message was replaced by a new one
+            _screen_hashes.pop(key, None)
+            key = (result.chat_id, result.message_id)
+        _remember_screen(key, (screen_hash, _message_hash(result)))
+    return result
+
+
+async def _edit_screen(query, text: str, reply_markup, photo: str, parse_mode: str):
+    message = query.message
+    
+    if photo and message.photo:
+        return await media_cache.edit_photo(
+            query.edit_message_media,
+            photo,
+            caption=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    
+    if photo:
+        await message.delete()
+        return await media_cache.send_photo(
+            message.chat.send_photo,
+            photo,
+            caption=text,
+            parse_mode=parse_mode,
+            reply_markup=reply_markup
+        )
+    
+    if message.photo:
+        return await query.edit_message_caption(
+            caption=text,
+            reply_markup=reply_markup,
+            parse_mode=parse_mode
+        )
+    
+    return await query.edit_message_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode=parse_mode
+    )
+
+
+# ==============================================
+# USER HANDLERS
+# ==============================================
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command."""
+    user = update.effective_user
+    db.add_user(user.id, user.username, user.first_name)
+    
+    # Check if there's a file ID in the start parameter
+    # Format: <channel_code>_<message_id>, <channel_code>_g<message_id> for
+    # the album of that post, or <channel_code>_<first>-<last> for a range,
+    # e.g. ch1_123, ch1_g120 or ch1_120-129
+    if context.args and len(context.args) > 0:
+        # Parse channel and message range
+        try:
+            channel_code, first_id, last_id, album = parse_content_link(context.args[0])
+        except ValueError:
+            await update.message.reply_text("Invalid link.")
+            return
+        
+        # Get the channel ID for this content
+        from_channel_id = config.CHANNEL_CHAT_IDS.get(channel_code)
+        if from_channel_id is None:
+            await update.message.reply_text("Invalid link.")
+            return
+        channel_name = config.CHANNEL_NAME_MAP.get(channel_code, 'Unknown')
+        
+        # Check the link against the content catalog before asking Telegram
+        if album:
+            contents = await asyncio.to_thread(db.get_album, channel_code, first_id)
+        else:
+            contents = await asyncio.to_thread(db.get_content_range, channel_code, first_id, last_id)
+        if await is_known_missing(channel_code, first_id, contents):
+            await update.message.reply_text("File not found or expired.")
+            return
+        
+        # Check if user has access to this specific channel
+        if db.has_channel_access(user.id, channel_code) or is_admin(user.id):
+            # Only the catalogued posts of the range; uncatalogued ranges
+            # predate the catalog and are copied whole
+            if contents:
+                message_ids = [c['message_id'] for c in contents if c['media_type'] != 'missing']
+            else:
+                message_ids = list(range(first_id, last_id + 1))
+            
+            # Forward files from channel
+            try:
+                delivered = await deliver_content(context.bot, user.id, from_channel_id, message_ids)
+            except Exception as e:
+                logger.error(f"Error forwarding file: {e}")
+                delivered = 0
+                if isinstance(e, BadRequest) and not contents and first_id == last_id:
+                    await asyncio.to_thread(db.save_content, channel_code, first_id, 'missing')
+            if not delivered:
+                await update.message.reply_text("File not found or expired.")
+            elif not contents and first_id == last_id:
+                # Posted before the catalog - remember that it exists
+                await asyncio.to_thread(db.save_content, channel_code, first_id, 'unknown')
+            return
+        else:
+            # Show channel-specific premium required message
+            keyboard = [
+                [InlineKeyboardButton("Get Premium", callback_data="show_plans")],
+                [InlineKeyboardButton("Contact Admin", url=app_settings.current().admin_url)],
+            ]
+            await update.message.reply_text(
+                config.NOT_PREMIUM_MESSAGE,
+                reply_markup=InlineKeyboardMarkup(keyboard),
+                parse_mode="Markdown"
+            )
+            return
+    
+    # Normal start - show menu with image
+    if db.is_premium(user.id):
+        # Premium user
+        expiry = db.get_premium_expiry(user.id)
+        keyboard = [
+            [InlineKeyboardButton("Get Join Links", callback_data="join_links")],
+            [InlineKeyboardButton("Contact Admin", url=app_settings.current().admin_url)],
+        ]
+        await update.message.reply_text(
+            config.PREMIUM_MESSAGE.format(name=user.first_name, expiry=expiry),
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    else:
+        # Non-premium user - show payment options with image
+        keyboard = [
+            [InlineKeyboardButton("Get Premium", callback_data="show_plans")],
+            [
+                InlineKeyboardButton("Tutorial", url=app_settings.current().tutorial_link),
+                InlineKeyboardButton("Contact Admin", url=app_settings.current().admin_url),
+            ],
+        ]
+        
+        # Check if there's a start image configured
+        start_image = app_settings.current().start_image_url
+        
+        if start_image:
+            try:
+                await media_cache.send_photo(
+                    update.message.reply_photo,
+                    start_image,
+                    caption=config.START_MESSAGE.format(name=user.first_name),
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+            except Exception as e:
+                logger.error(f"Error sending start image: {e}")
+                # Fallback to text message
+                await update.message.reply_text(
+                    config.START_MESSAGE.format(name=user.first_name),
+                    reply_markup=InlineKeyboardMarkup(keyboard)
+                )
+        else:
+            await update.message.reply_text(
+                config.START_MESSAGE.format(name=user.first_name),
+                reply_markup=InlineKeyboardMarkup(keyboard)
+            )
+
+
+async def plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /plans command."""
+    await show_plans(update, context)
+
+
+def render_plans_menu() -> tuple:
+    """Channel selection text (without greeting) and keyboard."""
+    catalog = plan_catalog.current()
+    keyboard = [
+        [InlineKeyboardButton(channel['name'], callback_data=f"channel_{code}")]
+        for code, channel in config.CHANNELS.items()
+        if code in catalog.by_channel
+    ]
+    keyboard += [
+        [InlineKeyboardButton(f"{bundle['name']} (Discount)", callback_data=f"channel_{code}")]
+        for code, bundle in config.BUNDLES.items()
+        if code in catalog.by_channel
+    ]
+    keyboard.append([InlineKeyboardButton("Contact Admin", url=app_settings.current().admin_url)])
+    
+    text = """🎖️ Want Premium?
+Choose a Plan below:
+
+• 💳 Pay with UPI (Instant activation)
+• 📁 Pay with Binance (instant)
+• 🔖 Pay with PayPal 
+• 📥 Any other Payment Method we accept worldwide
+
+———————————————————
+
+🔖 Choose Your Preferred Channel:"""
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def render_channel_plans(channel_code: str) -> tuple:
+    """Plan list text and keyboard for a channel or bundle."""
+    plans = plan_catalog.current().for_channel(channel_code)
+    title = config.CHANNEL_NAME_MAP.get(channel_code, channel_code)
+    if channel_code in config.BUNDLES:
+        title += " (Discount)"
+    
+    keyboard = []
+    for plan in plans:
+        keyboard.append([
+            InlineKeyboardButton(
+                f"{plan.label} : ₹{plan.price}",
+                callback_data=f"plan_{plan.plan_id}"
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton("Back to Channels", callback_data="show_plans")])
+    keyboard.append([InlineKeyboardButton("Contact Admin", url=app_settings.current().admin_url)])
+    
+    # Build the plan details message
+    plan_lines = []
+    for plan in plans:
+        plan_lines.append(f"›› {plan.label} : ₹{plan.price}")
+    
+    text = f"""✦{title}  𝗣𝗟𝗔𝗡𝗦
+ᴅᴜʀᴀᴛɪᴏɴ & ᴘʀɪᴄᴇ
+────────────────────
+
+{chr(10).join(plan_lines)}
+
+❐ 𝗣𝗔𝗬𝗠𝗘𝗡𝗧 𝗠𝗘𝗧𝗛𝗢𝗗𝗦
+❐ 𝗎𝗉𝗂 • binance •paypal• 𝗉𝗁𝗈𝗇𝖾 𝗉𝖺𝗒 • other payment write in inbox us
+────────────────────
+✦Contact Admin Before Payment 
+
+✦ 𝗔𝗙𝗧𝗘𝗥 𝗣𝗔𝗬𝗠𝗘𝗡𝗧:
+❐ Sᴇɴᴅ ᴀ ꜱᴄʀᴇᴇɴꜱʜᴏᴛ & ᴡᴀɪᴛ ᴀ ꜰᴇᴡ ᴍɪɴᴜᴛᴇꜱ ғᴏʀ ᴀᴄᴛɪᴠᴀᴛɪᴏɴ ✓"""
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def show_plans(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show channel selection menu."""
+    # Get user's name for personalized greeting
+    if update.callback_query:
+        user = update.callback_query.from_user
+    else:
+        user = update.effective_user
+    
+    name = user.first_name or user.username or "User"
+    
+    body, reply_markup = cached_render("plans_menu", render_plans_menu)
+    text = f"👋 Hello {name}\n\n{body}"
+    
+    if update.callback_query:
+        await update.callback_query.answer()
+        await edit_screen(update.callback_query, text, reply_markup=reply_markup)
+    else:
+        # Start with the premium image so the plan screens can be edited in place
+        premium_image = app_settings.current().premium_image_url
+        if premium_image:
+            try:
+                await media_cache.send_photo(
+                    update.message.reply_photo,
+                    premium_image,
+                    caption=text,
+                    reply_markup=reply_markup
+                )
+                return
+            except Exception as e:
+                logger.error(f"Error sending photo: {e}")
+        await update.message.reply_text(
+            text,
+            reply_markup=reply_markup
+        )
+
+
+async def show_channel_plans(update: Update, context: ContextTypes.DEFAULT_TYPE, channel_code: str):
+    """Show plans for a specific channel with image."""
+    query = update.callback_query
+    await query.answer()
+    
+    text, reply_markup = cached_render(
+        f"channel_plans:{channel_code}",
+        lambda: render_channel_plans(channel_code)
+    )
+    
+    # Check if there's a premium image configured
+    premium_image = app_settings.current().premium_image_url
+    
+    try:
+        await edit_screen(query, text, reply_markup=reply_markup, photo=premium_image or None)
+    except Exception as e:
+        logger.error(f"Error showing channel plans: {e}")
+        # Fallback to text message
+        await query.message.reply_text(
+            text,
+            reply_markup=reply_markup
+        )
+
+
+async def handle_plan_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle plan selection callback - show payment methods."""
+    query = update.callback_query
+    await query.answer()
+    
+    plan_id = query.data.replace("plan_", "")
+    plan = plan_catalog.current().get(plan_id)
+    
+    if not plan:
+        await edit_screen(query, "Invalid plan selected.")
+        return
+    
+    # Store plan in user_data for later
+    context.user_data["selected_plan_id"] = plan_id
+    
+    amount = plan.price
+    validity = plan.label
+    channel = plan.channel or "Premium"
+    
+    # Show payment method selection
+    keyboard = [
+        [InlineKeyboardButton("1. UPI", callback_data="pay_upi")],
+        [InlineKeyboardButton("2. Binance", callback_data="pay_binance")],
+        [InlineKeyboardButton("3. PayPal", callback_data="pay_paypal")],
+        [InlineKeyboardButton("4. Other Payment Method", callback_data="pay_other")],
+        [InlineKeyboardButton("Back", callback_data="show_plans")],
+    ]
+    
+    await edit_screen(
+        query,
+        f"**PAYMENT**\n"
+        f"--------------------\n"
+        f"Channel: {channel}\n"
+        f"Plan: {validity}\n"
+        f"Amount: Rs.{amount}\n\n"
+        f"Select payment method:",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+
+
+async def handle_payment_method(update: Update, context: ContextTypes.DEFAULT_TYPE, payment_type: str):
+    """Handle payment method selection - show admin contact."""
+    query = update.callback_query
+    await query.answer()
+    
+    plan_id = context.user_data.get("selected_plan_id")
+    plan = plan_catalog.current().get(plan_id)
+    
+    if not plan:
+        await edit_screen(query, "Session expired. Please start again.")
+        return
+    
+    try:
+        trx_id = generate_trx_id()
+    except trx_ids.LeaseExpired as e:
+        logger.error(f"Cannot create transaction ID: {e}")
+        await edit_screen(query, "Payments are briefly unavailable. Please try again in a minute.")
+        return
+    amount = plan.price
+    validity = plan.label
+    channel = plan.channel or "Premium"
+    
+    # Record the order so the admin can activate it by transaction ID
+    created_at = db.create_order(trx_id, query.from_user.id, plan_id, amount, payment_type)
+    schedule_order_expiry(trx_id, created_at)
+    
+    # Payment type labels
+    payment_labels = {
+        "upi": "UPI",
+        "binance": "Binance",
+        "paypal": "PayPal",
+        "other": "Other"
+    }
+    payment_label = payment_labels.get(payment_type, "Payment")
+    
+    keyboard = [
+        [InlineKeyboardButton("Contact Admin", url=f"{app_settings.current().admin_url}?text={payment_label}%20Payment%20-%20TRX:%20{trx_id}%20-%20{channel}%20-%20{validity}%20-%20Rs.{amount}")],
+        [InlineKeyboardButton("Back", callback_data="show_plans")],
+    ]
+    
+    await edit_screen(
+        query,
+        f"✦ 𝗣𝗥𝗘𝗠𝗜𝗨𝗠 𝗣𝗔𝗬𝗠𝗘𝗡𝗧\n\n"
+        f"❐ Channel: {channel}\n"
+        f"≡ Validity: {validity}\n"
+        f"≡ Amount: Rs.{amount}\n"
+        f"❐ Transaction ID: `{trx_id}`\n\n"
+        f"────────────────────\n"
+        f"≡ Contact Admin to Complete Payment.\n\n"
+        f"✦ Premium will be added automatically if paid within {config.ORDER_EXPIRY_MINUTES} minutes...",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+    
+    if payment_type == "upi":
+        # The QR only encodes UPI id and amount, so it is shared by all
+        # orders of this price and usually sent as a cached file_id
+        upi_id = app_settings.current().upi_id
+        # The pay link puts the transaction ID in the payment note, which
+        # lets statement reconciliation match the credit exactly
+        pay_markup = None
+        if config.WEBHOOK_URL:
+            pay_markup = InlineKeyboardMarkup([[
+                InlineKeyboardButton("Pay in UPI app", url=f"{config.WEBHOOK_URL}/upi/{trx_id}")
+            ]])
+        try:
+            await media_cache.send_photo(
+                query.message.reply_photo,
+                lambda: generate_upi_qr(upi_id, amount),
+                key=qr_service.cache_key(upi_id, amount),
+                caption=f"Scan to pay Rs.{amount}\n"
+                        f"UPI ID: `{upi_id}`\n"
+                        f"Transaction ID: `{trx_id}`\n\n"
+                        f"Please enter the transaction ID as the payment note.",
+                reply_markup=pay_markup,
+                parse_mode="Markdown"
+            )
+        except Exception as e:
+            logger.error(f"Error sending UPI QR: {e}")
+
+
+async def handle_upi_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle UPI payment selection."""
+    await handle_payment_method(update, context, "upi")
+
+
+async def handle_binance_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Binance payment selection."""
+    await handle_payment_method(update, context, "binance")
+
+
+async def handle_paypal_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle PayPal payment selection."""
+    await handle_payment_method(update, context, "paypal")
+
+
+async def handle_other_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle Other payment selection."""
+    await handle_payment_method(update, context, "other")
+
+
+async def send_join_links(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Hand out invite links for every channel the user has premium for."""
+    query = update.callback_query
+    await query.answer()
+    user_id = query.from_user.id
+    
+    channels = []
+    for subscription in db.get_user_subscriptions(user_id):
+        for ch in db.expand_channels(subscription['channel_id']):
+            if ch not in channels:
+                channels.append(ch)
+    if not channels:
+        await query.message.reply_text("You have no active premium. Tap /start to see the plans.")
+        return
+    
+    keyboard = []
+    for ch in channels:
+        try:
+            link = await invite_pool.take(context.bot, ch, user_id)
+        except Exception as e:
+            logger.error(f"Could not get invite link for {ch}: {e}")
+            continue
+        keyboard.append([InlineKeyboardButton(f"Join {config.CHANNEL_NAME_MAP.get(ch, ch)}", url=link)])
+    
+    if not keyboard:
+        await query.message.reply_text("Could not create join links right now. Please try again later.")
+        return
+    await query.message.reply_text(
+        "Your join links (each works once):",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+
+
+async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle all callback queries, collapsing repeated taps on one message."""
+    query = update.callback_query
+    message_id = query.message.message_id if query.message else query.inline_message_id
+    key = (query.from_user.id, message_id)
+    
+    if key in _inflight_callbacks:
+        # Same button tapped again while the first tap is still running
+        suppressed_calls["duplicate_taps"] += 1
+        await query.answer()
+        return
+    
+    _inflight_callbacks.add(key)
+    try:
+        await dispatch_callback(update, context)
+    finally:
+        _inflight_callbacks.discard(key)
+
+
+async def dispatch_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route a callback query to its handler."""
+    query = update.callback_query
+    data = query.data
+    
+    # User callbacks
+    if data == "show_plans":
+        await show_plans(update, context)
+    elif data.startswith("channel_"):
+        channel_code = callback_channel_code(data.replace("channel_", ""))
+        await show_channel_plans(update, context, channel_code)
+    elif data.startswith("plan_"):
+        await handle_plan_selection(update, context)
+    elif data == "join_links":
+        await send_join_links(update, context)
+    
+    # Payment method callbacks
+    elif data == "pay_upi":
+        await handle_upi_payment(update, context)
+    elif data == "pay_binance":
+        await handle_binance_payment(update, context)
+    elif data == "pay_paypal":
+        await handle_paypal_payment(update, context)
+    elif data == "pay_other":
+        await handle_other_payment(update, context)
+    
+    # Admin callbacks
+    elif data.startswith("admin_ch_"):
+        await admin_channel_selection(update, context)
+    elif data.startswith("admin_plan_"):
+        await admin_plan_selection(update, context)
+    elif data == "admin_back_channels":
+        await admin_back_to_channels(update, context)
+    elif data == "admin_cancel":
+        await admin_cancel(update, context)
+    elif data.startswith("content_next:"):
+        await content_next_page(update, context)
+    elif data.startswith("checkuser_page:"):
+        await check_user_next_page(update, context)
+
+
+# ==============================================
+# ADMIN HANDLERS
+# ==============================================
+
+def render_admin_channels_menu() -> tuple:
+    """Admin channel selection text and keyboard for /addpremium."""
+    catalog = plan_catalog.current()
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"admin_ch_{code}")]
+        for code, name in config.CHANNEL_NAME_MAP.items()
+        if code in catalog.by_channel
+    ]
+    keyboard.append([InlineKeyboardButton("Cancel", callback_data="admin_cancel")])
+    
+    text = (
+        "**ADD PREMIUM**\n"
+        "--------------------\n"
+        "Select a channel:"
+    )
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+def render_admin_channel_plans(channel_code: str) -> tuple:
+    """Admin plan selection text and keyboard for a channel or bundle."""
+    plans = plan_catalog.current().for_channel(channel_code)
+    title = config.CHANNEL_NAME_MAP.get(channel_code, channel_code)
+    
+    # Build plan selection keyboard
+    keyboard = []
+    for plan in plans:
+        keyboard.append([
+            InlineKeyboardButton(
+                f"{plan.label} : Rs.{plan.price} ({plan.days} days)",
+                callback_data=f"admin_plan_{plan.plan_id}"
+            )
+        ])
+    
+    keyboard.append([InlineKeyboardButton("Back", callback_data="admin_back_channels")])
+    keyboard.append([InlineKeyboardButton("Cancel", callback_data="admin_cancel")])
+    
+    text = (
+        f"**ADD PREMIUM**\n"
+        f"--------------------\n"
+        f"Channel: {title}\n\n"
+        f"Select a plan:"
+    )
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def add_premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /addpremium command - Admin only with interactive UI."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Not authorized.")
+        return
+    
+    # Show channel selection menu
+    text, reply_markup = cached_render("admin_channels", render_admin_channels_menu)
+    
+    await update.message.reply_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode="Markdown"
+    )
+
+
+async def admin_channel_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle admin channel selection for adding premium."""
+    query = update.callback_query
+    await query.answer()
+    
+    channel_code = callback_channel_code(query.data.replace("admin_ch_", ""))
+    
+    # Store selected channel in user_data
+    context.user_data["admin_add_channel"] = channel_code
+    
+    text, reply_markup = cached_render(
+        f"admin_channel_plans:{channel_code}",
+        lambda: render_admin_channel_plans(channel_code)
+    )
+    
+    await edit_screen(query, text, reply_markup=reply_markup, parse_mode="Markdown")
+
+
+async def admin_plan_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle admin plan selection - ask for user ID."""
+    query = update.callback_query
+    await query.answer()
+    
+    plan_id = query.data.replace("admin_plan_", "")
+    plan = plan_catalog.current().get(plan_id)
+    
+    if not plan:
+        await edit_screen(query, "Invalid plan selected.")
+        return
+    
+    # Store selected plan in user_data
+    context.user_data["admin_add_plan"] = plan_id
+    context.user_data["admin_add_days"] = plan.days
+    context.user_data["admin_add_channel_name"] = plan.channel
+    context.user_data["admin_add_label"] = plan.label
+    context.user_data["awaiting_user_id"] = True
+    
+    keyboard = [[InlineKeyboardButton("Cancel", callback_data="admin_cancel")]]
+    
+    await edit_screen(
+        query,
+        f"**ADD PREMIUM**\n"
+        f"--------------------\n"
+        f"Channel: {plan.channel}\n"
+        f"Plan: {plan.label} ({plan.days} days)\n"
+        f"Price: Rs.{plan.price}\n\n"
+        f"**Now send the User ID:**\n"
+        f"(Forward a message from the user, type their ID\n"
+        f"or send the order's Transaction ID)",
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        parse_mode="Markdown"
+    )
+
+
+async def admin_handle_user_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle user ID input from admin."""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    if not context.user_data.get("awaiting_user_id"):
+        return
+    
+    # A transaction ID activates the recorded order directly
+    trx_match = trx_ids.ID_PATTERN.search(update.message.text or "")
+    if trx_match:
+        await activate_order(update, context, trx_match.group(0))
+        return
+    
+    # Check if it's a forwarded message - extract user ID
+    user_id = None
+    
+    # Method 1: Check forward_origin (newer Telegram API - PTB v20+)
+    if hasattr(update.message, 'forward_origin') and update.message.forward_origin:
+        origin = update.message.forward_origin
+        # MessageOriginUser type has sender_user attribute
+        if hasattr(origin, 'sender_user') and origin.sender_user:
+            user_id = origin.sender_user.id
+            logger.info(f"Got user ID from forward_origin: {user_id}")
+    
+    # Method 2: Check forward_from (legacy - older PTB versions, user has privacy disabled)
+    if user_id is None and hasattr(update.message, 'forward_from') and update.message.forward_from:
+        user_id = update.message.forward_from.id
+        logger.info(f"Got user ID from forward_from: {user_id}")
+    
+    # Method 3: Try to parse as user ID from text
+    if user_id is None:
+        try:
+            # Try to extract user ID from the message text
+            text = update.message.text or update.message.caption or ""
+            text = text.strip()
+            
+            # Handle cases where text might contain other content
+            # Look for a standalone number
+            if text.isdigit():
+                user_id = int(text)
+                logger.info(f"Got user ID from text: {user_id}")
+            else:
+                # Try to find a user ID in the text (e.g., "User ID: 123456")
+                match = re.search(r'\b(\d{6,15})\b', text)
+                if match:
+                    user_id = int(match.group(1))
+                    logger.info(f"Got user ID from regex match: {user_id}")
+    
+        except (ValueError, AttributeError):
+            pass
+    
+    # If still no user ID, show error
+    if user_id is None:
+        await update.message.reply_text(
+            "Could not extract User ID!\n\n"
+            "Possible reasons:\n"
+            "- User has privacy settings enabled (forward won't work)\n"
+            "- Invalid User ID format\n\n"
+            "Please ask the user for their ID (they can get it from @userinfobot) and send it directly."
+        )
+        return
+    
+    # Get stored plan info
+    days = context.user_data.get("admin_add_days")
+    channel_name = context.user_data.get("admin_add_channel_name")
+    label = context.user_data.get("admin_add_label")
+    plan_id = context.user_data.get("admin_add_plan")
+    
+    if not days:
+        await update.message.reply_text("Session expired. Please start again with /addpremium")
+        return
+    
+    channel_id = plan_channel_code(plan_id)
+    
+    plan = plan_catalog.current().get(plan_id)
+    if plan:
+        # Add premium and record the sale together
+        db.add_paid_premium(user_id, days, channel_id, plan_id, plan.price, "manual", update.effective_user.id)
+    else:
+        if not db.get_user(user_id):
+            db.add_user(user_id)
+        db.add_premium(user_id, days, channel_id)
+    
+    await announce_premium(update, context, user_id, days, channel_id, channel_name, label)
+
+
+async def announce_premium(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int, days: int,
+                           channel_id: str, channel_name: str, label: str, trx_id: str = None):
+    """Clear the admin session and notify admin and user of granted premium."""
+    expiry = db.get_premium_expiry(user_id, channel_id)
+    
+    # Clear admin session
+    context.user_data.pop("awaiting_user_id", None)
+    context.user_data.pop("admin_add_plan", None)
+    context.user_data.pop("admin_add_days", None)
+    context.user_data.pop("admin_add_channel", None)
+    context.user_data.pop("admin_add_channel_name", None)
+    context.user_data.pop("admin_add_label", None)
+    
+    trx_line = f"Transaction ID: `{trx_id}`\n" if trx_id else ""
+    await update.message.reply_text(
+        f"**PREMIUM ADDED**\n"
+        f"--------------------\n"
+        f"{trx_line}"
+        f"User ID: `{user_id}`\n"
+        f"Channel: {channel_name}\n"
+        f"Plan: {label} ({days} days)\n"
+        f"Expires: {expiry}",
+        parse_mode="Markdown"
+    )
+    
+    if await notify_premium_activated(context.bot, user_id, channel_id, channel_name, days, expiry):
+        await update.message.reply_text("User has been notified!")
+    else:
+        await update.message.reply_text("Could not notify user (they may have blocked the bot)")
+
+
+async def notify_premium_activated(bot, user_id: int, channel_id: str, channel_name: str, days: int,
+                                   expiry: str, lane: int = scheduler.TRANSACTIONAL,
+                                   with_links: bool = True) -> bool:
+    """Tell a user their premium is active, with join links from the invite pool.
+    
+    Without `with_links` the user is pointed to /start, which hands out the
+    links when they ask - bulk grants would otherwise drain the pool.
+    
+    Returns False if they could not be reached.
+    """
+    links = await invite_pool.take_links(bot, channel_id, user_id, lane) if with_links else {}
+    keyboard = [
+        [InlineKeyboardButton(f"Join {config.CHANNEL_NAME_MAP.get(ch, ch)}", url=link)]
+        for ch, link in links.items()
+    ]
+    closing = "Enjoy your premium access!" if with_links else "Use /start to get your channel join links."
+    try:
+        await bot.send_message(
+            chat_id=user_id,
+            text=f"**Congratulations!**\n\n"
+                 f"Your premium has been activated!\n\n"
+                 f"Channel: {channel_name}\n"
+                 f"Validity: {days} days\n"
+                 f"Expires: {expiry}\n\n"
+                 f"{closing}",
+            parse_mode="Markdown",
+            reply_markup=InlineKeyboardMarkup(keyboard) if keyboard else None,
+            rate_limit_args=lane
+        )
+        return True
+    except Exception as e:
+        logger.error(f"Could not notify user {user_id}: {e}")
+        return False
+
+
+async def activate_order(update: Update, context: ContextTypes.DEFAULT_TYPE, trx_id: str):
+    """Activate premium for a recorded order - a single lookup by transaction ID."""
+    if not trx_ids.is_valid(trx_id):
+        await update.message.reply_text(
+            f"`{trx_id}` is not a valid transaction ID - please check it for typos.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    order = db.get_order(trx_id)
+    if not order:
+        await update.message.reply_text(f"Order `{trx_id}` not found.", parse_mode="Markdown")
+        return
+    
+    plan = plan_catalog.current().get(order['plan_id'])
+    if not plan:
+        await update.message.reply_text(f"Plan `{order['plan_id']}` no longer exists.", parse_mode="Markdown")
+        return
+    
+    # Claim, grant and record revenue in one transaction so two admins
+    # cannot activate the same order twice
+    channel_id = plan.code
+    activated = db.activate_orders(
+        [(trx_id, order['user_id'], plan.days, channel_id)],
+        update.effective_user.id
+    )
+    if not activated:
+        await update.message.reply_text(f"Order `{trx_id}` was already activated.", parse_mode="Markdown")
+        return
+    order_wheel.cancel(trx_id)
+    
+    await announce_premium(
+        update, context,
+        order['user_id'],
+        plan.days,
+        channel_id,
+        plan.channel,
+        plan.label,
+        trx_id=trx_id
+    )
+
+
+async def activate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /activate command - Admin only. Activate an order by transaction ID."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: /activate <transaction_id>\n"
+            "Example: /activate TRX03706616500401070080"
+        )
+        return
+    
+    await activate_order(update, context, context.args[0].strip().upper())
+
+
+async def admin_back_to_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Go back to channel selection."""
+    query = update.callback_query
+    await query.answer()
+    
+    text, reply_markup = cached_render("admin_channels", render_admin_channels_menu)
+    
+    await edit_screen(query, text, reply_markup=reply_markup, parse_mode="Markdown")
+
+
+async def admin_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Cancel admin operation."""
+    query = update.callback_query
+    await query.answer()
+    
+    # Clear admin session
+    context.user_data.pop("awaiting_user_id", None)
+    context.user_data.pop("admin_add_plan", None)
+    context.user_data.pop("admin_add_days", None)
+    context.user_data.pop("admin_add_channel", None)
+    context.user_data.pop("admin_add_channel_name", None)
+    context.user_data.pop("admin_add_label", None)
+    
+    await edit_screen(query, "Operation cancelled.")
+
+
+async def remove_premium_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /removepremium command - Admin only."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: /removepremium <user_id>\n"
+            "Example: /removepremium 123456789"
+        )
+        return
+    
+    try:
+        user_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("Invalid user_id.")
+        return
+    
+    db.remove_premium(user_id)
+    await update.message.reply_text(f"Premium removed from user `{user_id}`", parse_mode="Markdown")
+
+
+async def check_user_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /checkuser command - Admin and Checker users."""
+    if not is_checker(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 1:
+        await update.message.reply_text(
+            "Usage: /checkuser <user_id> [history]\n"
+            "       /checkuser <user_id> <user_id> ...\n"
+            "       /checkuser <part of username or name>\n"
+            "Example: /checkuser 123456789"
+        )
+        return
+    
+    # Ids may be pasted separated by spaces, commas or new lines
+    tokens = [token for token in re.split(r"[\s,]+", " ".join(context.args)) if token]
+    is_single = tokens[0].isdigit() and (
+        len(tokens) == 1 or (len(tokens) == 2 and tokens[1].lower() == "history")
+    )
+    if not is_single:
+        if all(token.isdigit() for token in tokens):
+            # dict.fromkeys drops repeated ids and keeps the pasted order
+            ids = list(dict.fromkeys(int(token) for token in tokens))
+            if len(ids) > MAX_CHECKUSER_IDS:
+                await update.message.reply_text(f"At most {MAX_CHECKUSER_IDS} ids at a time.")
+                return
+            user_query = {'ids': ids}
+        else:
+            user_query = {'search': " ".join(context.args)}
+        context.user_data["checkuser_query"] = user_query
+        text, reply_markup = await asyncio.to_thread(render_user_page, user_query)
+        await update.message.reply_text(text, reply_markup=reply_markup, parse_mode="Markdown")
+        return
+    
+    user_id = int(tokens[0])
+    
+    user = db.get_user(user_id)
+    if not user:
+        await update.message.reply_text("User not found in database.")
+        return
+    
+    # Get per-channel subscriptions
+    subscriptions = db.get_user_subscriptions(user_id)
+    has_any_premium = len(subscriptions) > 0
+    
+    # Build subscription details
+    if subscriptions:
+        sub_lines = []
+        for sub in subscriptions:
+            ch_name = config.CHANNEL_NAME_MAP.get(sub['channel_id'], sub['channel_id'])
+            sub_lines.append(f"  - {ch_name}: {sub['expiry']}")
+        subs_text = "\n".join(sub_lines)
+    else:
+        subs_text = "  No active subscriptions"
+    
+    status = "Premium" if has_any_premium else "Free"
+    
+    # Past subscriptions only on request - they may come from the archive
+    history_text = ""
+    if len(context.args) > 1 and context.args[1].lower() == "history":
+        history = db.get_subscription_history(user_id)
+        if history:
+            history_text = "\n\n**History:**\n" + "\n".join(
+                f"  - {config.CHANNEL_NAME_MAP.get(h['channel_id'], h['channel_id'])}: ended {h['expiry']}"
+                for h in history
+            )
+        else:
+            history_text = "\n\n**History:**\n  No past subscriptions"
+    
+    await update.message.reply_text(
+        f"**User Info**\n\n"
+        f"ID: `{user['user_id']}`\n"
+        f"Name: {user['first_name'] or 'N/A'}\n"
+        f"Username: @{user['username'] or 'N/A'}\n"
+        f"Status: {status}\n\n"
+        f"**Subscriptions:**\n{subs_text}"
+        f"{history_text}\n\n"
+        f"Joined: {user['joined_at']}",
+        parse_mode="Markdown"
+    )
+
+
+def render_user_page(user_query: dict, cursor: int = 0) -> tuple:
+    """One page of /checkuser bulk or search results: text and keyboard.
+    
+    The cursor is an offset into the pasted ids, or the last user id of the
+    previous page of a search.
+    """
+    if 'ids' in user_query:
+        all_ids = user_query['ids']
+        ids = all_ids[cursor:cursor + USER_PAGE_SIZE]
+        next_cursor = cursor + USER_PAGE_SIZE if cursor + USER_PAGE_SIZE < len(all_ids) else None
+        text = f"**USERS** {cursor + 1}-{cursor + len(ids)} of {len(all_ids)}\n"
+    else:
+        ids = db.search_users(user_query['search'], USER_PAGE_SIZE + 1, cursor)
+        next_cursor = ids[USER_PAGE_SIZE - 1] if len(ids) > USER_PAGE_SIZE else None
+        ids = ids[:USER_PAGE_SIZE]
+        text = f"**USERS** - \"{strip_markdown(user_query['search'])}\"\n"
+    text += "--------------------\n"
+    
+    users = db.get_users_overview(ids)
+    if not ids:
+        text += "No users found."
+    for user_id in ids:
+        user = users.get(user_id)
+        if user is None:
+            text += f"`{user_id}` - not found\n"
+            continue
+        name = strip_markdown(user['first_name'] or "")[:30]
+        # Usernames may contain underscores - keep them inside code spans
+        username = f" `@{user['username']}`" if user['username'] else ""
+        subscriptions = ", ".join(
+            f"{config.CHANNEL_NAME_MAP.get(channel_id, channel_id)} {expiry:%d %b %Y}"
+            for channel_id, expiry in user['subscriptions']
+        ) or "Free"
+        text += f"`{user_id}`{username} {name}\n  {subscriptions}\n"
+    
+    keyboard = []
+    if next_cursor is not None:
+        keyboard.append([InlineKeyboardButton("Next", callback_data=f"checkuser_page:{next_cursor}")])
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def check_user_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the next page of /checkuser bulk or search results."""
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_checker(query.from_user.id):
+        return
+    
+    user_query = context.user_data.get("checkuser_query")
+    if user_query is None:
+        return
+    cursor = int(query.data.replace("checkuser_page:", "", 1))
+    
+    text, reply_markup = await asyncio.to_thread(render_user_page, user_query, cursor)
+    await edit_screen(query, text, reply_markup=reply_markup, parse_mode="Markdown")
+
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats command - Admin only."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    stats = db.get_stats()
+    channel_stats = stats.get('channel_stats', {})
+    
+    await update.message.reply_text(
+        f"**Bot Statistics**\n\n"
+        f"Total Users: {stats['total_users']}\n"
+        f"Premium Users: {stats['premium_users']}\n"
+        f"Free Users: {stats['free_users']}\n\n"
+        f"**Per-Channel Subscriptions:**\n" +
+        "\n".join(
+            f"  - {channel['name']}: {channel_stats.get(code, 0)}"
+            for code, channel in config.CHANNELS.items()
+        ),
+        parse_mode="Markdown"
+    )
+
+
+REVENUE_PERIODS = {
+    "day": ("Today", 0),
+    "week": ("Last 7 Days", 6),
+    "month": ("Last 30 Days", 29),
+}
+
+
+async def revenue_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /revenue command - Admin only. Revenue from the daily rollups."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    period = context.args[0].lower() if context.args else "day"
+    
+    if period == "rebuild":
+        drift = await asyncio.to_thread(db.rebuild_revenue_rollups)
+        if drift:
+            await update.message.reply_text(f"Rebuilt revenue rollups from the ledger ({drift} rows corrected).")
+        else:
+            await update.message.reply_text("Revenue rollups match the ledger.")
+        return
+    
+    if period not in REVENUE_PERIODS:
+        await update.message.reply_text(
+            "Usage: /revenue [day|week|month]\n"
+            "/revenue rebuild - check rollups against the ledger"
+        )
+        return
+    
+    title, days_back = REVENUE_PERIODS[period]
+    today = datetime.now().date()
+    start = today - timedelta(days=days_back)
+    revenue = await asyncio.to_thread(db.get_revenue, start.isoformat(), today.isoformat())
+    
+    lines = []
+    for channel_id, (grants, amount) in sorted(revenue['channels'].items(), key=lambda c: -c[1][1]):
+        name = config.CHANNEL_NAME_MAP.get(channel_id, channel_id)
+        lines.append(f"  - {name}: Rs.{amount} ({grants} sales)")
+    
+    await update.message.reply_text(
+        f"**Revenue - {title}**\n"
+        f"({start:%d %b} - {today:%d %b %Y})\n\n"
+        f"Total: Rs.{revenue['revenue']}\n"
+        f"Sales: {revenue['grants']}\n\n"
+        f"**Per-Channel:**\n"
+        + ("\n".join(lines) if lines else "  No sales"),
+        parse_mode="Markdown"
+    )
+
+
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /broadcast command - Admin only."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if not context.args:
+        await update.message.reply_text(
+            "Usage: /broadcast <message>\n"
+            "Example: /broadcast Hello everyone!"
+        )
+        return
+    
+    message = " ".join(context.args)
+    users = db.get_all_users()
+    
+    status_msg = await update.message.reply_text("Please wait... Broadcasting...")
+    
+    # Sends run concurrently in the bulk lane - the rate limiter paces them
+    # and lets interactive replies overtake the broadcast
+    success = 0
+    failed = 0
+    for i in range(0, len(users), BROADCAST_CHUNK_SIZE):
+        results = await asyncio.gather(*(
+            context.bot.send_message(chat_id=user_id, text=message, rate_limit_args=scheduler.BULK)
+            for user_id in users[i:i + BROADCAST_CHUNK_SIZE]
+        ), return_exceptions=True)
+        failed_in_chunk = sum(1 for r in results if isinstance(r, Exception))
+        failed += failed_in_chunk
+        success += len(results) - failed_in_chunk
+    
+    await status_msg.edit_text(
+        f"Broadcast complete!\n\n"
+        f"Sent: {success}\n"
+        f"Failed: {failed}"
+    )
+
+
+async def send_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /sendstats command - Admin only. Show outbound queue depth and wait times."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    stats = context.bot.rate_limiter.stats()
+    invites = invite_pool.stats()
+    
+    lines = []
+    for name, lane in stats['lanes'].items():
+        lines.append(
+            f"**{name.title()}**\n"
+            f"  Queued: {lane['depth']}\n"
+            f"  Sent: {lane['sent']}\n"
+            f"  Wait avg/p99/max: {lane['avg_wait_ms']}/{lane['p99_wait_ms']}/{lane['max_wait_ms']} ms"
+        )
+    
+    await update.message.reply_text(
+        f"**SEND QUEUE**\n"
+        f"--------------------\n"
+        + "\n\n".join(lines) +
+        f"\n\nFlood limits hit: {stats['retry_after']}\n"
+        f"Tracked chats: {stats['tracked_chats']}\n\n"
+        f"**Suppressed calls**\n"
+        f"  Duplicate taps: {suppressed_calls['duplicate_taps']}\n"
+        f"  Unchanged edits: {suppressed_calls['unchanged_edits']}\n"
+        f"  Not modified errors: {suppressed_calls['not_modified_errors']}\n\n"
+        f"**Invite links**\n"
+        f"  Pooled: {', '.join(f'{ch} {n}' for ch, n in sorted(invites['pooled'].items())) or 'none'}\n"
+        f"  Hit rate: {invites['hit_rate']}% ({invites['hits']} hits, {invites['misses']} misses)\n"
+        f"  Refill avg/p99: {invites['refill_avg_ms']}/{invites['refill_p99_ms']} ms\n"
+        f"  Revoked: {invites['revoked']}\n\n"
+        f"**Join requests**\n"
+        f"  Approved: {join_request_stats['approved']}\n"
+        f"  Declined: {join_request_stats['declined']}\n"
+        f"  Failed: {join_request_stats['failed']}\n"
+        f"  Queued: {_join_requests.qsize()}\n"
+        f"  Access cache hits: {join_request_stats['cache_hits']}",
+        parse_mode="Markdown"
+    )
+
+
+async def handle_channel_member(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Close a pooled invite link once a user joined a channel with it."""
+    member_update = update.chat_member
+    channel_code = config.CHANNEL_ID_MAP.get(member_update.chat.id)
+    if not channel_code or not member_update.invite_link:
+        return
+    
+    if member_update.new_chat_member.status == ChatMemberStatus.MEMBER:
+        await invite_pool.mark_used(context.bot, member_update.invite_link.invite_link, channel_code)
+
+
+# ==============================================
+# CONTENT CATALOG
+# ==============================================
+# Channel posts and edits are recorded in content_catalog (see database.py)
+# so /start links are checked before Telegram is asked to copy anything.
+
+# Attachment types, checked in this order
+CONTENT_TYPES = ("photo", "video", "animation", "document", "audio", "voice", "video_note", "sticker")
+
+CONTENT_PAGE_SIZE = 10
+
+# Most messages one link covers - the copyMessages limit
+MAX_LINK_MESSAGES = 100
+
+# Channel code -> first message id the catalog recorded (None: not started)
+_catalog_start = {}
+
+
+def catalog_job(channel_id: str) -> str:
+    """Checkpoint name holding the first catalogued message of a channel."""
+    return f"content_catalog:{channel_id}"
+
+
+def describe_content(message: Message) -> tuple:
+    """(media type, file_id, file size) of a channel post."""
+    for media_type in CONTENT_TYPES:
+        attachment = getattr(message, media_type, None)
+        if attachment:
+            if media_type == "photo":
+                attachment = attachment[-1]  # Largest size
+            return media_type, attachment.file_id, attachment.file_size
+    return "text", None, None
+
+
+async def get_catalog_start(channel_id: str):
+    """First message id the catalog recorded for a channel, or None."""
+    if channel_id not in _catalog_start:
+        checkpoint = await asyncio.to_thread(db.get_checkpoint, catalog_job(channel_id))
+        _catalog_start[channel_id] = checkpoint[1] if checkpoint else None
+    return _catalog_start[channel_id]
+
+
+async def is_known_missing(channel_id: str, first_id: int, contents: list) -> bool:
+    """Whether every post a link covers is known not to exist, without asking Telegram.
+    
+    Posts newer than the start of the catalog must be in it; older ones
+    are only known missing once a copy of them failed.
+    
+    Args:
+        channel_id: Channel code of the link
+        first_id: First message id the link covers
+        contents: Catalogued posts in the link's range
+    """
+    if contents:
+        return all(content['media_type'] == 'missing' for content in contents)
+    start = await get_catalog_start(channel_id)
+    return start is not None and first_id >= start
+
+
+def parse_content_link(param: str) -> tuple:
+    """(channel code, first message id, last message id, album) of a /start parameter.
+    
+    Accepts ch1_123, ch1_g120 (the album post 120 belongs to), ch1_120-129
+    (a range of posts) and the legacy bare message id of the first channel.
+    Raises ValueError.
+    """
+    if '_' in param:
+        channel_code, ids = param.split('_', 1)
+    else:
+        channel_code, ids = config.CHANNEL_ID_MAP.get(config.CHANNEL_ID, 'ch1'), param
+    album = ids.startswith('g')
+    if album:
+        ids = ids[1:]
+    first_id, _, last_id = ids.partition('-')
+    if album and last_id:
+        raise ValueError(f"Bad album link {ids}")
+    first_id = int(first_id)
+    last_id = int(last_id) if last_id else first_id
+    if not 0 < first_id <= last_id < first_id + MAX_LINK_MESSAGES:
+        raise ValueError(f"Bad message range {ids}")
+    return channel_code, first_id, last_id, album
+
+
+async def deliver_content(bot, user_id: int, from_chat_id: int, message_ids: list) -> int:
+    """Copy posts to a user - an album or bundle in a single call.
+    
+    Returns:
+        Number of messages delivered (copy_messages skips missing posts)
+    """
+    if len(message_ids) == 1:
+        await bot.copy_message(
+            chat_id=user_id,
+            from_chat_id=from_chat_id,
+            message_id=message_ids[0],
+            rate_limit_args=scheduler.TRANSACTIONAL
+        )
+        return 1
+    copied = await bot.copy_messages(
+        chat_id=user_id,
+        from_chat_id=from_chat_id,
+        message_ids=message_ids,
+        rate_limit_args=scheduler.TRANSACTIONAL
+    )
+    return len(copied)
+
+
+def format_size(size) -> str:
+    """Human-readable file size."""
+    if not size:
+        return "-"
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+async def reply_share_link(message: Message, channel_code: str, message_id: int, album: bool = False):
+    """Reply to a channel post with the /start link for it (or its album)."""
+    param = f"{channel_code}_g{message_id}" if album else f"{channel_code}_{message_id}"
+    share_link = f"https://t.me/{message.get_bot().username}?start={param}"
+    channel_name = config.CHANNEL_NAME_MAP.get(channel_code, 'Unknown')
+    await message.reply_text(
+        f"**Shareable Link ({channel_name}):**\n`{share_link}`",
+        parse_mode="Markdown"
+    )
+
+
+# Album items arrive as separate posts - collect them and reply once. The
+# link names the album by its first post; the catalog's media_group_id
+# gives the exact posts when it is opened.
+# (channel code, media_group_id) -> (first post, message ids so far)
+_pending_albums = {}
+
+
+async def send_album_links(due: list):
+    """Reply with one link per album once no more items arrived."""
+    for key, _ in due:
+        first_message, message_ids = _pending_albums.pop(key)
+        try:
+            await reply_share_link(first_message, key[0], min(message_ids), album=True)
+        except Exception as e:
+            logger.error(f"Could not send album link: {e}")
+
+
+album_wheel = TimerWheel(send_album_links, tick=0.5, slots=64)
+
+
+async def handle_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle new and edited posts in the file channels - catalog them and reply with a shareable link."""
+    message = update.effective_message
+    chat_id = message.chat.id
+    
+    # Skip if this is a reply message (the shareable link messages are replies)
+    if message.reply_to_message:
+        return
+    
+    # Skip text-only messages that look like our own link messages
+    if message.text and message.text.startswith("**Shareable Link"):
+        return
+    
+    # Determine which channel this post is from
+    channel_code = config.CHANNEL_ID_MAP.get(chat_id)
+    if not channel_code:
+        return  # Not a monitored channel
+    
+    message_id = message.message_id
+    media_type, file_id, file_size = describe_content(message)
+    await asyncio.to_thread(
+        db.save_content, channel_code, message_id, media_type, file_id, file_size,
+        message.caption or message.text, message.media_group_id
+    )
+    
+    if update.edited_channel_post:
+        return  # Link was sent with the original post
+    
+    if await get_catalog_start(channel_code) is None:
+        _catalog_start[channel_code] = message_id
+        await asyncio.to_thread(db.set_checkpoint, catalog_job(channel_code), datetime.now(), message_id)
+    
+    if message.media_group_id:
+        # Every new item pushes the reply back, so the album gets one link
+        key = (channel_code, message.media_group_id)
+        album = _pending_albums.setdefault(key, (message, []))
+        album[1].append(message_id)
+        album_wheel.schedule(key, time.time() + config.ALBUM_DEBOUNCE_SECONDS)
+        return
+    
+    # Include channel code in the start parameter for channel-specific access
+    await reply_share_link(message, channel_code, message_id)
+
+
+def render_content_page(bot_username: str, query: dict, page: int = 0) -> tuple:
+    """One page of /content results: text and keyboard.
+    
+    The keyset cursor of each page is kept in query['pages'], so the "Older"
+    button only carries the page number - callback data is limited to 64 bytes.
+    """
+    pages = query.setdefault('pages', [None])
+    rows = db.get_recent_content(CONTENT_PAGE_SIZE + 1, pages[page], query['channel_id'], query['search'])
+    has_more = len(rows) > CONTENT_PAGE_SIZE
+    rows = rows[:CONTENT_PAGE_SIZE]
+    
+    title = config.CHANNEL_NAME_MAP.get(query['channel_id'], "All channels")
+    text = f"**CONTENT** - {title}"
+    if query['search']:
+        text += f" - \"{query['search']}\""
+    text += "\n--------------------\n"
+    
+    if not rows:
+        text += "No posts found."
+    for row in rows:
+        caption = strip_markdown(row['caption'] or "").replace("\n", " ")[:40]
+        text += (
+            f"`{row['channel_id']}_{row['message_id']}` {row['media_type']} "
+            f"{format_size(row['file_size'])} - {row['created_at']:%d %b %H:%M}\n"
+        )
+        if caption:
+            text += f"{caption}\n"
+    if rows:
+        text += f"\nLinks: `t.me/{bot_username}?start=<code>`"
+    
+    keyboard = []
+    if has_more:
+        last = rows[-1]
+        del pages[page + 1:]
+        pages.append((last['created_at'], last['channel_id'], last['message_id']))
+        keyboard.append([InlineKeyboardButton("Older", callback_data=f"content_next:{page + 1}")])
+    
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+async def content_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /content command - Admin only. List and search catalogued channel posts."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    args = list(context.args)
+    channel_id = args.pop(0).lower() if args and args[0].lower() in config.CHANNELS else None
+    query = {'channel_id': channel_id, 'search': " ".join(args) or None}
+    context.user_data["content_query"] = query
+    
+    text, reply_markup = await asyncio.to_thread(render_content_page, context.bot.username, query)
+    await update.message.reply_text(
+        text,
+        reply_markup=reply_markup,
+        parse_mode="Markdown",
+        disable_web_page_preview=True
+    )
+
+
+async def content_next_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the next (older) page of /content results."""
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_admin(query.from_user.id):
+        return
+    
+    content_query = context.user_data.get("content_query")
+    page = int(query.data.replace("content_next:", "", 1))
+    if content_query is None or page >= len(content_query.get('pages', ())):
+        return
+    
+    text, reply_markup = await asyncio.to_thread(
+        render_content_page, context.bot.username, content_query, page
+    )
+    await edit_screen(query, text, reply_markup=reply_markup, parse_mode="Markdown")
+
+
+async def view_plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /viewplans command - Admin only. View all current plans."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    catalog = plan_catalog.current()
+    
+    if not catalog.by_id:
+        await update.message.reply_text("No plans found.")
+        return
+    
+    # Registered channels and bundles in menu order, then any other plan prefixes
+    codes = [code for code in config.CHANNEL_NAME_MAP if code in catalog.by_channel]
+    codes += [code for code in catalog.by_channel if code not in config.CHANNEL_NAME_MAP]
+    
+    text = "**ALL PLANS**\n--------------------\n\n"
+    
+    for code in codes:
+        name = config.CHANNEL_NAME_MAP.get(code, f"{code} (not registered)")
+        lines = [
+            f"`{plan.plan_id}` - {plan.label} - Rs.{plan.price} ({plan.days} days)"
+            for plan in catalog.for_channel(code)
+        ]
+        text += f"**{name}**\n" + "\n".join(lines) + "\n\n"
+    
+    text += "--------------------\n"
+    text += "To update: `/setplan <plan_id> <days> <price>`\n"
+    text += "Example: `/setplan ch1_7_days 7 299`\n"
+    text += "To add: `/addplan <plan_id> <days> <price> <label>`"
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def set_plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /setplan command - Admin only. Update a plan's days and price."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 3:
+        await update.message.reply_text(
+            "Usage: /setplan <plan_id> <days> <price>\n\n"
+            "Example: /setplan ch1_7_days 7 299\n\n"
+            "Use /viewplans to see all plan IDs."
+        )
+        return
+    
+    plan_id = context.args[0]
+    
+    try:
+        days = int(context.args[1])
+        price = int(context.args[2])
+    except ValueError:
+        await update.message.reply_text("Days and price must be numbers.")
+        return
+    
+    if days <= 0 or price <= 0:
+        await update.message.reply_text("Days and price must be positive numbers.")
+        return
+    
+    # Check if plan exists
+    old_plan = db.get_plan(plan_id)
+    if not old_plan:
+        await update.message.reply_text(
+            f"Plan `{plan_id}` not found.\n\n"
+            "Use /viewplans to see all plan IDs.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    # Update the plan
+    success = db.update_plan(plan_id, days=days, price=price)
+    
+    if success:
+        # Load the new values here; other workers are notified
+        config_sync.sync()
+        prerender_plan_qrs(context.application, [price])
+        
+        await update.message.reply_text(
+            f"**PLAN UPDATED**\n"
+            f"--------------------\n"
+            f"Plan ID: `{plan_id}`\n"
+            f"Channel: {old_plan['channel']}\n\n"
+            f"**OLD:**\n"
+            f"Days: {old_plan['days']}\n"
+            f"Price: Rs.{old_plan['price']}\n\n"
+            f"**NEW:**\n"
+            f"Days: {days}\n"
+            f"Price: Rs.{price}",
+            parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text("Failed to update plan.")
+
+
+async def reset_plans_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /resetplans command - Admin only. Reset all plans from config.py."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    # Reset all plans
+    count = db.reset_all_plans()
+    config_sync.sync()
+    prerender_plan_qrs(context.application)
+    
+    await update.message.reply_text(
+        f"**PLANS RESET**\n"
+        f"--------------------\n"
+        f"Deleted all old plans and loaded {count} plans from config.\n\n"
+        f"Use /viewplans to see the new plans.",
+        parse_mode="Markdown"
+    )
+
+
+async def add_plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /addplan command - Admin only. Add a plan for a channel or bundle."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 4:
+        await update.message.reply_text(
+            "Usage: /addplan <plan_id> <days> <price> <label>\n\n"
+            "Example: /addplan ch4_30_days 30 299 1 Month\n\n"
+            "The plan_id starts with a channel or bundle code (see /channels)."
+        )
+        return
+    
+    plan_id = context.args[0]
+    label = " ".join(context.args[3:])
+    
+    try:
+        days = int(context.args[1])
+        price = int(context.args[2])
+    except ValueError:
+        await update.message.reply_text("Days and price must be numbers.")
+        return
+    
+    if days <= 0 or price <= 0:
+        await update.message.reply_text("Days and price must be positive numbers.")
+        return
+    
+    code = plan_channel_code(plan_id)
+    if '_' not in plan_id or code not in config.CHANNEL_NAME_MAP:
+        await update.message.reply_text(
+            f"Plan ID must start with a channel or bundle code, e.g. `{code}_30_days`.\n\n"
+            "Use /channels to see the codes.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    if not db.add_plan(plan_id, days, price, label, config.CHANNEL_NAME_MAP[code]):
+        await update.message.reply_text(
+            f"Plan `{plan_id}` already exists. Use /setplan to change it.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    config_sync.sync()
+    prerender_plan_qrs(context.application, [price])
+    
+    await update.message.reply_text(
+        f"**PLAN ADDED**\n"
+        f"--------------------\n"
+        f"Plan ID: `{plan_id}`\n"
+        f"Channel: {config.CHANNEL_NAME_MAP[code]}\n"
+        f"Label: {label}\n"
+        f"Days: {days}\n"
+        f"Price: Rs.{price}",
+        parse_mode="Markdown"
+    )
+
+
+async def channels_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /channels command - Admin only. View the channel registry."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    text = "**CHANNELS**\n--------------------\n"
+    for code, channel in config.CHANNELS.items():
+        text += f"`{code}` - {channel['name']} (`{channel['chat_id']}`)\n"
+    
+    text += "\n**BUNDLES**\n--------------------\n"
+    for code, bundle in config.BUNDLES.items():
+        text += f"`{code}` - {bundle['name']}: {', '.join(bundle['channels']) or 'no channels'}\n"
+    
+    text += (
+        "\n--------------------\n"
+        "Add or rename a channel: `/setchannel <code> <chat_id> <name>`\n"
+        "Add or change a bundle: `/setbundle <code> <ch1,ch2> <name>`\n"
+        "Then add its plans with /addplan."
+    )
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def set_channel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /setchannel command - Admin only. Register a channel or update it."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 3:
+        await update.message.reply_text(
+            "Usage: /setchannel <code> <chat_id> <name>\n\n"
+            "Example: /setchannel ch4 -1001234567893 NEW CHANNEL\n\n"
+            "The bot must be an admin in the channel."
+        )
+        return
+    
+    code = context.args[0].lower()
+    name = " ".join(context.args[2:])
+    
+    try:
+        chat_id = int(context.args[1])
+    except ValueError:
+        await update.message.reply_text("chat_id must be a number, e.g. -1001234567893.")
+        return
+    
+    if not code.isalnum() or code.isdigit():
+        await update.message.reply_text("Code must be letters and digits only, e.g. ch4.")
+        return
+    
+    try:
+        db.set_channel(code, chat_id, name)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    except Exception as e:
+        logger.error(f"Could not save channel {code}: {e}")
+        await update.message.reply_text("Failed to save channel (is the chat_id already registered?).")
+        return
+    
+    config_sync.sync()
+    await update.message.reply_text(
+        f"**CHANNEL SAVED**\n"
+        f"--------------------\n"
+        f"Code: `{code}`\n"
+        f"Chat ID: `{chat_id}`\n"
+        f"Name: {name}",
+        parse_mode="Markdown"
+    )
+
+
+async def set_bundle_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /setbundle command - Admin only. Create a bundle or change its channels."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 3:
+        await update.message.reply_text(
+            "Usage: /setbundle <code> <ch1,ch2,...> <name>\n\n"
+            "Example: /setbundle duo ch1,ch2 MAIN + 2.0"
+        )
+        return
+    
+    code = context.args[0].lower()
+    channels = [ch.strip().lower() for ch in context.args[1].split(",") if ch.strip()]
+    name = " ".join(context.args[2:])
+    
+    if not code.isalnum() or code.isdigit():
+        await update.message.reply_text("Code must be letters and digits only, e.g. duo.")
+        return
+    
+    try:
+        db.set_bundle(code, name, channels)
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+        return
+    
+    config_sync.sync()
+    await update.message.reply_text(
+        f"**BUNDLE SAVED**\n"
+        f"--------------------\n"
+        f"Code: `{code}`\n"
+        f"Name: {name}\n"
+        f"Channels: {', '.join(config.CHANNEL_NAME_MAP[ch] for ch in channels)}",
+        parse_mode="Markdown"
+    )
+
+
+
+async def view_settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /viewsettings command - Admin only. View all current settings."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    settings = app_settings.current()
+    
+    # Format settings nicely, grouped by category
+    text = "**BOT SETTINGS**\n--------------------\n"
+    
+    group = None
+    for key, (key_group, _) in app_settings.SETTING_KEYS.items():
+        if key_group != group:
+            group = key_group
+            text += f"\n**{group}**\n"
+        text += f"`{key}`: {settings.get(key) or 'Not set'}\n"
+    
+    text += "\n--------------------\n"
+    text += "To update: `/setsetting <key> <value>`\n"
+    text += "Example: `/setsetting upi_id yourname@upi`\n"
+    text += "Channel names: /channels"
+    
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+
+async def set_setting_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /setsetting command - Admin only. Update a setting value."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    if len(context.args) < 2:
+        await update.message.reply_text(
+            "Usage: /setsetting <key> <value>\n\n"
+            "Available keys:\n" +
+            "".join(
+                f"- `{key}` - {description}\n"
+                for key, (_, description) in app_settings.SETTING_KEYS.items()
+            ) +
+            "\nExample: `/setsetting upi_id yourname@paytm`\n"
+            "Channel names are set with /setchannel.",
+            parse_mode="Markdown"
+        )
+        return
+    
+    key = context.args[0].lower()
+    value = " ".join(context.args[1:])  # Allow spaces in value
+    
+    if key not in app_settings.SETTING_KEYS:
+        await update.message.reply_text(
+            f"Invalid key `{key}`.\n\n"
+            f"Valid keys: {', '.join(app_settings.SETTING_KEYS)}",
+            parse_mode="Markdown"
+        )
+        return
+    
+    # Get old value
+    old_value = app_settings.current().get(key) or "Not set"
+    
+    # Update the setting
+    success = db.set_setting(key, value)
+    
+    if success:
+        # Load the new values here; other workers are notified
+        config_sync.sync()
+        if key == 'upi_id':
+            prerender_plan_qrs(context.application)
+        
+        await update.message.reply_text(
+            f"**SETTING UPDATED**\n"
+            f"--------------------\n"
+            f"Key: `{key}`\n\n"
+            f"**OLD:** {old_value}\n"
+            f"**NEW:** {value}",
+            parse_mode="Markdown"
+        )
+    else:
+        await update.message.reply_text("Failed to update setting.")
+
+
+# ==============================================
+# STATEMENT RECONCILIATION
+# ==============================================
+
+async def reconcile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /reconcile command - Admin only. Wait for a statement CSV upload."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    context.user_data["awaiting_statement"] = True
+    await update.message.reply_text(
+        "**RECONCILE PAYMENTS**\n"
+        "--------------------\n"
+        "Send the bank/UPI statement export as a CSV file.\n\n"
+        "Credits are matched to unpaid orders by the transaction ID in the\n"
+        f"note, or by amount within {config.RECONCILE_WINDOW_MINUTES} minutes of the order.\n"
+        "Matched orders are activated automatically.\n\n"
+        "Send /cancel to exit.",
+        parse_mode="Markdown"
+    )
+
+
+def run_reconciliation(path: str) -> reconcile.Reconciler:
+    """Match a statement file against unpaid orders (runs in a worker thread)."""
+    since = datetime.now() - timedelta(days=config.RECONCILE_LOOKBACK_DAYS)
+    reconciler = reconcile.Reconciler(db.get_unpaid_orders(since), config.RECONCILE_WINDOW_MINUTES)
+    reconciler.feed_csv(path)
+    return reconciler
+
+
+async def handle_statement_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reconcile an uploaded statement and activate every matched order."""
+    context.user_data.pop("awaiting_statement", None)
+    status_msg = await update.message.reply_text("Reading statement...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "statement.csv")
+        tg_file = await update.message.document.get_file()
+        await tg_file.download_to_drive(path)
+        
+        try:
+            reconciler = await asyncio.to_thread(run_reconciliation, path)
+        except ValueError as e:
+            await status_msg.edit_text(f"Could not read statement: {e}")
+            return
+    
+    # Activate all matched orders in one transaction
+    catalog = plan_catalog.current()
+    activations = {}
+    for trx_id, (order, how) in reconciler.matched.items():
+        plan = catalog.get(order['plan_id'])
+        if plan:
+            activations[trx_id] = (order['user_id'], plan, plan.code)
+    
+    activated = await asyncio.to_thread(db.activate_orders, [
+        (trx_id, user_id, plan.days, channel_id)
+        for trx_id, (user_id, plan, channel_id) in activations.items()
+    ], update.effective_user.id)
+    for trx_id in activated:
+        order_wheel.cancel(trx_id)
+    
+    # Notify activated users through the rate limiter
+    async def notify(trx_id):
+        user_id, plan, channel_id = activations[trx_id]
+        expiry = await asyncio.to_thread(
+            db.get_premium_expiry, user_id, channel_id
+        )
+        return await notify_premium_activated(
+            context.bot, user_id, channel_id, plan.channel, plan.days, expiry
+        )
+    
+    notified = await asyncio.gather(*(notify(trx_id) for trx_id in activated))
+    
+    lines = [f"`{trx_id}` ({reconciler.matched[trx_id][1]})" for trx_id in activated[:reconcile.SAMPLE_SIZE]]
+    text = (
+        f"**RECONCILIATION REPORT**\n"
+        f"--------------------\n"
+        f"Credit rows: {reconciler.rows} (skipped {reconciler.skipped} other rows)\n"
+        f"Matched: {len(reconciler.matched)}\n"
+        f"Activated: {len(activated)} (notified {sum(notified)})\n"
+        f"Unmatched: {reconciler.unmatched}\n"
+        f"Ambiguous: {reconciler.ambiguous}\n"
+    )
+    if lines:
+        text += "\n**Activated:**\n" + "\n".join(lines) + "\n"
+    # Samples quote bank narrations, which often contain _ or *
+    if reconciler.ambiguous_samples:
+        text += "\n**Ambiguous (check manually):**\n" + "\n".join(
+            strip_markdown(sample) for sample in reconciler.ambiguous_samples
+        ) + "\n"
+    if reconciler.unmatched_samples:
+        text += "\n**Unmatched:**\n" + "\n".join(
+            strip_markdown(sample) for sample in reconciler.unmatched_samples
+        )
+    
+    await status_msg.edit_text(text, parse_mode="Markdown")
+
+
+# ==============================================
+# DATA EXPORT
+# ==============================================
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /export command - Admin only. Send all users and subscriptions as a gzip CSV."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    status_msg = await update.message.reply_text("Exporting users...")
+    filename = f"users-{datetime.now():%Y%m%d-%H%M}.csv.gz"
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, filename)
+        try:
+            rows = await asyncio.to_thread(user_export.write_csv, path)
+        except Exception as e:
+            logger.error(f"Export failed: {e}")
+            await status_msg.edit_text(f"Export failed: {e}")
+            return
+        
+        with open(path, "rb") as f:
+            await update.message.reply_document(
+                document=f,
+                filename=filename,
+                caption=f"{rows} rows ({format_size(os.path.getsize(path))})"
+            )
+    await status_msg.delete()
+
+
+# ==============================================
+# BULK PREMIUM GRANTS
+# ==============================================
+
+async def bulk_grant_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /bulkgrant command - Admin only. Wait for a grants CSV upload."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("You are not authorized.")
+        return
+    
+    context.user_data["awaiting_bulk_grant"] = True
+    await update.message.reply_text(
+        "**BULK PREMIUM GRANT**\n"
+        "--------------------\n"
+        "Send a CSV file with one grant per line:\n"
+        "`user_id,channel,days`\n\n"
+        f"Channel: {bulk_grants.describe_channels()}\n"
+        "Premium is extended from the current expiry, like /addpremium.\n\n"
+        "Send /cancel to exit.",
+        parse_mode="Markdown"
+    )
+
+
+async def handle_bulk_grant_upload(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Validate and apply an uploaded grants file, then notify the users."""
+    context.user_data.pop("awaiting_bulk_grant", None)
+    status_msg = await update.message.reply_text("Reading grants...")
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "grants.csv")
+        tg_file = await update.message.document.get_file()
+        await tg_file.download_to_drive(path)
+        grants, errors = await asyncio.to_thread(bulk_grants.parse_grants_csv, path)
+    
+    if not grants:
+        await status_msg.edit_text(
+            "No valid grants found.\n\n" + format_row_errors(errors),
+        )
+        return
+    
+    await status_msg.edit_text(f"Granting premium for {len(grants)} rows...")
+    started = time.perf_counter()
+    expiries = await asyncio.to_thread(db.bulk_add_premium, grants)
+    db_seconds = time.perf_counter() - started
+    
+    # Notify in the bulk lane so interactive traffic keeps priority
+    notified = 0
+    for i in range(0, len(grants), BROADCAST_CHUNK_SIZE):
+        results = await asyncio.gather(*(
+            notify_premium_activated(
+                context.bot,
+                user_id,
+                channel_id,
+                config.CHANNEL_NAME_MAP.get(channel_id, channel_id),
+                days,
+                expiry.strftime("%d %b %Y, %I:%M %p"),
+                lane=scheduler.BULK,
+                with_links=False
+            )
+            for (user_id, channel_id, days), expiry in zip(
+                grants[i:i + BROADCAST_CHUNK_SIZE], expiries[i:i + BROADCAST_CHUNK_SIZE]
+            )
+        ))
+        notified += sum(results)
+    
+    text = (
+        f"**BULK GRANT COMPLETE**\n"
+        f"--------------------\n"
+        f"Granted: {len(grants)} ({db_seconds:.2f}s)\n"
+        f"Notified: {notified}\n"
+        f"Not reachable: {len(grants) - notified}\n"
+        f"Rejected rows: {len(errors)}"
+    )
+    if errors:
+        text += "\n\n" + format_row_errors(errors)
+    await status_msg.edit_text(text)
+
+
+def format_row_errors(errors: list, limit: int = 20) -> str:
+    """List rejected file rows as 'Line N: reason'."""
+    lines = [f"Line {line_no}: {reason}" for line_no, reason in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"... and {len(errors) - limit} more")
+    return "\n".join(lines)
+
+
+async def handle_admin_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Route documents uploaded by admins to the operation waiting for them."""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    if context.user_data.get("awaiting_statement"):
+        await handle_statement_upload(update, context)
+    elif context.user_data.get("awaiting_bulk_grant"):
+        await handle_bulk_grant_upload(update, context)
+
+
+# ==============================================
+# GET FILE ID COMMAND - For getting image file_ids
+# ==============================================
+
+async def getfileid_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /getfileid command - Admin only. Enable file_id capture mode."""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("Not authorized.")
+        return
+    
+    context.user_data["awaiting_file_id"] = True
+    await update.message.reply_text(
+        "**FILE ID CAPTURE MODE**\n"
+        "--------------------\n"
+        "Now send me any photo and I will give you its file_id.\n\n"
+        "Image URLs set with /setsetting are uploaded once and cached\n"
+        "automatically, so a file_id is only needed for photos that\n"
+        "have no URL.\n\n"
+        "Send /cancel to exit this mode.",
+        parse_mode="Markdown"
+    )
+
+
+async def handle_photo_for_fileid(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle photo messages to extract file_id."""
+    if not is_admin(update.effective_user.id):
+        return
+    
+    if not context.user_data.get("awaiting_file_id"):
+        return
+    
+    # Get the largest photo (best quality)
+    if update.message.photo:
+        photo = update.message.photo[-1]  # Last one is largest
+        file_id = photo.file_id
+        
+        await update.message.reply_text(
+            f"**FILE ID CAPTURED!**\n"
+            f"--------------------\n\n"
+            f"`{file_id}`\n\n"
+            f"Set it with:\n"
+            f"`/setsetting start_image_url {file_id}`\n\n"
+            f"--------------------\n"
+            f"Send another photo or /cancel to exit.",
+            parse_mode="Markdown"
+        )
+
+
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /cancel command."""
+    context.user_data.pop("awaiting_file_id", None)
+    context.user_data.pop("awaiting_user_id", None)
+    context.user_data.pop("awaiting_statement", None)
+    context.user_data.pop("awaiting_bulk_grant", None)
+    await update.message.reply_text("Operation cancelled.")
+
+
+# ==============================================
+# APPLICATION SETUP
+# ==============================================
+
+async def post_init(application: Application):
+    """Start background services once the bot is initialized."""
+    qr_service.start()
+    prerender_plan_qrs(application)
+    load_pending_orders()
+    application.create_task(order_wheel.run())
+    application.create_task(album_wheel.run())
+    application.create_task(run_expiry_sweeper(application))
+    application.create_task(run_compaction())
+    await start_reminders(application)
+    db.subscription_listeners.append(forget_cached_access)
+    application.create_task(process_join_requests(application.bot))
+    application.create_task(invite_pool.run(application.bot))
+    application.create_task(config_sync.run())
+    
+    if trx_id_generator.worker_id is None:
+        await lease_worker_id()
+        application.create_task(keep_worker_lease())
+
+
+async def post_shutdown(application: Application):
+    """Stop background services."""
+    qr_service.shutdown()
+
+
+# Initialize database
+db.init_db()
+
+# Create application
+# All outbound requests go through the priority rate limiter; updates are
+# processed concurrently so a long broadcast does not block other users
+application = (
+    Application.builder()
+    .token(config.BOT_TOKEN)
+    .rate_limiter(scheduler.build_rate_limiter())
+    .concurrent_updates(True)
+    .post_init(post_init)
+    .post_shutdown(post_shutdown)
+    .build()
+)
+
+# User handlers
+application.add_handler(CommandHandler("start", start_command))
+application.add_handler(CommandHandler("plans", plans_command))
+application.add_handler(CommandHandler("cancel", cancel_command))
+application.add_handler(CallbackQueryHandler(callback_handler))
+
+# Admin handlers
+application.add_handler(CommandHandler("addpremium", add_premium_command))
+application.add_handler(CommandHandler("activate", activate_command))
+application.add_handler(CommandHandler("reconcile", reconcile_command))
+application.add_handler(CommandHandler("revenue", revenue_command))
+application.add_handler(CommandHandler("bulkgrant", bulk_grant_command))
+application.add_handler(CommandHandler("export", export_command))
+application.add_handler(CommandHandler("sweep", sweep_command))
+application.add_handler(CommandHandler("compact", compact_command))
+application.add_handler(CommandHandler("removepremium", remove_premium_command))
+application.add_handler(CommandHandler("checkuser", check_user_command))
+application.add_handler(CommandHandler("stats", stats_command))
+application.add_handler(CommandHandler("broadcast", broadcast_command))
+application.add_handler(CommandHandler("sendstats", send_stats_command))
+application.add_handler(CommandHandler("viewplans", view_plans_command))
+application.add_handler(CommandHandler("setplan", set_plan_command))
+application.add_handler(CommandHandler("resetplans", reset_plans_command))
+application.add_handler(CommandHandler("addplan", add_plan_command))
+application.add_handler(CommandHandler("channels", channels_command))
+application.add_handler(CommandHandler("setchannel", set_channel_command))
+application.add_handler(CommandHandler("setbundle", set_bundle_command))
+application.add_handler(CommandHandler("content", content_command))
+application.add_handler(CommandHandler("viewsettings", view_settings_command))
+application.add_handler(CommandHandler("setsetting", set_setting_command))
+application.add_handler(CommandHandler("getfileid", getfileid_command))
+
+# Photo handler for file_id capture (must come before other handlers)
+application.add_handler(MessageHandler(
+    filters.PHOTO & filters.ChatType.PRIVATE,
+    handle_photo_for_fileid
+))
+
+# Document uploads from admins (statements)
+application.add_handler(MessageHandler(
+    filters.Document.ALL & filters.ChatType.PRIVATE,
+    handle_admin_document
+))
+
+# Admin message handler for user ID input (must come before channel post handler)
+application.add_handler(MessageHandler(
+    filters.TEXT & filters.ChatType.PRIVATE & ~filters.COMMAND,
+    admin_handle_user_id
+))
+
+# Channel post handler (new and edited posts) - registered channels are
+# checked inside the handler, so channels added with /setchannel are picked
+# up without a restart
+application.add_handler(MessageHandler(
+    filters.ChatType.CHANNEL & filters.UpdateType.CHANNEL_POSTS,
+    handle_channel_post
+))
+
+# Joins through pooled invite links (needs chat_member in allowed_updates)
+application.add_handler(ChatMemberHandler(handle_channel_member, ChatMemberHandler.CHAT_MEMBER))
+
+# Join requests to the premium channels are approved for active subscribers
+application.add_handler(ChatJoinRequestHandler(handle_join_request))
+
+
+def main():
+    """Start the bot in polling mode (for local development)."""
+    logger.info("Bot started in polling mode!")
+    application.run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# ==============================================
+# BULK PREMIUM GRANTS
+# ==============================================
+# Parses an admin-uploaded CSV of grants:
+#
+#     user_id,channel,days
+#     123456789,ch1,7
+#     987654321,all,30
+#
+# The header row is optional. Channel may be a channel or bundle code
+# ('ch1', 'all'), its number ('1') or its name ('HASEENA MAIN'). Invalid rows are reported
+# with their line number and never stop the rest of the file.
+import csv
+
+import config
+
+# Longest grant accepted from a file
+MAX_DAYS = 3650
+
+USER_COLUMNS = ("user_id", "user", "id", "userid", "telegram_id")
+CHANNEL_COLUMNS = ("channel", "channel_id", "channel_code")
+DAYS_COLUMNS = ("days", "validity", "duration")
+
+
+def _channel_aliases() -> dict:
+    aliases = {}
+    for code, name in config.CHANNEL_NAME_MAP.items():
+        aliases[code] = code
+        aliases[name.lower()] = code
+        if code.startswith('ch'):
+            aliases[code[2:]] = code
+    return aliases
+
+
+def describe_channels() -> str:
+    """The accepted channel values, e.g. 'ch1, ch2, ch3 or all (or 1, 2, 3)'."""
+    codes = list(config.CHANNELS) + list(config.BUNDLES)
+    numbers = [code[2:] for code in config.CHANNELS if code.startswith('ch')]
+    text = ", ".join(codes[:-1]) + " or " + codes[-1] if len(codes) > 1 else "".join(codes)
+    if numbers:
+        text += f" (or {', '.join(numbers)})"
+    return text
+
+
+def _find_column(header: list, names: tuple, default: int) -> int:
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return default
+
+
+def parse_grants_csv(path: str) -> tuple:
+    """Read and validate a grants file.
+
+    Returns:
+        (grants, errors) - grants is a list of (user_id, channel_id, days),
+        errors a list of (line number, reason)
+    """
+    aliases = _channel_aliases()
+    grants = []
+    errors = []
+    user_col, channel_col, days_col = 0, 1, 2
+
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+        for line_no, row in enumerate(csv.reader(f), start=1):
+            cells = [cell.strip() for cell in row]
+            if not any(cells):
+                continue
+
+            if line_no == 1 and not cells[0].lstrip('-').isdigit():
+                header = [cell.lower() for cell in cells]
+                user_col = _find_column(header, USER_COLUMNS, 0)
+                channel_col = _find_column(header, CHANNEL_COLUMNS, 1)
+                days_col = _find_column(header, DAYS_COLUMNS, 2)
+                continue
+
+            if len(cells) <= max(user_col, channel_col, days_col):
+                errors.append((line_no, "expected user_id, channel, days"))
+                continue
+
+            user_id = cells[user_col]
+            if not user_id.isdigit():
+                errors.append((line_no, f"invalid user_id '{user_id[:20]}'"))
+                continue
+
+            channel_id = aliases.get(cells[channel_col].lower())
+            if channel_id is None:
+                errors.append((line_no, f"unknown channel '{cells[channel_col][:20]}'"))
+                continue
+
+            days = cells[days_col]
+            if not days.isdigit() or not 0 < int(days) <= MAX_DAYS:
+                errors.append((line_no, f"days must be 1-{MAX_DAYS}, got '{days[:20]}'"))
+                continue
+
+            grants.append((int(user_id), channel_id, int(days)))
+
+    return grants, errors
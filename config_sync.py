@@ -0,0 +1,110 @@
+# ==============================================
+# CROSS-WORKER CONFIG RELOADS
+# ==============================================
+# Plans, settings and the channel registry are loaded into each worker's
+# memory. Writes bump a per-scope version (see database.py, CONFIG
+# VERSIONS); this module waits for a change signal and reloads only the
+# scopes whose version moved:
+#   - PostgreSQL: LISTEN on the config channel, so reloads follow the
+#     committing transaction immediately
+#   - SQLite: PRAGMA data_version every CONFIG_SYNC_INTERVAL seconds, which
+#     changes only when another connection committed
+# Nothing is reloaded on a timer when nothing changed.
+import asyncio
+import logging
+import threading
+
+import config
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# Scope -> function that reloads it into config / plan_catalog
+RELOADERS = {
+    'plans': db.refresh_config_plans,
+    'settings': db.refresh_config_settings,
+    'channels': db.refresh_config_channels,
+}
+
+# Scope -> version currently loaded in this worker
+_loaded = {}
+_lock = threading.Lock()
+
+
+def sync() -> list:
+    """Reload every scope whose version changed since this worker loaded it.
+
+    Call it after writing plans, settings or channels as well - the worker
+    that made the change then does not reload again when notified.
+
+    Returns:
+        The reloaded scopes
+    """
+    with _lock:
+        versions = db.get_config_versions()
+        changed = [
+            scope for scope, version in versions.items()
+            if scope in RELOADERS and _loaded.get(scope) != version
+        ]
+        for scope in changed:
+            RELOADERS[scope]()
+            _loaded[scope] = versions[scope]
+    if changed:
+        logger.info(f"Reloaded {', '.join(changed)}")
+    return changed
+
+
+async def _watch_postgres():
+    conn = await asyncio.to_thread(db.get_config_listen_connection)
+    loop = asyncio.get_running_loop()
+    readable = asyncio.Event()
+    loop.add_reader(conn.fileno(), readable.set)
+    try:
+        # Catch up on anything changed before we started listening
+        await asyncio.to_thread(sync)
+        while True:
+            try:
+                await asyncio.wait_for(readable.wait(), config.CONFIG_SYNC_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            readable.clear()
+            conn.poll()
+            if conn.notifies:
+                # Several writes in a row need only one reload
+                conn.notifies.clear()
+                await asyncio.to_thread(sync)
+    finally:
+        loop.remove_reader(conn.fileno())
+        conn.close()
+
+
+async def _watch_sqlite():
+    # SQLite connections stay on the thread that opened them - this one
+    # is only ever used from the event loop
+    conn = db.get_config_listen_connection()
+    try:
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        await asyncio.to_thread(sync)
+        while True:
+            await asyncio.sleep(config.CONFIG_SYNC_INTERVAL)
+            current = conn.execute("PRAGMA data_version").fetchone()[0]
+            if current != data_version:
+                data_version = current
+                await asyncio.to_thread(sync)
+    finally:
+        conn.close()
+
+
+async def run():
+    """Reload plans, settings and channels whenever another worker changes them."""
+    while True:
+        try:
+            if db.USE_POSTGRES:
+                await _watch_postgres()
+            else:
+                await _watch_sqlite()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Config change listener failed, reconnecting: {e}")
+            await asyncio.sleep(config.CONFIG_SYNC_INTERVAL)
@@ -1,851 +1,3064 @@
-import os
-from datetime import datetime, timedelta
-from config import DATABASE_URL, DATABASE_PATH
-
-# Try to use PostgreSQL if DATABASE_URL is set, otherwise fall back to SQLite
-USE_POSTGRES = bool(DATABASE_URL)
-
-if USE_POSTGRES:
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
-else:
-    import sqlite3
-
-
-def get_connection():
-    """Get database connection based on configuration."""
-    if USE_POSTGRES:
-        return psycopg2.connect(DATABASE_URL)
-    else:
-        return sqlite3.connect(DATABASE_PATH)
-
-
-def init_db():
-    """Initialize the database with required tables."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        # PostgreSQL syntax
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Channel subscriptions table - tracks per-channel access
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS channel_subscriptions (
-                id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                channel_id TEXT NOT NULL,
-                expiry TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, channel_id)
-            )
-        """)
-        
-        # Create index for faster lookups
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_subs_user_id ON channel_subscriptions(user_id)
-        """)
-    else:
-        # SQLite syntax
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                joined_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Channel subscriptions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS channel_subscriptions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                channel_id TEXT NOT NULL,
-                expiry TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE(user_id, channel_id)
-            )
-        """)
-    
-    conn.commit()
-    conn.close()
-
-
-def add_user(user_id: int, username: str = None, first_name: str = None):
-    """Add a new user or update existing user info."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("""
-            INSERT INTO users (user_id, username, first_name)
-            VALUES (%s, %s, %s)
-            ON CONFLICT(user_id) DO UPDATE SET
-                username = EXCLUDED.username,
-                first_name = EXCLUDED.first_name
-        """, (user_id, username, first_name))
-    else:
-        cursor.execute("""
-            INSERT INTO users (user_id, username, first_name)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                username = excluded.username,
-                first_name = excluded.first_name
-        """, (user_id, username, first_name))
-    
-    conn.commit()
-    conn.close()
-
-
-def get_user(user_id: int) -> dict:
-    """Get user information."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("SELECT user_id, username, first_name, joined_at FROM users WHERE user_id = %s", (user_id,))
-    else:
-        cursor.execute("SELECT user_id, username, first_name, joined_at FROM users WHERE user_id = ?", (user_id,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return {
-            "user_id": row[0],
-            "username": row[1],
-            "first_name": row[2],
-            "joined_at": row[3]
-        }
-    return None
-
-
-def add_premium(user_id: int, days: int, channel_id: str = 'all'):
-    """Add premium subscription for a specific channel or all channels.
-    
-    Args:
-        user_id: The user's Telegram ID
-        days: Number of days for the subscription
-        channel_id: 'ch1', 'ch2', 'ch3', or 'all' for all channels
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Determine which channels to add
-    if channel_id == 'all':
-        channels = ['ch1', 'ch2', 'ch3']
-    else:
-        channels = [channel_id]
-    
-    for ch in channels:
-        # Get current expiry if exists
-        if USE_POSTGRES:
-            cursor.execute(
-                "SELECT expiry FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
-                (user_id, ch)
-            )
-        else:
-            cursor.execute(
-                "SELECT expiry FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
-                (user_id, ch)
-            )
-        
-        row = cursor.fetchone()
-        
-        if row and row[0]:
-            try:
-                if USE_POSTGRES:
-                    current_expiry = row[0]  # Already a datetime in PostgreSQL
-                else:
-                    current_expiry = datetime.fromisoformat(row[0])
-                
-                if current_expiry > datetime.now():
-                    # Extend from current expiry
-                    new_expiry = current_expiry + timedelta(days=days)
-                else:
-                    # Start from now
-                    new_expiry = datetime.now() + timedelta(days=days)
-            except:
-                new_expiry = datetime.now() + timedelta(days=days)
-        else:
-            new_expiry = datetime.now() + timedelta(days=days)
-        
-        # Insert or update subscription
-        if USE_POSTGRES:
-            cursor.execute("""
-                INSERT INTO channel_subscriptions (user_id, channel_id, expiry)
-                VALUES (%s, %s, %s)
-                ON CONFLICT(user_id, channel_id) DO UPDATE SET
-                    expiry = EXCLUDED.expiry
-            """, (user_id, ch, new_expiry))
-        else:
-            cursor.execute("""
-                INSERT INTO channel_subscriptions (user_id, channel_id, expiry)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id, channel_id) DO UPDATE SET
-                    expiry = excluded.expiry
-            """, (user_id, ch, new_expiry.isoformat()))
-    
-    conn.commit()
-    conn.close()
-
-
-def has_channel_access(user_id: int, channel_id: str) -> bool:
-    """Check if user has active access to a specific channel.
-    
-    Args:
-        user_id: The user's Telegram ID
-        channel_id: 'ch1', 'ch2', or 'ch3'
-    
-    Returns:
-        True if user has active subscription for the channel
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute(
-            "SELECT expiry FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
-            (user_id, channel_id)
-        )
-    else:
-        cursor.execute(
-            "SELECT expiry FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
-            (user_id, channel_id)
-        )
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if not row:
-        return False
-    
-    try:
-        if USE_POSTGRES:
-            expiry = row[0]
-        else:
-            expiry = datetime.fromisoformat(row[0])
-        
-        return expiry > datetime.now()
-    except:
-        return False
-
-
-def is_premium(user_id: int, channel_id: str = None) -> bool:
-    """Check if user has active premium.
-    
-    Args:
-        user_id: The user's Telegram ID
-        channel_id: Optional - check specific channel, or None to check if user has any active subscription
-    
-    Returns:
-        True if user has active subscription
-    """
-    if channel_id:
-        return has_channel_access(user_id, channel_id)
-    
-    # Check if user has any active subscription
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    now = datetime.now()
-    
-    if USE_POSTGRES:
-        cursor.execute(
-            "SELECT COUNT(*) FROM channel_subscriptions WHERE user_id = %s AND expiry > %s",
-            (user_id, now)
-        )
-    else:
-        cursor.execute(
-            "SELECT COUNT(*) FROM channel_subscriptions WHERE user_id = ? AND expiry > ?",
-            (user_id, now.isoformat())
-        )
-    
-    count = cursor.fetchone()[0]
-    conn.close()
-    
-    return count > 0
-
-
-def get_user_subscriptions(user_id: int) -> list:
-    """Get all active subscriptions for a user.
-    
-    Returns:
-        List of dicts with channel_id and expiry for each active subscription
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    now = datetime.now()
-    
-    if USE_POSTGRES:
-        cursor.execute(
-            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = %s AND expiry > %s ORDER BY channel_id",
-            (user_id, now)
-        )
-    else:
-        cursor.execute(
-            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = ? AND expiry > ? ORDER BY channel_id",
-            (user_id, now.isoformat())
-        )
-    
-    rows = cursor.fetchall()
-    conn.close()
-    
-    result = []
-    for row in rows:
-        if USE_POSTGRES:
-            expiry = row[1]
-        else:
-            expiry = datetime.fromisoformat(row[1])
-        
-        result.append({
-            'channel_id': row[0],
-            'expiry': expiry.strftime("%d %b %Y, %I:%M %p")
-        })
-    
-    return result
-
-
-def get_premium_expiry(user_id: int, channel_id: str = None) -> str:
-    """Get premium expiry date as formatted string.
-    
-    Args:
-        user_id: The user's Telegram ID
-        channel_id: Optional - get expiry for specific channel
-    
-    Returns:
-        Formatted expiry date or 'N/A'
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if channel_id:
-        if USE_POSTGRES:
-            cursor.execute(
-                "SELECT expiry FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
-                (user_id, channel_id)
-            )
-        else:
-            cursor.execute(
-                "SELECT expiry FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
-                (user_id, channel_id)
-            )
-    else:
-        # Get the latest expiry across all channels
-        if USE_POSTGRES:
-            cursor.execute(
-                "SELECT MAX(expiry) FROM channel_subscriptions WHERE user_id = %s",
-                (user_id,)
-            )
-        else:
-            cursor.execute(
-                "SELECT MAX(expiry) FROM channel_subscriptions WHERE user_id = ?",
-                (user_id,)
-            )
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row and row[0]:
-        try:
-            if USE_POSTGRES:
-                expiry = row[0]
-            else:
-                expiry = datetime.fromisoformat(row[0])
-            return expiry.strftime("%d %b %Y, %I:%M %p")
-        except:
-            pass
-    
-    return "N/A"
-
-
-def remove_premium(user_id: int, channel_id: str = None):
-    """Remove premium subscription from a user.
-    
-    Args:
-        user_id: The user's Telegram ID
-        channel_id: Optional - remove specific channel, or None to remove all
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if channel_id:
-        if USE_POSTGRES:
-            cursor.execute(
-                "DELETE FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
-                (user_id, channel_id)
-            )
-        else:
-            cursor.execute(
-                "DELETE FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
-                (user_id, channel_id)
-            )
-    else:
-        # Remove all subscriptions
-        if USE_POSTGRES:
-            cursor.execute("DELETE FROM channel_subscriptions WHERE user_id = %s", (user_id,))
-        else:
-            cursor.execute("DELETE FROM channel_subscriptions WHERE user_id = ?", (user_id,))
-    
-    conn.commit()
-    conn.close()
-
-
-def get_all_users() -> list:
-    """Get all users."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT user_id FROM users")
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return [row[0] for row in rows]
-
-
-def get_stats() -> dict:
-    """Get bot statistics with per-channel breakdown."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Total users
-    cursor.execute("SELECT COUNT(*) FROM users")
-    total_users = cursor.fetchone()[0]
-    
-    now = datetime.now()
-    
-    # Users with any active subscription
-    if USE_POSTGRES:
-        cursor.execute(
-            "SELECT COUNT(DISTINCT user_id) FROM channel_subscriptions WHERE expiry > %s",
-            (now,)
-        )
-    else:
-        cursor.execute(
-            "SELECT COUNT(DISTINCT user_id) FROM channel_subscriptions WHERE expiry > ?",
-            (now.isoformat(),)
-        )
-    premium_users = cursor.fetchone()[0]
-    
-    # Per-channel stats
-    channel_stats = {}
-    for ch in ['ch1', 'ch2', 'ch3']:
-        if USE_POSTGRES:
-            cursor.execute(
-                "SELECT COUNT(*) FROM channel_subscriptions WHERE channel_id = %s AND expiry > %s",
-                (ch, now)
-            )
-        else:
-            cursor.execute(
-                "SELECT COUNT(*) FROM channel_subscriptions WHERE channel_id = ? AND expiry > ?",
-                (ch, now.isoformat())
-            )
-        channel_stats[ch] = cursor.fetchone()[0]
-    
-    conn.close()
-    
-    return {
-        "total_users": total_users,
-        "premium_users": premium_users,
-        "free_users": total_users - premium_users,
-        "channel_stats": channel_stats
-    }
-
-
-# ==============================================
-# DYNAMIC PLANS MANAGEMENT
-# ==============================================
-
-def init_plans_table():
-    """Initialize the plans table for dynamic plan management."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS plans (
-                plan_id TEXT PRIMARY KEY,
-                days INTEGER NOT NULL,
-                price INTEGER NOT NULL,
-                label TEXT NOT NULL,
-                channel TEXT NOT NULL
-            )
-        """)
-    else:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS plans (
-                plan_id TEXT PRIMARY KEY,
-                days INTEGER NOT NULL,
-                price INTEGER NOT NULL,
-                label TEXT NOT NULL,
-                channel TEXT NOT NULL
-            )
-        """)
-    
-    conn.commit()
-    conn.close()
-
-
-def populate_default_plans():
-    """Populate plans table with default plans from config if empty."""
-    import config
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if plans table is empty
-    cursor.execute("SELECT COUNT(*) FROM plans")
-    count = cursor.fetchone()[0]
-    
-    if count == 0:
-        # Insert default plans from config
-        for plan_id, plan in config.PLANS.items():
-            if USE_POSTGRES:
-                cursor.execute("""
-                    INSERT INTO plans (plan_id, days, price, label, channel)
-                    VALUES (%s, %s, %s, %s, %s)
-                    ON CONFLICT(plan_id) DO NOTHING
-                """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
-            else:
-                cursor.execute("""
-                    INSERT INTO plans (plan_id, days, price, label, channel)
-                    VALUES (?, ?, ?, ?, ?)
-                    ON CONFLICT(plan_id) DO NOTHING
-                """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
-        
-        conn.commit()
-    
-    conn.close()
-
-
-def reset_all_plans():
-    """Delete all plans and repopulate from config. Use this to sync plans from config.py."""
-    import config
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Delete all existing plans
-    cursor.execute("DELETE FROM plans")
-    
-    # Insert all plans from config
-    for plan_id, plan in config.PLANS.items():
-        if USE_POSTGRES:
-            cursor.execute("""
-                INSERT INTO plans (plan_id, days, price, label, channel)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
-        else:
-            cursor.execute("""
-                INSERT INTO plans (plan_id, days, price, label, channel)
-                VALUES (?, ?, ?, ?, ?)
-            """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
-    
-    conn.commit()
-    conn.close()
-    
-    # Refresh config with new plans
-    refresh_config_plans()
-    
-    return len(config.PLANS)
-
-
-def get_all_plans() -> dict:
-    """Get all plans from database."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT plan_id, days, price, label, channel FROM plans ORDER BY channel, days")
-    rows = cursor.fetchall()
-    conn.close()
-    
-    plans = {}
-    for row in rows:
-        plans[row[0]] = {
-            'days': row[1],
-            'price': row[2],
-            'label': row[3],
-            'channel': row[4]
-        }
-    
-    return plans
-
-
-def update_plan(plan_id: str, days: int = None, price: int = None, label: str = None) -> bool:
-    """Update a plan's days, price, or label.
-    
-    Args:
-        plan_id: The plan ID to update
-        days: New number of days (optional)
-        price: New price (optional)
-        label: New label (optional)
-    
-    Returns:
-        True if plan was updated, False if plan not found
-    """
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Check if plan exists
-    if USE_POSTGRES:
-        cursor.execute("SELECT plan_id FROM plans WHERE plan_id = %s", (plan_id,))
-    else:
-        cursor.execute("SELECT plan_id FROM plans WHERE plan_id = ?", (plan_id,))
-    
-    if not cursor.fetchone():
-        conn.close()
-        return False
-    
-    # Build update query
-    updates = []
-    params = []
-    
-    if days is not None:
-        updates.append("days = %s" if USE_POSTGRES else "days = ?")
-        params.append(days)
-    
-    if price is not None:
-        updates.append("price = %s" if USE_POSTGRES else "price = ?")
-        params.append(price)
-    
-    if label is not None:
-        updates.append("label = %s" if USE_POSTGRES else "label = ?")
-        params.append(label)
-    
-    if not updates:
-        conn.close()
-        return True
-    
-    params.append(plan_id)
-    
-    query = f"UPDATE plans SET {', '.join(updates)} WHERE plan_id = {'%s' if USE_POSTGRES else '?'}"
-    cursor.execute(query, params)
-    
-    conn.commit()
-    conn.close()
-    return True
-
-
-def get_plan(plan_id: str) -> dict:
-    """Get a single plan by ID."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("SELECT plan_id, days, price, label, channel FROM plans WHERE plan_id = %s", (plan_id,))
-    else:
-        cursor.execute("SELECT plan_id, days, price, label, channel FROM plans WHERE plan_id = ?", (plan_id,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return {
-            'plan_id': row[0],
-            'days': row[1],
-            'price': row[2],
-            'label': row[3],
-            'channel': row[4]
-        }
-    return None
-
-
-def refresh_config_plans():
-    """Refresh the config module's PLANS from database."""
-    import config
-    
-    db_plans = get_all_plans()
-    
-    if db_plans:
-        # Update the main PLANS dict
-        config.PLANS.clear()
-        config.PLANS.update(db_plans)
-        
-        # Update channel-specific plan dicts
-        config.CHANNEL_1_PLANS.clear()
-        config.CHANNEL_2_PLANS.clear()
-        config.CHANNEL_3_PLANS.clear()
-        config.ALL_IN_ONE_PLANS.clear()
-        
-        for plan_id, plan in db_plans.items():
-            if plan_id.startswith('ch1_'):
-                config.CHANNEL_1_PLANS[plan_id] = plan
-            elif plan_id.startswith('ch2_'):
-                config.CHANNEL_2_PLANS[plan_id] = plan
-            elif plan_id.startswith('ch3_'):
-                config.CHANNEL_3_PLANS[plan_id] = plan
-            elif plan_id.startswith('all_'):
-                config.ALL_IN_ONE_PLANS[plan_id] = plan
-
-
-# ==============================================
-# DYNAMIC SETTINGS MANAGEMENT
-# ==============================================
-
-def init_settings_table():
-    """Initialize the settings table for dynamic settings management."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        """)
-    else:
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        """)
-    
-    conn.commit()
-    conn.close()
-
-
-def populate_default_settings():
-    """Populate settings table with default settings from config if empty."""
-    import config
-    
-    default_settings = {
-        'upi_id': config.UPI_ID,
-        'binance_id': config.BINANCE_ID,
-        'paypal_email': config.PAYPAL_EMAIL,
-        'admin_username': config.ADMIN_USERNAME,
-        'tutorial_link': config.TUTORIAL_LINK,
-        'channel_1_name': 'HASEENA MAIN',
-        'channel_2_name': 'HASEENA 2.0',
-        'channel_3_name': 'SHEEP',
-        'start_image_url': getattr(config, 'START_IMAGE_URL', ''),
-        'premium_image_url': getattr(config, 'PREMIUM_IMAGE_URL', ''),
-    }
-    
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    for key, value in default_settings.items():
-        if USE_POSTGRES:
-            cursor.execute("""
-                INSERT INTO settings (key, value)
-                VALUES (%s, %s)
-                ON CONFLICT(key) DO NOTHING
-            """, (key, value))
-        else:
-            cursor.execute("""
-                INSERT INTO settings (key, value)
-                VALUES (?, ?)
-                ON CONFLICT(key) DO NOTHING
-            """, (key, value))
-    
-    conn.commit()
-    conn.close()
-
-
-def get_setting(key: str, default: str = None) -> str:
-    """Get a setting value by key."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("SELECT value FROM settings WHERE key = %s", (key,))
-    else:
-        cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
-    
-    row = cursor.fetchone()
-    conn.close()
-    
-    if row:
-        return row[0]
-    return default
-
-
-def set_setting(key: str, value: str) -> bool:
-    """Set a setting value."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    if USE_POSTGRES:
-        cursor.execute("""
-            INSERT INTO settings (key, value)
-            VALUES (%s, %s)
-            ON CONFLICT(key) DO UPDATE SET value = EXCLUDED.value
-        """, (key, value))
-    else:
-        cursor.execute("""
-            INSERT INTO settings (key, value)
-            VALUES (?, ?)
-            ON CONFLICT(key) DO UPDATE SET value = excluded.value
-        """, (key, value))
-    
-    conn.commit()
-    conn.close()
-    return True
-
-
-def get_all_settings() -> dict:
-    """Get all settings as a dictionary."""
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT key, value FROM settings ORDER BY key")
-    rows = cursor.fetchall()
-    conn.close()
-    
-    return {row[0]: row[1] for row in rows}
-
-
-def refresh_config_settings():
-    """Refresh the config module's settings from database."""
-    import config
-    
-    settings = get_all_settings()
-    
-    if settings:
-        # Update config values
-        if 'upi_id' in settings:
-            config.UPI_ID = settings['upi_id']
-        if 'binance_id' in settings:
-            config.BINANCE_ID = settings['binance_id']
-        if 'paypal_email' in settings:
-            config.PAYPAL_EMAIL = settings['paypal_email']
-        if 'admin_username' in settings:
-            config.ADMIN_USERNAME = settings['admin_username']
-        if 'tutorial_link' in settings:
-            config.TUTORIAL_LINK = settings['tutorial_link']
-        if 'start_image_url' in settings:
-            config.START_IMAGE_URL = settings['start_image_url']
-        if 'premium_image_url' in settings:
-            config.PREMIUM_IMAGE_URL = settings['premium_image_url']
-        
-        # Update channel name map
-        if 'channel_1_name' in settings:
-            config.CHANNEL_NAME_MAP['ch1'] = settings['channel_1_name']
-        if 'channel_2_name' in settings:
-            config.CHANNEL_NAME_MAP['ch2'] = settings['channel_2_name']
-        if 'channel_3_name' in settings:
-            config.CHANNEL_NAME_MAP['ch3'] = settings['channel_3_name']
-
-
-# Initialize database on import
-init_db()
-init_plans_table()
-populate_default_plans()
-refresh_config_plans()
-init_settings_table()
-populate_default_settings()
-refresh_config_settings()
-
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from config import DATABASE_URL, DATABASE_PATH, DATABASE_REPLICA_URL
+
+logger = logging.getLogger(__name__)
+
+# Try to use PostgreSQL if DATABASE_URL is set, otherwise fall back to SQLite
+USE_POSTGRES = bool(DATABASE_URL)
+
+if USE_POSTGRES:
+    import psycopg2
+    from psycopg2.extras import RealDictCursor, execute_values
+else:
+    import sqlite3
+
+
+# Callables run with a list of (user_id, channel_id, new expiry or None)
+# after every committed subscription change. They may be called from any
+# thread.
+subscription_listeners = []
+
+
+def _notify_subscription_changes(changes: list):
+    if not changes:
+        return
+    for listener in subscription_listeners:
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"Subscription listener failed: {e}")
+
+
+def get_connection():
+    """Get database connection based on configuration."""
+    if USE_POSTGRES:
+        return psycopg2.connect(DATABASE_URL)
+    else:
+        return sqlite3.connect(DATABASE_PATH)
+
+
+# ==============================================
+# READ REPLICA
+# ==============================================
+# With DATABASE_REPLICA_URL set, read-only helpers that tolerate lag -
+# user lists for broadcasts, stats, search, /checkuser and export - use
+# get_read_connection() and are served by the replica. Access checks and a
+# user's own subscriptions always read the primary: they decide whether to
+# remove someone from a channel or turn away a paying user, and a change
+# made by another worker is not visible to this one's sticky map. A user
+# whose subscriptions just changed in this worker reads from the primary
+# for REPLICA_STICKY_SECONDS.
+
+# user_id -> time.monotonic() until which their reads go to the primary
+_sticky_until = {}
+
+
+def _stick_to_primary(changes: list):
+    import config
+    until = time.monotonic() + config.REPLICA_STICKY_SECONDS
+    for user_id, _, _ in changes:
+        _sticky_until[user_id] = until
+    
+    if len(_sticky_until) > 10000:
+        now = time.monotonic()
+        for user_id, sticky_until in list(_sticky_until.items()):
+            if sticky_until < now:
+                _sticky_until.pop(user_id, None)
+
+
+subscription_listeners.append(_stick_to_primary)
+
+
+def get_read_connection(user_ids: list = ()):
+    """Connection for a read-only query - the replica when one is configured.
+    
+    Args:
+        user_ids: Users the query is about; if any of them changed recently
+            the primary is used instead
+    """
+    if not (USE_POSTGRES and DATABASE_REPLICA_URL):
+        return get_connection()
+    
+    now = time.monotonic()
+    if any(_sticky_until.get(user_id, 0) > now for user_id in user_ids):
+        return get_connection()
+    
+    try:
+        return psycopg2.connect(DATABASE_REPLICA_URL)
+    except Exception as e:
+        logger.warning(f"Read replica unavailable, using the primary: {e}")
+        return get_connection()
+
+
+def init_db():
+    """Initialize the database with required tables."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        # PostgreSQL syntax
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id BIGINT PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                joined_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Channel subscriptions table - tracks per-channel access
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS channel_subscriptions (
+                id SERIAL PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TIMESTAMP NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, channel_id)
+            )
+        """)
+        
+        # Create index for faster lookups
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_subs_user_id ON channel_subscriptions(user_id)
+        """)
+    else:
+        # SQLite syntax
+        # Users table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                joined_at TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        
+        # Channel subscriptions table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS channel_subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE(user_id, channel_id)
+            )
+        """)
+    
+    # Range scans over expiry (expiry sweeper)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_subs_expiry ON channel_subscriptions(expiry, id)
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def add_user(user_id: int, username: str = None, first_name: str = None):
+    """Add a new user or update existing user info."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO users (user_id, username, first_name)
+            VALUES (%s, %s, %s)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = EXCLUDED.username,
+                first_name = EXCLUDED.first_name
+        """, (user_id, username, first_name))
+    else:
+        cursor.execute("""
+            INSERT INTO users (user_id, username, first_name)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = excluded.username,
+                first_name = excluded.first_name
+        """, (user_id, username, first_name))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_user(user_id: int) -> dict:
+    """Get user information."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("SELECT user_id, username, first_name, joined_at FROM users WHERE user_id = %s", (user_id,))
+    else:
+        cursor.execute("SELECT user_id, username, first_name, joined_at FROM users WHERE user_id = ?", (user_id,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {
+            "user_id": row[0],
+            "username": row[1],
+            "first_name": row[2],
+            "joined_at": row[3]
+        }
+    return None
+
+
+def add_premium(user_id: int, days: int, channel_id: str = 'all'):
+    """Add premium subscription for a specific channel or all channels.
+    
+    Args:
+        user_id: The user's Telegram ID
+        days: Number of days for the subscription
+        channel_id: 'ch1', 'ch2', 'ch3', or 'all' for all channels
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    changes = _add_premium(cursor, user_id, days, channel_id)
+    
+    conn.commit()
+    conn.close()
+    _notify_subscription_changes(changes)
+
+
+def _covered_until(active: dict, channel_id: str):
+    """Until when a user's active subscriptions already cover a channel or bundle.
+    
+    A channel is covered by its own row or by any bundle containing it; a
+    bundle is covered until the first of its channels runs out.
+    
+    Args:
+        active: {channel or bundle code: expiry} of the user's unexpired rows
+        channel_id: Channel or bundle code
+    
+    Returns:
+        The expiry (datetime), or None if not covered at all
+    """
+    import config
+    
+    def channel_until(code):
+        expiries = [
+            expiry for grant, expiry in active.items()
+            if grant == code or code in config.BUNDLES.get(grant, {}).get('channels', ())
+        ]
+        return max(expiries) if expiries else None
+    
+    if channel_id not in config.BUNDLES:
+        return channel_until(channel_id)
+    
+    members = [channel_until(code) for code in config.BUNDLES[channel_id]['channels']]
+    if not members or None in members:
+        return active.get(channel_id)
+    return min(members)
+
+
+def _add_premium(cursor, user_id: int, days: int, channel_id: str) -> list:
+    """Extend or create a subscription using an open cursor (no commit).
+    
+    A bundle is stored as a single row under its own code. The new expiry
+    extends from whatever currently covers the channel or bundle (see
+    _covered_until), so buying a bundle on top of channel subscriptions, or
+    a channel on top of a bundle, never loses paid time.
+    
+    Returns:
+        List of (user_id, channel_id, new expiry) for _notify_subscription_changes
+    """
+    now = datetime.now()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = %s AND expiry > %s",
+            (user_id, now)
+        )
+        active = dict(cursor.fetchall())
+    else:
+        cursor.execute(
+            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = ? AND expiry > ?",
+            (user_id, now.isoformat())
+        )
+        active = {row[0]: datetime.fromisoformat(row[1]) for row in cursor.fetchall()}
+    
+    current = _covered_until(active, channel_id)
+    new_expiry = max(current, now) if current else now
+    new_expiry += timedelta(days=days)
+    
+    # Insert or update subscription
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO channel_subscriptions (user_id, channel_id, expiry)
+            VALUES (%s, %s, %s)
+            ON CONFLICT(user_id, channel_id) DO UPDATE SET
+                expiry = EXCLUDED.expiry
+        """, (user_id, channel_id, new_expiry))
+    else:
+        cursor.execute("""
+            INSERT INTO channel_subscriptions (user_id, channel_id, expiry)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id, channel_id) DO UPDATE SET
+                expiry = excluded.expiry
+        """, (user_id, channel_id, new_expiry.isoformat()))
+    
+    return [(user_id, channel_id, new_expiry)]
+
+
+def bulk_add_premium(grants: list, chunk_size: int = 1000) -> list:
+    """Add premium for many users with the same extend-from-current-expiry rules as add_premium.
+    
+    Each chunk is one transaction: current expiries are read with a single
+    query, new expiries are computed in Python and written back with one
+    batched upsert. Repeated rows for the same user and channel stack.
+    
+    Args:
+        grants: List of (user_id, channel_id, days) - channel_id may be a bundle
+        chunk_size: Grants written per transaction
+    
+    Returns:
+        New expiry (datetime) for each grant, in input order
+    """
+    results = []
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for start in range(0, len(grants), chunk_size):
+            chunk = grants[start:start + chunk_size]
+            user_ids = list({user_id for user_id, _, _ in chunk})
+            
+            # Current expiries for everyone in the chunk
+            if USE_POSTGRES:
+                cursor.execute(
+                    "SELECT user_id, channel_id, expiry FROM channel_subscriptions WHERE user_id = ANY(%s)",
+                    (user_ids,)
+                )
+            else:
+                placeholders = ",".join("?" * len(user_ids))
+                cursor.execute(
+                    f"SELECT user_id, channel_id, expiry FROM channel_subscriptions WHERE user_id IN ({placeholders})",
+                    user_ids
+                )
+            now = datetime.now()
+            active = {}  # user_id -> {code: expiry} of unexpired subscriptions
+            for user_id, ch, expiry in cursor.fetchall():
+                expiry = expiry if USE_POSTGRES else datetime.fromisoformat(expiry)
+                if expiry > now:
+                    active.setdefault(user_id, {})[ch] = expiry
+            
+            changed = {}
+            for user_id, channel_id, days in chunk:
+                user_active = active.setdefault(user_id, {})
+                current = _covered_until(user_active, channel_id)
+                new_expiry = max(current, now) if current else now
+                new_expiry += timedelta(days=days)
+                user_active[channel_id] = changed[(user_id, channel_id)] = new_expiry
+                results.append(new_expiry)
+            
+            rows = [(user_id, ch, expiry) for (user_id, ch), expiry in changed.items()]
+            if USE_POSTGRES:
+                execute_values(
+                    cursor,
+                    "INSERT INTO users (user_id) VALUES %s ON CONFLICT(user_id) DO NOTHING",
+                    [(user_id,) for user_id in user_ids]
+                )
+                execute_values(cursor, """
+                    INSERT INTO channel_subscriptions (user_id, channel_id, expiry) VALUES %s
+                    ON CONFLICT(user_id, channel_id) DO UPDATE SET
+                        expiry = EXCLUDED.expiry
+                """, rows)
+            else:
+                cursor.executemany(
+                    "INSERT INTO users (user_id) VALUES (?) ON CONFLICT(user_id) DO NOTHING",
+                    [(user_id,) for user_id in user_ids]
+                )
+                cursor.executemany("""
+                    INSERT INTO channel_subscriptions (user_id, channel_id, expiry) VALUES (?, ?, ?)
+                    ON CONFLICT(user_id, channel_id) DO UPDATE SET
+                        expiry = excluded.expiry
+                """, [(user_id, ch, expiry.isoformat()) for user_id, ch, expiry in rows])
+            
+            conn.commit()
+            _notify_subscription_changes(rows)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return results
+
+
+def has_channel_access(user_id: int, channel_id: str) -> bool:
+    """Check if user has active access to a specific channel.
+    
+    Args:
+        user_id: The user's Telegram ID
+        channel_id: Channel code, e.g. 'ch1'
+    
+    Returns:
+        True if user has an active subscription to the channel or a bundle containing it
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # The channel's own subscription or any bundle containing it
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT 1 FROM channel_subscriptions
+            WHERE user_id = %s AND expiry > %s AND (channel_id = %s OR channel_id IN (
+                SELECT bundle_code FROM bundle_channels WHERE channel_code = %s
+            ))
+            LIMIT 1
+        """, (user_id, datetime.now(), channel_id, channel_id))
+    else:
+        cursor.execute("""
+            SELECT 1 FROM channel_subscriptions
+            WHERE user_id = ? AND expiry > ? AND (channel_id = ? OR channel_id IN (
+                SELECT bundle_code FROM bundle_channels WHERE channel_code = ?
+            ))
+            LIMIT 1
+        """, (user_id, datetime.now().isoformat(), channel_id, channel_id))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    return row is not None
+
+
+def get_users_with_access(user_ids: list, channel_id: str) -> set:
+    """Of the given users, those with active access to a channel, directly or by bundle (one query)."""
+    if not user_ids:
+        return set()
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT DISTINCT user_id FROM channel_subscriptions
+            WHERE user_id = ANY(%s) AND expiry > %s AND (channel_id = %s OR channel_id IN (
+                SELECT bundle_code FROM bundle_channels WHERE channel_code = %s
+            ))
+        """, (list(user_ids), datetime.now(), channel_id, channel_id))
+    else:
+        placeholders = ",".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT DISTINCT user_id FROM channel_subscriptions
+            WHERE user_id IN ({placeholders}) AND expiry > ? AND (channel_id = ? OR channel_id IN (
+                SELECT bundle_code FROM bundle_channels WHERE channel_code = ?
+            ))
+        """, (*user_ids, datetime.now().isoformat(), channel_id, channel_id))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    return {row[0] for row in rows}
+
+
+def is_premium(user_id: int, channel_id: str = None) -> bool:
+    """Check if user has active premium.
+    
+    Args:
+        user_id: The user's Telegram ID
+        channel_id: Optional - check specific channel, or None to check if user has any active subscription
+    
+    Returns:
+        True if user has active subscription
+    """
+    if channel_id:
+        return has_channel_access(user_id, channel_id)
+    
+    # Check if user has any active subscription
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT COUNT(*) FROM channel_subscriptions WHERE user_id = %s AND expiry > %s",
+            (user_id, now)
+        )
+    else:
+        cursor.execute(
+            "SELECT COUNT(*) FROM channel_subscriptions WHERE user_id = ? AND expiry > ?",
+            (user_id, now.isoformat())
+        )
+    
+    count = cursor.fetchone()[0]
+    conn.close()
+    
+    return count > 0
+
+
+def get_user_subscriptions(user_id: int) -> list:
+    """Get all active subscriptions for a user.
+    
+    Returns:
+        List of dicts with channel_id and expiry for each active subscription
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = %s AND expiry > %s ORDER BY channel_id",
+            (user_id, now)
+        )
+    else:
+        cursor.execute(
+            "SELECT channel_id, expiry FROM channel_subscriptions WHERE user_id = ? AND expiry > ? ORDER BY channel_id",
+            (user_id, now.isoformat())
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    result = []
+    for row in rows:
+        if USE_POSTGRES:
+            expiry = row[1]
+        else:
+            expiry = datetime.fromisoformat(row[1])
+        
+        result.append({
+            'channel_id': row[0],
+            'expiry': expiry.strftime("%d %b %Y, %I:%M %p")
+        })
+    
+    return result
+
+
+def get_premium_expiry(user_id: int, channel_id: str = None) -> str:
+    """Get premium expiry date as formatted string.
+    
+    Args:
+        user_id: The user's Telegram ID
+        channel_id: Optional - get expiry for specific channel
+    
+    Returns:
+        Formatted expiry date or 'N/A'
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if channel_id:
+        if USE_POSTGRES:
+            cursor.execute(
+                "SELECT expiry FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
+                (user_id, channel_id)
+            )
+        else:
+            cursor.execute(
+                "SELECT expiry FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
+                (user_id, channel_id)
+            )
+    else:
+        # Get the latest expiry across all channels
+        if USE_POSTGRES:
+            cursor.execute(
+                "SELECT MAX(expiry) FROM channel_subscriptions WHERE user_id = %s",
+                (user_id,)
+            )
+        else:
+            cursor.execute(
+                "SELECT MAX(expiry) FROM channel_subscriptions WHERE user_id = ?",
+                (user_id,)
+            )
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row and row[0]:
+        try:
+            if USE_POSTGRES:
+                expiry = row[0]
+            else:
+                expiry = datetime.fromisoformat(row[0])
+            return expiry.strftime("%d %b %Y, %I:%M %p")
+        except:
+            pass
+    
+    return "N/A"
+
+
+def remove_premium(user_id: int, channel_id: str = None):
+    """Remove premium subscription from a user.
+    
+    Args:
+        user_id: The user's Telegram ID
+        channel_id: Optional - remove specific channel, or None to remove all
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if channel_id:
+        if USE_POSTGRES:
+            cursor.execute(
+                "DELETE FROM channel_subscriptions WHERE user_id = %s AND channel_id = %s",
+                (user_id, channel_id)
+            )
+        else:
+            cursor.execute(
+                "DELETE FROM channel_subscriptions WHERE user_id = ? AND channel_id = ?",
+                (user_id, channel_id)
+            )
+    else:
+        # Remove all subscriptions
+        if USE_POSTGRES:
+            cursor.execute("DELETE FROM channel_subscriptions WHERE user_id = %s", (user_id,))
+        else:
+            cursor.execute("DELETE FROM channel_subscriptions WHERE user_id = ?", (user_id,))
+    
+    conn.commit()
+    conn.close()
+    
+    import config
+    codes = [channel_id] if channel_id else list(config.CHANNEL_NAME_MAP)
+    _notify_subscription_changes([(user_id, code, None) for code in codes])
+
+
+def get_all_users() -> list:
+    """Get all users."""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT user_id FROM users")
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [row[0] for row in rows]
+
+
+def get_stats() -> dict:
+    """Get bot statistics with per-channel breakdown."""
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    
+    # Total users
+    cursor.execute("SELECT COUNT(*) FROM users")
+    total_users = cursor.fetchone()[0]
+    
+    now = datetime.now()
+    
+    # Users with any active subscription
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT COUNT(DISTINCT user_id) FROM channel_subscriptions WHERE expiry > %s",
+            (now,)
+        )
+    else:
+        cursor.execute(
+            "SELECT COUNT(DISTINCT user_id) FROM channel_subscriptions WHERE expiry > ?",
+            (now.isoformat(),)
+        )
+    premium_users = cursor.fetchone()[0]
+    
+    # Per-channel stats - subscribers of the channel itself or of a bundle containing it
+    grants_sql = """
+        SELECT g.channel_code, COUNT(DISTINCT s.user_id)
+        FROM channel_subscriptions s
+        JOIN (
+            SELECT code AS channel_code, code AS grant_code FROM channels
+            UNION ALL
+            SELECT channel_code, bundle_code FROM bundle_channels
+        ) g ON s.channel_id = g.grant_code
+        WHERE s.expiry > {}
+        GROUP BY g.channel_code
+    """
+    if USE_POSTGRES:
+        cursor.execute(grants_sql.format("%s"), (now,))
+    else:
+        cursor.execute(grants_sql.format("?"), (now.isoformat(),))
+    channel_stats = dict(cursor.fetchall())
+    
+    conn.close()
+    
+    return {
+        "total_users": total_users,
+        "premium_users": premium_users,
+        "free_users": total_users - premium_users,
+        "channel_stats": channel_stats
+    }
+
+
+# ==============================================
+# DYNAMIC PLANS MANAGEMENT
+# ==============================================
+
+def init_plans_table():
+    """Initialize the plans table for dynamic plan management."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                plan_id TEXT PRIMARY KEY,
+                days INTEGER NOT NULL,
+                price INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                channel TEXT NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS plans (
+                plan_id TEXT PRIMARY KEY,
+                days INTEGER NOT NULL,
+                price INTEGER NOT NULL,
+                label TEXT NOT NULL,
+                channel TEXT NOT NULL
+            )
+        """)
+    
+    conn.commit()
+    conn.close()
+
+
+def populate_default_plans():
+    """Populate plans table with default plans from config if empty."""
+    import config
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Check if plans table is empty
+    cursor.execute("SELECT COUNT(*) FROM plans")
+    count = cursor.fetchone()[0]
+    
+    if count == 0:
+        # Insert default plans from config
+        for plan_id, plan in config.PLANS.items():
+            if USE_POSTGRES:
+                cursor.execute("""
+                    INSERT INTO plans (plan_id, days, price, label, channel)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT(plan_id) DO NOTHING
+                """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
+            else:
+                cursor.execute("""
+                    INSERT INTO plans (plan_id, days, price, label, channel)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(plan_id) DO NOTHING
+                """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
+        
+        conn.commit()
+    
+    conn.close()
+
+
+def reset_all_plans():
+    """Delete all plans and repopulate from config. Use this to sync plans from config.py.
+    
+    Call config_sync.sync() afterwards to load them.
+    """
+    import config
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Delete all existing plans
+    cursor.execute("DELETE FROM plans")
+    
+    # Insert all plans from config
+    for plan_id, plan in config.PLANS.items():
+        if USE_POSTGRES:
+            cursor.execute("""
+                INSERT INTO plans (plan_id, days, price, label, channel)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
+        else:
+            cursor.execute("""
+                INSERT INTO plans (plan_id, days, price, label, channel)
+                VALUES (?, ?, ?, ?, ?)
+            """, (plan_id, plan['days'], plan['price'], plan['label'], plan['channel']))
+    
+    _bump_config_version(cursor, 'plans')
+    conn.commit()
+    conn.close()
+    
+    return len(config.PLANS)
+
+
+def get_all_plans() -> dict:
+    """Get all plans from database."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT plan_id, days, price, label, channel FROM plans ORDER BY channel, days")
+    rows = cursor.fetchall()
+    conn.close()
+    
+    plans = {}
+    for row in rows:
+        plans[row[0]] = {
+            'days': row[1],
+            'price': row[2],
+            'label': row[3],
+            'channel': row[4]
+        }
+    
+    return plans
+
+
+def update_plan(plan_id: str, days: int = None, price: int = None, label: str = None) -> bool:
+    """Update a plan's days, price, or label.
+    
+    Args:
+        plan_id: The plan ID to update
+        days: New number of days (optional)
+        price: New price (optional)
+        label: New label (optional)
+    
+    Returns:
+        True if plan was updated, False if plan not found
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Check if plan exists
+    if USE_POSTGRES:
+        cursor.execute("SELECT plan_id FROM plans WHERE plan_id = %s", (plan_id,))
+    else:
+        cursor.execute("SELECT plan_id FROM plans WHERE plan_id = ?", (plan_id,))
+    
+    if not cursor.fetchone():
+        conn.close()
+        return False
+    
+    # Build update query
+    updates = []
+    params = []
+    
+    if days is not None:
+        updates.append("days = %s" if USE_POSTGRES else "days = ?")
+        params.append(days)
+    
+    if price is not None:
+        updates.append("price = %s" if USE_POSTGRES else "price = ?")
+        params.append(price)
+    
+    if label is not None:
+        updates.append("label = %s" if USE_POSTGRES else "label = ?")
+        params.append(label)
+    
+    if not updates:
+        conn.close()
+        return True
+    
+    params.append(plan_id)
+    
+    query = f"UPDATE plans SET {', '.join(updates)} WHERE plan_id = {'%s' if USE_POSTGRES else '?'}"
+    cursor.execute(query, params)
+    _bump_config_version(cursor, 'plans')
+    
+    conn.commit()
+    conn.close()
+    return True
+
+
+def add_plan(plan_id: str, days: int, price: int, label: str, channel: str) -> bool:
+    """Add a new plan.
+    
+    Args:
+        plan_id: '<channel or bundle code>_<anything>', e.g. 'ch4_30_days'
+        channel: Display name of the channel or bundle
+    
+    Returns:
+        True if the plan was added, False if the plan_id already exists
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO plans (plan_id, days, price, label, channel)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT(plan_id) DO NOTHING
+        """, (plan_id, days, price, label, channel))
+    else:
+        cursor.execute("""
+            INSERT INTO plans (plan_id, days, price, label, channel)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(plan_id) DO NOTHING
+        """, (plan_id, days, price, label, channel))
+    
+    added = cursor.rowcount > 0
+    if added:
+        _bump_config_version(cursor, 'plans')
+    conn.commit()
+    conn.close()
+    
+    return added
+
+
+def get_plan(plan_id: str) -> dict:
+    """Get a single plan by ID."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("SELECT plan_id, days, price, label, channel FROM plans WHERE plan_id = %s", (plan_id,))
+    else:
+        cursor.execute("SELECT plan_id, days, price, label, channel FROM plans WHERE plan_id = ?", (plan_id,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return {
+            'plan_id': row[0],
+            'days': row[1],
+            'price': row[2],
+            'label': row[3],
+            'channel': row[4]
+        }
+    return None
+
+
+def refresh_config_plans():
+    """Rebuild the plan catalog from the database and swap it in."""
+    import config
+    import plan_catalog
+    
+    db_plans = get_all_plans() or config.PLANS
+    
+    plans = [
+        plan_catalog.Plan(plan_id, plan['days'], plan['price'], plan['label'], plan['channel'])
+        for plan_id, plan in db_plans.items()
+    ]
+    catalog = plan_catalog.PlanCatalog.build(plans, config.CATALOG_VERSION + 1)
+    plan_catalog.swap(catalog)
+    config.CATALOG_VERSION = catalog.version
+
+
+# ==============================================
+# DYNAMIC SETTINGS MANAGEMENT
+# ==============================================
+
+def init_settings_table():
+    """Initialize the settings table for dynamic settings management."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS settings (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            )
+        """)
+    
+    conn.commit()
+    conn.close()
+
+
+def populate_default_settings():
+    """Populate settings table with default settings from config if empty."""
+    import app_settings
+    
+    defaults = app_settings.Settings.defaults()
+    default_settings = {key: defaults.get(key) for key in app_settings.SETTING_KEYS}
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    for key, value in default_settings.items():
+        if USE_POSTGRES:
+            cursor.execute("""
+                INSERT INTO settings (key, value)
+                VALUES (%s, %s)
+                ON CONFLICT(key) DO NOTHING
+            """, (key, value))
+        else:
+            cursor.execute("""
+                INSERT INTO settings (key, value)
+                VALUES (?, ?)
+                ON CONFLICT(key) DO NOTHING
+            """, (key, value))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_setting(key: str, default: str = None) -> str:
+    """Get a setting value by key."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("SELECT value FROM settings WHERE key = %s", (key,))
+    else:
+        cursor.execute("SELECT value FROM settings WHERE key = ?", (key,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return row[0]
+    return default
+
+
+def set_setting(key: str, value: str) -> bool:
+    """Set a setting value.
+    
+    Editable settings (app_settings.SETTING_KEYS) bump the settings version
+    so every worker reloads them; other keys (cached file_ids) do not.
+    """
+    import app_settings
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO settings (key, value)
+            VALUES (%s, %s)
+            ON CONFLICT(key) DO UPDATE SET value = EXCLUDED.value
+        """, (key, value))
+    else:
+        cursor.execute("""
+            INSERT INTO settings (key, value)
+            VALUES (?, ?)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value
+        """, (key, value))
+    if key in app_settings.SETTING_KEYS:
+        _bump_config_version(cursor, 'settings')
+    
+    conn.commit()
+    conn.close()
+    return True
+
+
+def get_all_settings() -> dict:
+    """Get all settings as a dictionary."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT key, value FROM settings ORDER BY key")
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return {row[0]: row[1] for row in rows}
+
+
+def refresh_config_settings():
+    """Load the editable settings into a new app_settings snapshot."""
+    import app_settings
+    import config
+    
+    keys = list(app_settings.SETTING_KEYS)
+    placeholders = ",".join(["%s" if USE_POSTGRES else "?"] * len(keys))
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT key, value FROM settings WHERE key IN ({placeholders})", keys)
+    rows = dict(cursor.fetchall())
+    conn.close()
+    
+    app_settings.swap(app_settings.Settings.from_rows(rows))
+    config.CATALOG_VERSION += 1
+
+
+# ==============================================
+# CHANNEL REGISTRY
+# ==============================================
+# Channels the bot sells access to, and bundles that grant a set of them.
+# A purchase stores one row under the channel or bundle code; access checks
+# resolve bundles through bundle_channels (see has_channel_access).
+
+def init_channel_tables():
+    """Initialize the channels, bundles and bundle_channels tables."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                code TEXT PRIMARY KEY,
+                chat_id BIGINT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS channels (
+                code TEXT PRIMARY KEY,
+                chat_id INTEGER NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                position INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bundles (
+            code TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            position INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS bundle_channels (
+            bundle_code TEXT NOT NULL,
+            channel_code TEXT NOT NULL,
+            PRIMARY KEY (bundle_code, channel_code)
+        )
+    """)
+    # Access checks look bundles up by channel
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_bundle_channels_channel
+        ON bundle_channels (channel_code, bundle_code)
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def populate_default_channels():
+    """Register the three configured channels and the 'all' bundle if the registry is empty."""
+    import config
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT COUNT(*) FROM channels")
+    count = cursor.fetchone()[0]
+    
+    if count == 0:
+        # Names customised through /setsetting before the registry existed
+        cursor.execute("SELECT key, value FROM settings WHERE key LIKE 'channel_%_name'")
+        names = dict(cursor.fetchall())
+        
+        defaults = [
+            ('ch1', config.CHANNEL_1_ID, names.get('channel_1_name', 'HASEENA MAIN')),
+            ('ch2', config.CHANNEL_2_ID, names.get('channel_2_name', 'HASEENA 2.0')),
+            ('ch3', config.CHANNEL_3_ID, names.get('channel_3_name', 'SHEEP')),
+        ]
+        p = "%s" if USE_POSTGRES else "?"
+        for position, (code, chat_id, name) in enumerate(defaults):
+            cursor.execute(
+                f"INSERT INTO channels (code, chat_id, name, position) VALUES ({p}, {p}, {p}, {p})",
+                (code, chat_id, name, position)
+            )
+        cursor.execute(
+            f"INSERT INTO bundles (code, name, position) VALUES ({p}, {p}, {p})",
+            ('all', 'ALL CHANNELS', 0)
+        )
+        for code, _, _ in defaults:
+            cursor.execute(
+                f"INSERT INTO bundle_channels (bundle_code, channel_code) VALUES ({p}, {p})",
+                ('all', code)
+            )
+        
+        conn.commit()
+    
+    conn.close()
+
+
+def get_channels() -> list:
+    """All registered channels in menu order.
+    
+    Returns:
+        List of dicts with code, chat_id and name
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT code, chat_id, name FROM channels ORDER BY position, code")
+    rows = cursor.fetchall()
+    conn.close()
+    return [{'code': row[0], 'chat_id': row[1], 'name': row[2]} for row in rows]
+
+
+def get_bundles() -> list:
+    """All bundles in menu order.
+    
+    Returns:
+        List of dicts with code, name and channels (list of channel codes)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT code, name FROM bundles ORDER BY position, code")
+    bundles = [{'code': row[0], 'name': row[1], 'channels': []} for row in cursor.fetchall()]
+    cursor.execute("""
+        SELECT b.bundle_code, b.channel_code FROM bundle_channels b
+        JOIN channels c ON c.code = b.channel_code
+        ORDER BY c.position, c.code
+    """)
+    members = {}
+    for bundle_code, channel_code in cursor.fetchall():
+        members.setdefault(bundle_code, []).append(channel_code)
+    conn.close()
+    for bundle in bundles:
+        bundle['channels'] = members.get(bundle['code'], [])
+    return bundles
+
+
+def set_channel(code: str, chat_id: int, name: str):
+    """Register a channel or update its chat ID and name.
+    
+    Raises:
+        ValueError: If the code is already used by a bundle
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("SELECT 1 FROM bundles WHERE code = %s", (code,))
+        if cursor.fetchone():
+            conn.close()
+            raise ValueError(f"'{code}' is already a bundle")
+        cursor.execute("""
+            INSERT INTO channels (code, chat_id, name, position)
+            VALUES (%s, %s, %s, (SELECT COALESCE(MAX(position) + 1, 0) FROM channels))
+            ON CONFLICT(code) DO UPDATE SET chat_id = EXCLUDED.chat_id, name = EXCLUDED.name
+        """, (code, chat_id, name))
+    else:
+        cursor.execute("SELECT 1 FROM bundles WHERE code = ?", (code,))
+        if cursor.fetchone():
+            conn.close()
+            raise ValueError(f"'{code}' is already a bundle")
+        cursor.execute("""
+            INSERT INTO channels (code, chat_id, name, position)
+            VALUES (?, ?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM channels))
+            ON CONFLICT(code) DO UPDATE SET chat_id = excluded.chat_id, name = excluded.name
+        """, (code, chat_id, name))
+    _bump_config_version(cursor, 'channels')
+    
+    conn.commit()
+    conn.close()
+
+
+def set_bundle(code: str, name: str, channels: list):
+    """Create a bundle or replace its name and channels.
+    
+    Raises:
+        ValueError: If the code is a channel or a listed channel is not registered
+    """
+    registered = {channel['code'] for channel in get_channels()}
+    if code in registered:
+        raise ValueError(f"'{code}' is already a channel")
+    if not channels:
+        raise ValueError("A bundle needs at least one channel")
+    unknown = [ch for ch in channels if ch not in registered]
+    if unknown:
+        raise ValueError(f"Unknown channels: {', '.join(unknown)}")
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO bundles (code, name, position)
+            VALUES (%s, %s, (SELECT COALESCE(MAX(position) + 1, 0) FROM bundles))
+            ON CONFLICT(code) DO UPDATE SET name = EXCLUDED.name
+        """, (code, name))
+        cursor.execute("DELETE FROM bundle_channels WHERE bundle_code = %s", (code,))
+        cursor.executemany(
+            "INSERT INTO bundle_channels (bundle_code, channel_code) VALUES (%s, %s)",
+            [(code, ch) for ch in dict.fromkeys(channels)]
+        )
+    else:
+        cursor.execute("""
+            INSERT INTO bundles (code, name, position)
+            VALUES (?, ?, (SELECT COALESCE(MAX(position) + 1, 0) FROM bundles))
+            ON CONFLICT(code) DO UPDATE SET name = excluded.name
+        """, (code, name))
+        cursor.execute("DELETE FROM bundle_channels WHERE bundle_code = ?", (code,))
+        cursor.executemany(
+            "INSERT INTO bundle_channels (bundle_code, channel_code) VALUES (?, ?)",
+            [(code, ch) for ch in dict.fromkeys(channels)]
+        )
+    _bump_config_version(cursor, 'channels')
+    
+    conn.commit()
+    conn.close()
+
+
+def refresh_config_channels():
+    """Refresh the config module's channel and bundle maps from the registry.
+    
+    The maps are built aside and then swapped in, so threads reading them
+    never see a half-filled map.
+    """
+    import config
+    
+    channels = get_channels()
+    bundles = get_bundles()
+    
+    channel_map = {}
+    bundle_map = {}
+    id_map = {}
+    chat_ids = {}
+    names = {}
+    
+    for channel in channels:
+        channel_map[channel['code']] = {'chat_id': channel['chat_id'], 'name': channel['name']}
+        id_map[channel['chat_id']] = channel['code']
+        chat_ids[channel['code']] = channel['chat_id']
+        names[channel['code']] = channel['name']
+    
+    for bundle in bundles:
+        bundle_map[bundle['code']] = {'name': bundle['name'], 'channels': bundle['channels']}
+        names[bundle['code']] = bundle['name']
+    
+    config.CHANNELS = channel_map
+    config.BUNDLES = bundle_map
+    config.CHANNEL_ID_MAP = id_map
+    config.CHANNEL_CHAT_IDS = chat_ids
+    config.CHANNEL_NAME_MAP = names
+    
+    if channels:
+        config.CHANNEL_ID = channels[0]['chat_id']
+    
+    config.CATALOG_VERSION += 1
+
+
+def expand_channels(channel_id: str) -> list:
+    """Channel codes a channel or bundle code grants access to."""
+    import config
+    
+    bundle = config.BUNDLES.get(channel_id)
+    if bundle:
+        return list(bundle['channels'])
+    return [channel_id] if channel_id in config.CHANNELS else []
+
+
+# ==============================================
+# CONFIG VERSIONS (cross-worker reloads)
+# ==============================================
+# Every write to plans, settings or the channel registry bumps the version
+# of its scope in the same transaction. On PostgreSQL the bump also sends a
+# NOTIFY on CONFIG_NOTIFY_CHANNEL, delivered to listeners at commit; on
+# SQLite workers notice writes through PRAGMA data_version. config_sync.py
+# then reloads only the scopes whose version moved.
+
+CONFIG_NOTIFY_CHANNEL = "config_changed"
+
+
+def init_config_versions_table():
+    """Initialize the config_versions table."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS config_versions (
+            scope TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def _bump_config_version(cursor, scope: str):
+    """Bump a scope's version using an open cursor (no commit)."""
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO config_versions (scope, version) VALUES (%s, 1)
+            ON CONFLICT(scope) DO UPDATE SET version = config_versions.version + 1
+        """, (scope,))
+        cursor.execute("SELECT pg_notify(%s, %s)", (CONFIG_NOTIFY_CHANNEL, scope))
+    else:
+        cursor.execute("""
+            INSERT INTO config_versions (scope, version) VALUES (?, 1)
+            ON CONFLICT(scope) DO UPDATE SET version = config_versions.version + 1
+        """, (scope,))
+
+
+def get_config_versions() -> dict:
+    """Current version of every scope that was ever changed: {scope: version}."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT scope, version FROM config_versions")
+    versions = dict(cursor.fetchall())
+    conn.close()
+    return versions
+
+
+def get_config_listen_connection():
+    """A connection that receives config change notifications.
+    
+    PostgreSQL: an autocommit connection LISTENing on CONFIG_NOTIFY_CHANNEL.
+    SQLite: a plain connection whose PRAGMA data_version changes whenever
+    another connection commits.
+    """
+    conn = get_connection()
+    if USE_POSTGRES:
+        conn.autocommit = True
+        cursor = conn.cursor()
+        cursor.execute(f"LISTEN {CONFIG_NOTIFY_CHANNEL}")
+        cursor.close()
+    return conn
+
+
+# ==============================================
+# ORDERS (pending payments)
+# ==============================================
+
+def init_orders_table():
+    """Initialize the orders table that records every generated transaction ID."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id SERIAL PRIMARY KEY,
+                trx_id TEXT NOT NULL,
+                user_id BIGINT NOT NULL,
+                plan_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                method TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TIMESTAMP NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trx_id TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                plan_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                method TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                created_at TEXT NOT NULL
+            )
+        """)
+    
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_orders_trx_id ON orders(trx_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status_amount ON orders(status, amount)")
+    
+    conn.commit()
+    conn.close()
+
+
+def _order_from_row(row) -> dict:
+    return {
+        'trx_id': row[0],
+        'user_id': row[1],
+        'plan_id': row[2],
+        'amount': row[3],
+        'method': row[4],
+        'status': row[5],
+        'created_at': row[6] if USE_POSTGRES else datetime.fromisoformat(row[6]),
+    }
+
+
+def create_order(trx_id: str, user_id: int, plan_id: str, amount: int, method: str) -> datetime:
+    """Record a new pending order.
+    
+    Returns:
+        The order's creation time
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    created_at = datetime.now()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO orders (trx_id, user_id, plan_id, amount, method, status, created_at)
+            VALUES (%s, %s, %s, %s, %s, 'pending', %s)
+        """, (trx_id, user_id, plan_id, amount, method, created_at))
+    else:
+        cursor.execute("""
+            INSERT INTO orders (trx_id, user_id, plan_id, amount, method, status, created_at)
+            VALUES (?, ?, ?, ?, ?, 'pending', ?)
+        """, (trx_id, user_id, plan_id, amount, method, created_at.isoformat()))
+    
+    conn.commit()
+    conn.close()
+    return created_at
+
+
+def get_order(trx_id: str) -> dict:
+    """Get an order by transaction ID (single unique index lookup)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT trx_id, user_id, plan_id, amount, method, status, created_at FROM orders WHERE trx_id = %s",
+            (trx_id,)
+        )
+    else:
+        cursor.execute(
+            "SELECT trx_id, user_id, plan_id, amount, method, status, created_at FROM orders WHERE trx_id = ?",
+            (trx_id,)
+        )
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return _order_from_row(row)
+    return None
+
+
+def get_pending_orders() -> list:
+    """Get all pending orders, oldest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT trx_id, user_id, plan_id, amount, method, status, created_at FROM orders "
+        "WHERE status = 'pending' ORDER BY created_at"
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [_order_from_row(row) for row in rows]
+
+
+def get_unpaid_orders(since: datetime) -> list:
+    """Get pending and expired orders created since `since`, oldest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT trx_id, user_id, plan_id, amount, method, status, created_at FROM orders "
+            "WHERE status IN ('pending', 'expired') AND created_at >= %s ORDER BY created_at",
+            (since,)
+        )
+    else:
+        cursor.execute(
+            "SELECT trx_id, user_id, plan_id, amount, method, status, created_at FROM orders "
+            "WHERE status IN ('pending', 'expired') AND created_at >= ? ORDER BY created_at",
+            (since.isoformat(),)
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [_order_from_row(row) for row in rows]
+
+
+def activate_orders(activations: list, admin_id: int = None) -> list:
+    """Mark many orders paid, add their premium and record the revenue in one transaction.
+    
+    Args:
+        activations: List of (trx_id, user_id, days, channel_id) tuples
+        admin_id: Admin who ran the activation
+    
+    Returns:
+        The trx_ids that were activated - orders already paid are skipped
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    activated = []
+    changes = []
+    try:
+        for trx_id, user_id, days, channel_id in activations:
+            if USE_POSTGRES:
+                cursor.execute(
+                    "UPDATE orders SET status = 'paid' WHERE trx_id = %s AND status IN ('pending', 'expired') "
+                    "RETURNING plan_id, amount, method",
+                    (trx_id,)
+                )
+            else:
+                cursor.execute(
+                    "UPDATE orders SET status = 'paid' WHERE trx_id = ? AND status IN ('pending', 'expired') "
+                    "RETURNING plan_id, amount, method",
+                    (trx_id,)
+                )
+            order = cursor.fetchone()
+            if order is None:
+                continue
+            
+            if USE_POSTGRES:
+                cursor.execute(
+                    "INSERT INTO users (user_id) VALUES (%s) ON CONFLICT(user_id) DO NOTHING",
+                    (user_id,)
+                )
+            else:
+                cursor.execute(
+                    "INSERT INTO users (user_id) VALUES (?) ON CONFLICT(user_id) DO NOTHING",
+                    (user_id,)
+                )
+            changes += _add_premium(cursor, user_id, days, channel_id)
+            _record_revenue(cursor, user_id, order[0], channel_id, order[1], order[2], admin_id, trx_id)
+            activated.append(trx_id)
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    _notify_subscription_changes(changes)
+    return activated
+
+
+def expire_orders(trx_ids: list) -> int:
+    """Mark the given orders as expired if they are still pending.
+    
+    Returns:
+        Number of orders expired
+    """
+    if not trx_ids:
+        return 0
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "UPDATE orders SET status = 'expired' WHERE status = 'pending' AND trx_id = ANY(%s)",
+            (list(trx_ids),)
+        )
+    else:
+        placeholders = ", ".join("?" * len(trx_ids))
+        cursor.execute(
+            f"UPDATE orders SET status = 'expired' WHERE status = 'pending' AND trx_id IN ({placeholders})",
+            list(trx_ids)
+        )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+def expire_orders_before(cutoff: datetime) -> int:
+    """Expire pending orders created before `cutoff` (used once at startup).
+    
+    Returns:
+        Number of orders expired
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "UPDATE orders SET status = 'expired' WHERE status = 'pending' AND created_at < %s",
+            (cutoff,)
+        )
+    else:
+        cursor.execute(
+            "UPDATE orders SET status = 'expired' WHERE status = 'pending' AND created_at < ?",
+            (cutoff.isoformat(),)
+        )
+    
+    count = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return count
+
+
+# ==============================================
+# WORKER ID LEASES (for transaction ID generation)
+# ==============================================
+
+def init_worker_leases_table():
+    """Initialize the table that hands out exclusive worker ids."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS worker_leases (
+                worker_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                heartbeat_at TIMESTAMP NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS worker_leases (
+                worker_id INTEGER PRIMARY KEY,
+                owner TEXT NOT NULL,
+                heartbeat_at TEXT NOT NULL
+            )
+        """)
+    
+    conn.commit()
+    conn.close()
+
+
+def claim_worker_id(owner: str, max_worker_id: int, lease_seconds: int) -> int:
+    """Claim the lowest worker id that is free or whose lease has lapsed.
+    
+    The claim is a single conditional upsert, so two workers racing for the
+    same id cannot both win it.
+    
+    Args:
+        owner: Unique token identifying this process
+        max_worker_id: Highest usable worker id
+        lease_seconds: Seconds after the last heartbeat when a lease lapses
+    
+    Returns:
+        The claimed worker id
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        for _ in range(10):
+            now = datetime.now()
+            stale = now - timedelta(seconds=lease_seconds)
+            
+            if USE_POSTGRES:
+                cursor.execute(
+                    "SELECT worker_id FROM worker_leases WHERE heartbeat_at >= %s AND owner <> %s",
+                    (stale, owner)
+                )
+            else:
+                cursor.execute(
+                    "SELECT worker_id FROM worker_leases WHERE heartbeat_at >= ? AND owner <> ?",
+                    (stale.isoformat(), owner)
+                )
+            taken = {row[0] for row in cursor.fetchall()}
+            
+            candidate = next((i for i in range(max_worker_id + 1) if i not in taken), None)
+            if candidate is None:
+                raise RuntimeError("No free worker id")
+            
+            if USE_POSTGRES:
+                cursor.execute("""
+                    INSERT INTO worker_leases (worker_id, owner, heartbeat_at)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT(worker_id) DO UPDATE SET
+                        owner = EXCLUDED.owner,
+                        heartbeat_at = EXCLUDED.heartbeat_at
+                    WHERE worker_leases.heartbeat_at < %s OR worker_leases.owner = EXCLUDED.owner
+                """, (candidate, owner, now, stale))
+            else:
+                cursor.execute("""
+                    INSERT INTO worker_leases (worker_id, owner, heartbeat_at)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(worker_id) DO UPDATE SET
+                        owner = excluded.owner,
+                        heartbeat_at = excluded.heartbeat_at
+                    WHERE worker_leases.heartbeat_at < ? OR worker_leases.owner = excluded.owner
+                """, (candidate, owner, now.isoformat(), stale.isoformat()))
+            
+            claimed = cursor.rowcount == 1
+            conn.commit()
+            if claimed:
+                return candidate
+            # Another worker took this id first - try the next free one
+    finally:
+        conn.close()
+    
+    raise RuntimeError("Could not claim a worker id")
+
+
+def renew_worker_lease(worker_id: int, owner: str) -> bool:
+    """Refresh the heartbeat of a worker id lease.
+    
+    Returns:
+        False if the lease was lost to another worker
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "UPDATE worker_leases SET heartbeat_at = %s WHERE worker_id = %s AND owner = %s",
+            (datetime.now(), worker_id, owner)
+        )
+    else:
+        cursor.execute(
+            "UPDATE worker_leases SET heartbeat_at = ? WHERE worker_id = ? AND owner = ?",
+            (datetime.now().isoformat(), worker_id, owner)
+        )
+    
+    renewed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return renewed
+
+
+# ==============================================
+# SHARED SEND BUDGET (cross-process rate limiting)
+# ==============================================
+
+def init_send_budget_table():
+    """Initialize the table used to share Telegram's send budget between workers."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS send_budget (
+                slot BIGINT PRIMARY KEY,
+                used INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS send_budget (
+                slot INTEGER PRIMARY KEY,
+                used INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+    
+    conn.commit()
+    conn.close()
+
+
+def claim_send_tokens(slot: int, want: int, limit: int) -> int:
+    """Claim up to `want` send tokens for a one-second slot shared by all workers.
+    
+    Args:
+        slot: The unix second the tokens are claimed for
+        want: Number of tokens wanted
+        limit: Total tokens available per slot across all workers
+    
+    Returns:
+        Number of tokens granted (0 if the slot is used up)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO send_budget (slot, used) VALUES (%s, 0)
+            ON CONFLICT(slot) DO NOTHING
+        """, (slot,))
+        cursor.execute("SELECT used FROM send_budget WHERE slot = %s FOR UPDATE", (slot,))
+    else:
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("""
+            INSERT INTO send_budget (slot, used) VALUES (?, 0)
+            ON CONFLICT(slot) DO NOTHING
+        """, (slot,))
+        cursor.execute("SELECT used FROM send_budget WHERE slot = ?", (slot,))
+    
+    used = cursor.fetchone()[0]
+    granted = max(0, min(want, limit - used))
+    
+    if granted:
+        if USE_POSTGRES:
+            cursor.execute("UPDATE send_budget SET used = used + %s WHERE slot = %s", (granted, slot))
+        else:
+            cursor.execute("UPDATE send_budget SET used = used + ? WHERE slot = ?", (granted, slot))
+    
+    if used == 0:
+        # First claim in this slot - drop old slots
+        if USE_POSTGRES:
+            cursor.execute("DELETE FROM send_budget WHERE slot < %s", (slot - 60,))
+        else:
+            cursor.execute("DELETE FROM send_budget WHERE slot < ?", (slot - 60,))
+    
+    conn.commit()
+    conn.close()
+    return granted
+
+
+# ==============================================
+# REVENUE LEDGER
+# ==============================================
+# Every paid activation is appended to revenue_ledger and, in the same
+# transaction, added to the per-day, per-channel totals in revenue_daily.
+# Reports read only the rollup; the ledger is the source of truth the
+# rollup can be rebuilt from.
+
+def init_revenue_tables():
+    """Initialize the revenue ledger and its daily rollup."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS revenue_ledger (
+                id SERIAL PRIMARY KEY,
+                created_at TIMESTAMP NOT NULL,
+                day TEXT NOT NULL,
+                user_id BIGINT NOT NULL,
+                plan_id TEXT,
+                channel_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                method TEXT NOT NULL,
+                admin_id BIGINT,
+                trx_id TEXT
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS revenue_ledger (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at TEXT NOT NULL,
+                day TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                plan_id TEXT,
+                channel_id TEXT NOT NULL,
+                amount INTEGER NOT NULL,
+                method TEXT NOT NULL,
+                admin_id INTEGER,
+                trx_id TEXT
+            )
+        """)
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS revenue_daily (
+            day TEXT NOT NULL,
+            channel_id TEXT NOT NULL,
+            grants INTEGER NOT NULL DEFAULT 0,
+            revenue BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, channel_id)
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def _record_revenue(cursor, user_id: int, plan_id: str, channel_id: str, amount: int, method: str,
+                    admin_id: int = None, trx_id: str = None):
+    """Append to the ledger and update the daily rollup using an open cursor (no commit).
+    
+    Args:
+        cursor: Cursor of the caller's transaction
+        user_id: The user who paid
+        plan_id: Plan sold (e.g. 'ch1_30_days')
+        channel_id: Channel code granted ('ch1', ..., or 'all')
+        amount: Price paid
+        method: Payment method ('upi', 'binance', ..., or 'manual')
+        admin_id: Admin who granted it, if any
+        trx_id: Order transaction ID, if any
+    """
+    now = datetime.now()
+    day = now.strftime('%Y-%m-%d')
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO revenue_ledger (created_at, day, user_id, plan_id, channel_id, amount, method, admin_id, trx_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (now, day, user_id, plan_id, channel_id, amount, method, admin_id, trx_id))
+        cursor.execute("""
+            INSERT INTO revenue_daily (day, channel_id, grants, revenue) VALUES (%s, %s, 1, %s)
+            ON CONFLICT(day, channel_id) DO UPDATE SET
+                grants = revenue_daily.grants + 1,
+                revenue = revenue_daily.revenue + EXCLUDED.revenue
+        """, (day, channel_id, amount))
+    else:
+        cursor.execute("""
+            INSERT INTO revenue_ledger (created_at, day, user_id, plan_id, channel_id, amount, method, admin_id, trx_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (now.isoformat(), day, user_id, plan_id, channel_id, amount, method, admin_id, trx_id))
+        cursor.execute("""
+            INSERT INTO revenue_daily (day, channel_id, grants, revenue) VALUES (?, ?, 1, ?)
+            ON CONFLICT(day, channel_id) DO UPDATE SET
+                grants = revenue_daily.grants + 1,
+                revenue = revenue_daily.revenue + excluded.revenue
+        """, (day, channel_id, amount))
+
+
+def add_paid_premium(user_id: int, days: int, channel_id: str, plan_id: str, amount: int, method: str,
+                     admin_id: int = None):
+    """Add premium and record its revenue in one transaction (creates the user if needed)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if USE_POSTGRES:
+            cursor.execute("INSERT INTO users (user_id) VALUES (%s) ON CONFLICT(user_id) DO NOTHING", (user_id,))
+        else:
+            cursor.execute("INSERT INTO users (user_id) VALUES (?) ON CONFLICT(user_id) DO NOTHING", (user_id,))
+        changes = _add_premium(cursor, user_id, days, channel_id)
+        _record_revenue(cursor, user_id, plan_id, channel_id, amount, method, admin_id)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    _notify_subscription_changes(changes)
+
+
+def get_revenue(start_day: str, end_day: str) -> dict:
+    """Revenue between two days (inclusive, 'YYYY-MM-DD') from the daily rollup.
+    
+    Returns:
+        {'grants': int, 'revenue': int, 'channels': {channel_id: (grants, revenue)}}
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT channel_id, SUM(grants), SUM(revenue) FROM revenue_daily
+            WHERE day >= %s AND day <= %s GROUP BY channel_id
+        """, (start_day, end_day))
+    else:
+        cursor.execute("""
+            SELECT channel_id, SUM(grants), SUM(revenue) FROM revenue_daily
+            WHERE day >= ? AND day <= ? GROUP BY channel_id
+        """, (start_day, end_day))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    channels = {row[0]: (int(row[1]), int(row[2])) for row in rows}
+    return {
+        'grants': sum(grants for grants, _ in channels.values()),
+        'revenue': sum(revenue for _, revenue in channels.values()),
+        'channels': channels,
+    }
+
+
+def rebuild_revenue_rollups() -> int:
+    """Recompute revenue_daily from the ledger.
+    
+    Returns:
+        Number of (day, channel) rollup rows that differed from the ledger
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if not USE_POSTGRES:
+            cursor.execute("BEGIN IMMEDIATE")
+        else:
+            cursor.execute("LOCK TABLE revenue_daily IN EXCLUSIVE MODE")
+        
+        cursor.execute("SELECT day, channel_id, grants, revenue FROM revenue_daily")
+        current = {(row[0], row[1]): (int(row[2]), int(row[3])) for row in cursor.fetchall()}
+        
+        cursor.execute("""
+            SELECT day, channel_id, COUNT(*), SUM(amount) FROM revenue_ledger
+            GROUP BY day, channel_id
+        """)
+        expected = {(row[0], row[1]): (int(row[2]), int(row[3])) for row in cursor.fetchall()}
+        
+        drift = sum(1 for key in current.keys() | expected.keys() if current.get(key) != expected.get(key))
+        
+        if drift:
+            cursor.execute("DELETE FROM revenue_daily")
+            cursor.execute("""
+                INSERT INTO revenue_daily (day, channel_id, grants, revenue)
+                SELECT day, channel_id, COUNT(*), SUM(amount) FROM revenue_ledger
+                GROUP BY day, channel_id
+            """)
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return drift
+
+
+# ==============================================
+# JOB CHECKPOINTS
+# ==============================================
+# Background jobs that walk a table in (timestamp, id) order store how far
+# they got here, so each row is handled once even across restarts. A job
+# run by several workers takes the job's lease first, so only one of them
+# walks the window at a time.
+
+def init_job_checkpoints_table():
+    """Initialize the job checkpoints table."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_checkpoints (
+            job TEXT PRIMARY KEY,
+            last_at TEXT NOT NULL,
+            last_id BIGINT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def init_job_leases_table():
+    """Initialize the table of leases on background jobs."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_leases (
+            job TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            lease_until TEXT NOT NULL
+        )
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def claim_job_lease(job: str, owner: str, lease_seconds: int) -> bool:
+    """Take or extend a job's lease - a single conditional upsert.
+    
+    Returns:
+        False if another owner holds an unexpired lease
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    lease_until = now + timedelta(seconds=lease_seconds)
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO job_leases (job, owner, lease_until) VALUES (%s, %s, %s)
+            ON CONFLICT(job) DO UPDATE SET
+                owner = EXCLUDED.owner,
+                lease_until = EXCLUDED.lease_until
+            WHERE job_leases.lease_until < %s OR job_leases.owner = EXCLUDED.owner
+        """, (job, owner, lease_until.isoformat(), now.isoformat()))
+    else:
+        cursor.execute("""
+            INSERT INTO job_leases (job, owner, lease_until) VALUES (?, ?, ?)
+            ON CONFLICT(job) DO UPDATE SET
+                owner = excluded.owner,
+                lease_until = excluded.lease_until
+            WHERE job_leases.lease_until < ? OR job_leases.owner = excluded.owner
+        """, (job, owner, lease_until.isoformat(), now.isoformat()))
+    
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
+
+
+def release_job_lease(job: str, owner: str):
+    """Give up a job's lease so another worker can run it right away."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("DELETE FROM job_leases WHERE job = %s AND owner = %s", (job, owner))
+    else:
+        cursor.execute("DELETE FROM job_leases WHERE job = ? AND owner = ?", (job, owner))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_checkpoint(job: str) -> tuple:
+    """Get a job's position as (datetime, id), or None if it never ran."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("SELECT last_at, last_id FROM job_checkpoints WHERE job = %s", (job,))
+    else:
+        cursor.execute("SELECT last_at, last_id FROM job_checkpoints WHERE job = ?", (job,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if row:
+        return datetime.fromisoformat(row[0]), row[1]
+    return None
+
+
+def set_checkpoint(job: str, last_at: datetime, last_id: int):
+    """Store a job's position."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO job_checkpoints (job, last_at, last_id, updated_at) VALUES (%s, %s, %s, %s)
+            ON CONFLICT(job) DO UPDATE SET
+                last_at = EXCLUDED.last_at,
+                last_id = EXCLUDED.last_id,
+                updated_at = EXCLUDED.updated_at
+        """, (job, last_at.isoformat(), last_id, datetime.now().isoformat()))
+    else:
+        cursor.execute("""
+            INSERT INTO job_checkpoints (job, last_at, last_id, updated_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT(job) DO UPDATE SET
+                last_at = excluded.last_at,
+                last_id = excluded.last_id,
+                updated_at = excluded.updated_at
+        """, (job, last_at.isoformat(), last_id, datetime.now().isoformat()))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_expired_subscriptions(after: datetime, after_id: int, until: datetime, limit: int) -> list:
+    """Get subscriptions that expired after (after, after_id) and up to `until`.
+    
+    An index range scan on (expiry, id) - resume from the last row returned
+    to walk through newly expired subscriptions in order.
+    
+    Returns:
+        List of dicts with id, user_id, channel_id and expiry (datetime)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT id, user_id, channel_id, expiry FROM channel_subscriptions
+            WHERE (expiry, id) > (%s, %s) AND expiry <= %s
+            ORDER BY expiry, id
+            LIMIT %s
+        """, (after, after_id, until, limit))
+    else:
+        cursor.execute("""
+            SELECT id, user_id, channel_id, expiry FROM channel_subscriptions
+            WHERE (expiry, id) > (?, ?) AND expiry <= ?
+            ORDER BY expiry, id
+            LIMIT ?
+        """, (after.isoformat(), after_id, until.isoformat(), limit))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [{
+        'id': row[0],
+        'user_id': row[1],
+        'channel_id': row[2],
+        'expiry': row[3] if USE_POSTGRES else datetime.fromisoformat(row[3]),
+    } for row in rows]
+
+
+def get_expiring_subscriptions(after: datetime, until: datetime) -> list:
+    """Get (user_id, channel_id, expiry) for subscriptions expiring in (after, until].
+    
+    An index range scan on expiry - used to load upcoming reminders.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT user_id, channel_id, expiry FROM channel_subscriptions WHERE expiry > %s AND expiry <= %s",
+            (after, until)
+        )
+    else:
+        cursor.execute(
+            "SELECT user_id, channel_id, expiry FROM channel_subscriptions WHERE expiry > ? AND expiry <= ?",
+            (after.isoformat(), until.isoformat())
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    if USE_POSTGRES:
+        return rows
+    return [(row[0], row[1], datetime.fromisoformat(row[2])) for row in rows]
+
+
+def init_sent_reminders_table():
+    """Initialize the table of renewal reminders already sent."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sent_reminders (
+                user_id BIGINT NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TIMESTAMP NOT NULL,
+                hours INTEGER NOT NULL,
+                PRIMARY KEY (user_id, channel_id, expiry, hours)
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS sent_reminders (
+                user_id INTEGER NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                hours INTEGER NOT NULL,
+                PRIMARY KEY (user_id, channel_id, expiry, hours)
+            )
+        """)
+    
+    conn.commit()
+    conn.close()
+
+
+def claim_reminders(reminders: list) -> list:
+    """Claim renewal reminders before sending them.
+    
+    Every worker loads the same reminders; only the first to claim one sends
+    it. A reminder is not claimed if the subscription's expiry has changed
+    since it was scheduled (renewed or removed).
+    
+    Args:
+        reminders: (user_id, channel_id, expiry, hours) tuples
+    
+    Returns:
+        The claimed reminders
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    claimed = []
+    try:
+        for user_id, channel_id, expiry, hours in reminders:
+            if USE_POSTGRES:
+                cursor.execute("""
+                    INSERT INTO sent_reminders (user_id, channel_id, expiry, hours)
+                    SELECT %s, %s, %s, %s WHERE EXISTS (
+                        SELECT 1 FROM channel_subscriptions
+                        WHERE user_id = %s AND channel_id = %s AND expiry = %s
+                    )
+                    ON CONFLICT DO NOTHING
+                """, (user_id, channel_id, expiry, hours, user_id, channel_id, expiry))
+            else:
+                cursor.execute("""
+                    INSERT INTO sent_reminders (user_id, channel_id, expiry, hours)
+                    SELECT ?, ?, ?, ? WHERE EXISTS (
+                        SELECT 1 FROM channel_subscriptions
+                        WHERE user_id = ? AND channel_id = ? AND expiry = ?
+                    )
+                    ON CONFLICT DO NOTHING
+                """, (user_id, channel_id, expiry.isoformat(), hours, user_id, channel_id, expiry.isoformat()))
+            if cursor.rowcount == 1:
+                claimed.append((user_id, channel_id, expiry, hours))
+        conn.commit()
+    finally:
+        conn.close()
+    
+    return claimed
+
+
+def prune_sent_reminders(before: datetime) -> int:
+    """Forget sent reminders of subscriptions that expired before `before`."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("DELETE FROM sent_reminders WHERE expiry < %s", (before,))
+    else:
+        cursor.execute("DELETE FROM sent_reminders WHERE expiry < ?", (before.isoformat(),))
+    
+    deleted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return deleted
+
+
+# ==============================================
+# CHANNEL INVITE LINKS
+# ==============================================
+# Single-use invite links created ahead of time (see invite_pool.py).
+# status: 'pooled' -> 'issued' -> 'used' / 'revoked'
+
+def init_invite_links_table():
+    """Initialize the invite links table."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invite_links (
+                link TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pooled',
+                user_id BIGINT,
+                created_at TIMESTAMP NOT NULL,
+                expires_at TIMESTAMP NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS invite_links (
+                link TEXT PRIMARY KEY,
+                channel_id TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pooled',
+                user_id INTEGER,
+                created_at TEXT NOT NULL,
+                expires_at TEXT NOT NULL
+            )
+        """)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invite_links_status ON invite_links(status, expires_at)")
+    
+    conn.commit()
+    conn.close()
+
+
+def add_invite_link(link: str, channel_id: str, expires_at: datetime):
+    """Record a newly created pooled invite link."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            INSERT INTO invite_links (link, channel_id, status, created_at, expires_at)
+            VALUES (%s, %s, 'pooled', %s, %s)
+        """, (link, channel_id, datetime.now(), expires_at))
+    else:
+        cursor.execute("""
+            INSERT INTO invite_links (link, channel_id, status, created_at, expires_at)
+            VALUES (?, ?, 'pooled', ?, ?)
+        """, (link, channel_id, datetime.now().isoformat(), expires_at.isoformat()))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_pooled_invite_links() -> list:
+    """Get (link, channel_id, expires_at) for links not handed out yet, soonest expiry first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(
+        "SELECT link, channel_id, expires_at FROM invite_links WHERE status = 'pooled' ORDER BY expires_at"
+    )
+    rows = cursor.fetchall()
+    conn.close()
+    
+    if USE_POSTGRES:
+        return rows
+    return [(row[0], row[1], datetime.fromisoformat(row[2])) for row in rows]
+
+
+def issue_invite_link(link: str, user_id: int) -> bool:
+    """Claim a pooled link for a user.
+    
+    Every worker loads the same pooled links, so the claim is conditional -
+    a link is handed to one user only.
+    
+    Returns:
+        False if the link was already issued or closed
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "UPDATE invite_links SET status = 'issued', user_id = %s WHERE link = %s AND status = 'pooled'",
+            (user_id, link)
+        )
+    else:
+        cursor.execute(
+            "UPDATE invite_links SET status = 'issued', user_id = ? WHERE link = ? AND status = 'pooled'",
+            (user_id, link)
+        )
+    
+    claimed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return claimed
+
+
+def close_invite_link(link: str, status: str) -> bool:
+    """Mark a link as 'used' or 'revoked'.
+    
+    Returns:
+        False if the link is unknown or already closed
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "UPDATE invite_links SET status = %s WHERE link = %s AND status IN ('pooled', 'issued')",
+            (status, link)
+        )
+    else:
+        cursor.execute(
+            "UPDATE invite_links SET status = ? WHERE link = ? AND status IN ('pooled', 'issued')",
+            (status, link)
+        )
+    
+    closed = cursor.rowcount == 1
+    conn.commit()
+    conn.close()
+    return closed
+
+
+def get_expired_invite_links(now: datetime) -> list:
+    """Get (link, channel_id) for open links whose expiry has passed."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            "SELECT link, channel_id FROM invite_links WHERE status IN ('pooled', 'issued') AND expires_at <= %s",
+            (now,)
+        )
+    else:
+        cursor.execute(
+            "SELECT link, channel_id FROM invite_links WHERE status IN ('pooled', 'issued') AND expires_at <= ?",
+            (now.isoformat(),)
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    return [(row[0], row[1]) for row in rows]
+
+
+# ==============================================
+# SUBSCRIPTION HISTORY (compaction)
+# ==============================================
+# Long-expired rows are moved out of channel_subscriptions so the hot table
+# and its indexes only hold active and recently expired subscriptions.
+
+def init_subscription_history_table():
+    """Initialize the table archived subscriptions are moved to."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscription_history (
+                id BIGINT PRIMARY KEY,
+                user_id BIGINT NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TIMESTAMP NOT NULL,
+                created_at TIMESTAMP,
+                archived_at TIMESTAMP NOT NULL
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS subscription_history (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                channel_id TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                created_at TEXT,
+                archived_at TEXT NOT NULL
+            )
+        """)
+    
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_sub_history_user ON subscription_history(user_id, expiry)")
+    
+    conn.commit()
+    conn.close()
+
+
+def archive_expired_subscriptions(before: datetime, limit: int) -> int:
+    """Move up to `limit` subscriptions that expired before `before` into the history.
+    
+    One short transaction per call, touching only the oldest rows of the
+    expiry index, so normal reads and writes are barely blocked.
+    
+    Returns:
+        Number of rows moved
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    try:
+        if USE_POSTGRES:
+            cursor.execute("""
+                WITH moved AS (
+                    DELETE FROM channel_subscriptions WHERE id IN (
+                        SELECT id FROM channel_subscriptions WHERE expiry < %s
+                        ORDER BY expiry, id LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING id, user_id, channel_id, expiry, created_at
+                )
+                INSERT INTO subscription_history (id, user_id, channel_id, expiry, created_at, archived_at)
+                SELECT id, user_id, channel_id, expiry, created_at, %s FROM moved
+                ON CONFLICT(id) DO NOTHING
+            """, (before, limit, datetime.now()))
+            moved = cursor.rowcount
+        else:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT id FROM channel_subscriptions WHERE expiry < ?
+                ORDER BY expiry, id LIMIT ?
+            """, (before.isoformat(), limit))
+            ids = [row[0] for row in cursor.fetchall()]
+            moved = len(ids)
+            if ids:
+                placeholders = ",".join("?" * len(ids))
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO subscription_history (id, user_id, channel_id, expiry, created_at, archived_at)
+                    SELECT id, user_id, channel_id, expiry, created_at, ? FROM channel_subscriptions
+                    WHERE id IN ({placeholders})
+                """, (datetime.now().isoformat(), *ids))
+                cursor.execute(f"DELETE FROM channel_subscriptions WHERE id IN ({placeholders})", ids)
+        
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    return moved
+
+
+def get_subscription_history(user_id: int, limit: int = 20) -> list:
+    """Get a user's past subscriptions, newest first - archived and recently expired.
+    
+    Returns:
+        List of dicts with channel_id, expiry and archived (bool)
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    now = datetime.now()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT channel_id, expiry, FALSE FROM channel_subscriptions WHERE user_id = %s AND expiry <= %s
+            UNION ALL
+            SELECT channel_id, expiry, TRUE FROM subscription_history WHERE user_id = %s
+            ORDER BY 2 DESC LIMIT %s
+        """, (user_id, now, user_id, limit))
+    else:
+        cursor.execute("""
+            SELECT channel_id, expiry, 0 FROM channel_subscriptions WHERE user_id = ? AND expiry <= ?
+            UNION ALL
+            SELECT channel_id, expiry, 1 FROM subscription_history WHERE user_id = ?
+            ORDER BY 2 DESC LIMIT ?
+        """, (user_id, now.isoformat(), user_id, limit))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    result = []
+    for row in rows:
+        expiry = row[1] if USE_POSTGRES else datetime.fromisoformat(row[1])
+        result.append({
+            'channel_id': row[0],
+            'expiry': expiry.strftime("%d %b %Y, %I:%M %p"),
+            'archived': bool(row[2]),
+        })
+    return result
+
+
+# ==============================================
+# CONTENT CATALOG
+# ==============================================
+# Every post and edit in the file channels is recorded here, so deep links
+# (ch1_123, ch1_g123 for an album) can be checked without asking Telegram. Posts from before the
+# catalog existed are tried once and then recorded as found ('unknown'
+# media type) or missing.
+
+def init_content_catalog_table():
+    """Initialize the content_catalog table."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS content_catalog (
+                channel_id TEXT NOT NULL,
+                message_id BIGINT NOT NULL,
+                media_type TEXT NOT NULL,
+                file_id TEXT,
+                file_size BIGINT,
+                caption TEXT,
+                media_group_id TEXT,
+                created_at TIMESTAMP NOT NULL,
+                PRIMARY KEY (channel_id, message_id)
+            )
+        """)
+    else:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS content_catalog (
+                channel_id TEXT NOT NULL,
+                message_id INTEGER NOT NULL,
+                media_type TEXT NOT NULL,
+                file_id TEXT,
+                file_size INTEGER,
+                caption TEXT,
+                media_group_id TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (channel_id, message_id)
+            )
+        """)
+    
+    # Newest-first listing with keyset pagination
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_content_recent
+        ON content_catalog (created_at, channel_id, message_id)
+    """)
+    
+    # Album lookup for ch1_g<id> links
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_content_album
+        ON content_catalog (channel_id, media_group_id)
+    """)
+    
+    conn.commit()
+    conn.close()
+
+
+def _content_from_row(row) -> dict:
+    return {
+        'channel_id': row[0],
+        'message_id': row[1],
+        'media_type': row[2],
+        'file_id': row[3],
+        'file_size': row[4],
+        'caption': row[5],
+        'media_group_id': row[6],
+        'created_at': row[7] if USE_POSTGRES else datetime.fromisoformat(row[7]),
+    }
+
+
+CONTENT_COLUMNS = "channel_id, message_id, media_type, file_id, file_size, caption, media_group_id, created_at"
+
+
+def save_content(channel_id: str, message_id: int, media_type: str, file_id: str = None,
+                 file_size: int = None, caption: str = None, media_group_id: str = None,
+                 created_at: datetime = None):
+    """Record a channel post, or update it after an edit (created_at is kept)."""
+    created_at = created_at or datetime.now()
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(f"""
+            INSERT INTO content_catalog ({CONTENT_COLUMNS})
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT(channel_id, message_id) DO UPDATE SET
+                media_type = EXCLUDED.media_type, file_id = EXCLUDED.file_id,
+                file_size = EXCLUDED.file_size, caption = EXCLUDED.caption,
+                media_group_id = EXCLUDED.media_group_id
+        """, (channel_id, message_id, media_type, file_id, file_size, caption, media_group_id, created_at))
+    else:
+        cursor.execute(f"""
+            INSERT INTO content_catalog ({CONTENT_COLUMNS})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(channel_id, message_id) DO UPDATE SET
+                media_type = excluded.media_type, file_id = excluded.file_id,
+                file_size = excluded.file_size, caption = excluded.caption,
+                media_group_id = excluded.media_group_id
+        """, (channel_id, message_id, media_type, file_id, file_size, caption, media_group_id,
+              created_at.isoformat()))
+    
+    conn.commit()
+    conn.close()
+
+
+def get_content_range(channel_id: str, first_id: int, last_id: int) -> list:
+    """Catalogued posts of a channel with message ids in [first_id, last_id], oldest first."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            f"""SELECT {CONTENT_COLUMNS} FROM content_catalog
+                WHERE channel_id = %s AND message_id BETWEEN %s AND %s
+                ORDER BY message_id""",
+            (channel_id, first_id, last_id)
+        )
+    else:
+        cursor.execute(
+            f"""SELECT {CONTENT_COLUMNS} FROM content_catalog
+                WHERE channel_id = ? AND message_id BETWEEN ? AND ?
+                ORDER BY message_id""",
+            (channel_id, first_id, last_id)
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    return [_content_from_row(row) for row in rows]
+
+
+def get_album(channel_id: str, message_id: int) -> list:
+    """Catalogued posts of the album a post belongs to, oldest first ([] if not an album)."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(
+            f"""SELECT {CONTENT_COLUMNS} FROM content_catalog
+                WHERE channel_id = %s AND media_group_id = (
+                    SELECT media_group_id FROM content_catalog WHERE channel_id = %s AND message_id = %s
+                )
+                ORDER BY message_id""",
+            (channel_id, channel_id, message_id)
+        )
+    else:
+        cursor.execute(
+            f"""SELECT {CONTENT_COLUMNS} FROM content_catalog
+                WHERE channel_id = ? AND media_group_id = (
+                    SELECT media_group_id FROM content_catalog WHERE channel_id = ? AND message_id = ?
+                )
+                ORDER BY message_id""",
+            (channel_id, channel_id, message_id)
+        )
+    
+    rows = cursor.fetchall()
+    conn.close()
+    return [_content_from_row(row) for row in rows]
+
+
+def get_recent_content(limit: int, before: tuple = None, channel_id: str = None, search: str = None) -> list:
+    """Catalogued posts, newest first, one page at a time.
+    
+    Args:
+        limit: Page size
+        before: (created_at, channel_id, message_id) of the last row of the
+            previous page, or None for the first page
+        channel_id: Only this channel
+        search: Only posts whose caption contains this text (case-insensitive)
+    
+    Returns:
+        List of dicts as built by _content_from_row
+    """
+    p = "%s" if USE_POSTGRES else "?"
+    # Only real posts - not links merely found or found missing
+    conditions = ["media_type NOT IN ('missing', 'unknown')"]
+    params = []
+    
+    if before:
+        conditions.append(f"(created_at, channel_id, message_id) < ({p}, {p}, {p})")
+        created_at, before_channel, before_id = before
+        params += [created_at if USE_POSTGRES else created_at.isoformat(), before_channel, before_id]
+    if channel_id:
+        conditions.append(f"channel_id = {p}")
+        params.append(channel_id)
+    if search:
+        conditions.append(f"caption {'ILIKE' if USE_POSTGRES else 'LIKE'} {p}")
+        params.append(f"%{search}%")
+    params.append(limit)
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT {CONTENT_COLUMNS} FROM content_catalog
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC, channel_id DESC, message_id DESC
+        LIMIT {p}
+    """, params)
+    rows = cursor.fetchall()
+    conn.close()
+    return [_content_from_row(row) for row in rows]
+
+
+# ==============================================
+# USER SEARCH
+# ==============================================
+# /checkuser finds users by part of their username or first name:
+#   - PostgreSQL: trigram (pg_trgm) GIN index, used by ILIKE '%term%'
+#   - SQLite: users_fts, an FTS5 trigram index over users kept in sync by
+#     triggers; terms shorter than three characters fall back to LIKE
+
+# Indexed search expression - queries must use exactly the same text
+USER_SEARCH_EXPR = "(coalesce(username, '') || ' ' || coalesce(first_name, ''))"
+
+
+def init_user_search_index():
+    """Initialize the user search index."""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        try:
+            cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cursor.execute(f"""
+                CREATE INDEX IF NOT EXISTS idx_users_search
+                ON users USING gin ({USER_SEARCH_EXPR} gin_trgm_ops)
+            """)
+            conn.commit()
+        except Exception as e:
+            # Search still works, just without the index
+            conn.rollback()
+            logger.warning(f"Could not create the user search index: {e}")
+    else:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'users_fts'")
+        exists = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS users_fts USING fts5(
+                username, first_name,
+                content = 'users', content_rowid = 'user_id', tokenize = 'trigram'
+            )
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS users_fts_insert AFTER INSERT ON users BEGIN
+                INSERT INTO users_fts (rowid, username, first_name)
+                VALUES (new.user_id, new.username, new.first_name);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS users_fts_delete AFTER DELETE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, username, first_name)
+                VALUES ('delete', old.user_id, old.username, old.first_name);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS users_fts_update AFTER UPDATE ON users BEGIN
+                INSERT INTO users_fts (users_fts, rowid, username, first_name)
+                VALUES ('delete', old.user_id, old.username, old.first_name);
+                INSERT INTO users_fts (rowid, username, first_name)
+                VALUES (new.user_id, new.username, new.first_name);
+            END
+        """)
+        if not exists:
+            # Index the users that were there before the search index
+            cursor.execute("INSERT INTO users_fts (users_fts) VALUES ('rebuild')")
+        conn.commit()
+    
+    conn.close()
+
+
+def search_users(term: str, limit: int, after_id: int = None) -> list:
+    """Ids of users whose username or first name contains `term`, ascending.
+    
+    Args:
+        term: Part of a username or first name (case-insensitive)
+        limit: Page size
+        after_id: Keyset cursor - the last user id of the previous page
+    """
+    term = term.lstrip('@')
+    after_id = after_id or 0
+    # LIKE wildcards in the term match literally
+    pattern = "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    conn = get_read_connection()
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute(f"""
+            SELECT user_id FROM users
+            WHERE {USER_SEARCH_EXPR} ILIKE %s AND user_id > %s
+            ORDER BY user_id LIMIT %s
+        """, (pattern, after_id, limit))
+    elif len(term) >= 3:
+        # Quoted so the term is matched as a substring, not FTS syntax
+        cursor.execute("""
+            SELECT rowid FROM users_fts
+            WHERE users_fts MATCH ? AND rowid > ?
+            ORDER BY rowid LIMIT ?
+        """, ('"' + term.replace('"', '""') + '"', after_id, limit))
+    else:
+        cursor.execute(f"""
+            SELECT user_id FROM users
+            WHERE {USER_SEARCH_EXPR} LIKE ? ESCAPE '\\' AND user_id > ?
+            ORDER BY user_id LIMIT ?
+        """, (pattern, after_id, limit))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    return [row[0] for row in rows]
+
+
+def get_users_overview(user_ids: list) -> dict:
+    """Users with their active subscriptions, in one query.
+    
+    Returns:
+        Dict of user_id -> {user_id, username, first_name, subscriptions}, where
+        subscriptions is a list of (channel_id, expiry). Unknown ids are left out.
+    """
+    if not user_ids:
+        return {}
+    
+    conn = get_read_connection(user_ids)
+    cursor = conn.cursor()
+    
+    if USE_POSTGRES:
+        cursor.execute("""
+            SELECT u.user_id, u.username, u.first_name, s.channel_id, s.expiry
+            FROM users u
+            LEFT JOIN channel_subscriptions s ON s.user_id = u.user_id AND s.expiry > %s
+            WHERE u.user_id = ANY(%s)
+            ORDER BY u.user_id, s.channel_id
+        """, (datetime.now(), list(user_ids)))
+    else:
+        placeholders = ",".join("?" * len(user_ids))
+        cursor.execute(f"""
+            SELECT u.user_id, u.username, u.first_name, s.channel_id, s.expiry
+            FROM users u
+            LEFT JOIN channel_subscriptions s ON s.user_id = u.user_id AND s.expiry > ?
+            WHERE u.user_id IN ({placeholders})
+            ORDER BY u.user_id, s.channel_id
+        """, (datetime.now().isoformat(), *user_ids))
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    users = {}
+    for user_id, username, first_name, channel_id, expiry in rows:
+        user = users.setdefault(user_id, {
+            'user_id': user_id,
+            'username': username,
+            'first_name': first_name,
+            'subscriptions': [],
+        })
+        if channel_id is not None:
+            if not USE_POSTGRES:
+                expiry = datetime.fromisoformat(expiry)
+            user['subscriptions'].append((channel_id, expiry))
+    return users
+
+
+# ==============================================
+# USER EXPORT
+# ==============================================
+
+EXPORT_COLUMNS = ("user_id", "username", "first_name", "joined_at", "channel_id", "expiry")
+
+
+def iter_user_export(batch_size: int = 5000):
+    """Yield every user with each of their subscriptions, one row per pair.
+    
+    Users without subscriptions get one row with empty channel_id/expiry.
+    Rows are streamed - on PostgreSQL through a server-side (named) cursor,
+    so only batch_size rows are held in memory at a time. Columns are
+    EXPORT_COLUMNS.
+    """
+    conn = get_read_connection()
+    try:
+        if USE_POSTGRES:
+            cursor = conn.cursor(name="user_export")
+            cursor.itersize = batch_size
+        else:
+            cursor = conn.cursor()
+        
+        # users is read in primary key order, so no sort of the whole result
+        cursor.execute("""
+            SELECT u.user_id, u.username, u.first_name, u.joined_at, s.channel_id, s.expiry
+            FROM users u
+            LEFT JOIN channel_subscriptions s ON s.user_id = u.user_id
+            ORDER BY u.user_id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+# Initialize database on import
+init_db()
+init_plans_table()
+populate_default_plans()
+refresh_config_plans()
+init_settings_table()
+populate_default_settings()
+refresh_config_settings()
+init_channel_tables()
+populate_default_channels()
+refresh_config_channels()
+init_config_versions_table()
+init_send_budget_table()
+init_orders_table()
+init_worker_leases_table()
+init_revenue_tables()
+init_job_checkpoints_table()
+init_job_leases_table()
+init_sent_reminders_table()
+init_invite_links_table()
+init_subscription_history_table()
+init_content_catalog_table()
+init_user_search_index()
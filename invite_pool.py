@@ -0,0 +1,182 @@
+# ==============================================
+# CHANNEL INVITE LINK POOL
+# ==============================================
+# Keeps INVITE_POOL_SIZE single-use (member_limit=1), expiring invite links
+# ready per channel, so activation messages include a join link without a
+# Bot API call at that moment. The pool is refilled in the background;
+# links are revoked once they are used (see mark_used) or expire.
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+import config
+import database as db
+import scheduler
+
+logger = logging.getLogger(__name__)
+
+# Pooled links with less time left than this are revoked instead of issued
+ISSUE_MARGIN = timedelta(hours=1)
+
+# Seconds between checks for expired links when nothing is taken
+CHECK_INTERVAL = 300
+
+# channel code -> deque of (link, expires_at), soonest expiry first
+_pools = {}
+
+# Set whenever a link is taken, to wake the refill loop
+_refill_needed = None
+
+_hits = 0
+_misses = 0
+_revoked = 0
+_refill_ms = deque(maxlen=500)
+
+
+async def _create_link(bot, channel_id: str, lane: int) -> tuple:
+    """Create a single-use invite link and record it as pooled."""
+    started = time.perf_counter()
+    expires_at = datetime.now() + timedelta(hours=config.INVITE_LINK_TTL_HOURS)
+    invite = await bot.create_chat_invite_link(
+        config.CHANNEL_CHAT_IDS[channel_id],
+        expire_date=int(expires_at.timestamp()),
+        member_limit=1,
+        name="premium",
+        rate_limit_args=lane
+    )
+    await asyncio.to_thread(db.add_invite_link, invite.invite_link, channel_id, expires_at)
+    _refill_ms.append((time.perf_counter() - started) * 1000)
+    return invite.invite_link, expires_at
+
+
+async def revoke(bot, link: str, channel_id: str, status: str = 'revoked'):
+    """Revoke a link on Telegram and close it in the database."""
+    global _revoked
+    if not await asyncio.to_thread(db.close_invite_link, link, status):
+        return
+    chat_id = config.CHANNEL_CHAT_IDS.get(channel_id)
+    if chat_id is None:
+        return
+    try:
+        await bot.revoke_chat_invite_link(chat_id, link, rate_limit_args=scheduler.BULK)
+        _revoked += 1
+    except Exception as e:
+        # Already expired or revoked on Telegram's side
+        logger.info(f"Could not revoke invite link for {channel_id}: {e}")
+
+
+async def take(bot, channel_id: str, user_id: int, lane: int = scheduler.TRANSACTIONAL) -> str:
+    """Hand out a single-use invite link for a channel.
+
+    Served from the pool; only creates a link on the spot if the pool is empty.
+    Other workers pool the same links, so each one is claimed in the
+    database first and skipped if another worker issued it already.
+    """
+    global _hits, _misses
+    pool = _pools.setdefault(channel_id, deque())
+    deadline = datetime.now() + ISSUE_MARGIN
+
+    link = None
+    while pool:
+        candidate, expires_at = pool.popleft()
+        if expires_at <= deadline:
+            asyncio.create_task(revoke(bot, candidate, channel_id))
+        elif await asyncio.to_thread(db.issue_invite_link, candidate, user_id):
+            link = candidate
+            break
+
+    if link:
+        _hits += 1
+    else:
+        _misses += 1
+        link, _ = await _create_link(bot, channel_id, lane)
+        if not await asyncio.to_thread(db.issue_invite_link, link, user_id):
+            raise RuntimeError(f"Could not claim new invite link for {channel_id}")
+
+    if _refill_needed is not None:
+        _refill_needed.set()
+    return link
+
+
+async def take_links(bot, channel_id: str, user_id: int, lane: int = scheduler.TRANSACTIONAL) -> dict:
+    """Invite links for a channel or bundle code: {channel code: link}.
+
+    Channels whose link cannot be created are left out.
+    """
+    links = {}
+    for ch in db.expand_channels(channel_id):
+        try:
+            links[ch] = await take(bot, ch, user_id, lane)
+        except Exception as e:
+            logger.error(f"Could not get invite link for {ch}: {e}")
+    return links
+
+
+async def mark_used(bot, link: str, channel_id: str):
+    """Close a link once someone joined with it."""
+    await revoke(bot, link, channel_id, status='used')
+
+
+async def refill(bot):
+    """Top every channel's pool up to INVITE_POOL_SIZE."""
+    for channel_id in list(config.CHANNEL_CHAT_IDS):
+        pool = _pools.setdefault(channel_id, deque())
+        missing = config.INVITE_POOL_SIZE - len(pool)
+        if missing <= 0:
+            continue
+        results = await asyncio.gather(
+            *(_create_link(bot, channel_id, scheduler.BULK) for _ in range(missing)),
+            return_exceptions=True
+        )
+        created = [r for r in results if not isinstance(r, Exception)]
+        pool.extend(created)
+        if len(created) < missing:
+            logger.error(f"Invite pool refill for {channel_id}: {missing - len(created)} links failed")
+
+
+async def revoke_expired(bot):
+    """Revoke open links whose expiry has passed and drop them from the pool."""
+    now = datetime.now()
+    for pool in _pools.values():
+        while pool and pool[0][1] <= now:
+            pool.popleft()
+    for link, channel_id in await asyncio.to_thread(db.get_expired_invite_links, now):
+        await revoke(bot, link, channel_id)
+
+
+async def run(bot):
+    """Load pooled links, then keep the pool full and clean up expired links."""
+    global _refill_needed
+    _refill_needed = asyncio.Event()
+
+    for link, channel_id, expires_at in await asyncio.to_thread(db.get_pooled_invite_links):
+        _pools.setdefault(channel_id, deque()).append((link, expires_at))
+
+    while True:
+        try:
+            await revoke_expired(bot)
+            await refill(bot)
+        except Exception as e:
+            logger.error(f"Invite pool maintenance failed: {e}")
+        try:
+            await asyncio.wait_for(_refill_needed.wait(), CHECK_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _refill_needed.clear()
+
+
+def stats() -> dict:
+    """Pool sizes, hit rate and refill latency."""
+    taken = _hits + _misses
+    samples = sorted(_refill_ms)
+    return {
+        "pooled": {channel_id: len(pool) for channel_id, pool in _pools.items()},
+        "hits": _hits,
+        "misses": _misses,
+        "hit_rate": round(100 * _hits / taken, 1) if taken else 0.0,
+        "revoked": _revoked,
+        "refill_avg_ms": round(sum(samples) / len(samples)) if samples else 0,
+        "refill_p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))]) if samples else 0,
+    }
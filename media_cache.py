@@ -0,0 +1,170 @@
+# ==============================================
+# TELEGRAM FILE_ID CACHE
+# ==============================================
+# Photos configured as URLs or local files (START_IMAGE_URL, PREMIUM_IMAGE_URL)
+# and generated images are uploaded once. The file_id Telegram returns is
+# stored in the settings table and reused for every later send, so Telegram
+# does not have to refetch the image each time.
+import hashlib
+import io
+import logging
+import os
+
+from telegram import InputMediaPhoto, Message
+from telegram.error import BadRequest
+
+import database as db
+
+logger = logging.getLogger(__name__)
+
+# In-memory copy of the cached file_ids: cache key -> file_id or NOT_CACHED
+_file_ids = {}
+
+# Stored for keys without a usable file_id, so a miss is not looked up again
+NOT_CACHED = "-"
+
+# BadRequest texts that mean Telegram rejected the cached file itself
+# (e.g. "Wrong file identifier/http url specified"); anything else, such as
+# a caption parse error, would fail the same way after a re-upload
+FILE_ERRORS = ("file", "media_empty", "photo_invalid", "image_process_failed")
+
+
+def _setting_key(key: str) -> str:
+    """Settings table key for a cached file_id."""
+    return "file_id:" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def is_file_id(source) -> bool:
+    """Check if a configured image is already a Telegram file_id."""
+    return (
+        isinstance(source, str)
+        and not source.startswith(("http://", "https://"))
+        and not os.path.exists(source)
+    )
+
+
+def get_file_id(key: str) -> str:
+    """Get the cached file_id for a URL, local file or generated media key, or None."""
+    file_id = _file_ids.get(key)
+    if file_id is None:
+        # Rows blanked by older versions count as misses too
+        file_id = db.get_setting(_setting_key(key)) or NOT_CACHED
+        _file_ids[key] = file_id
+    return None if file_id == NOT_CACHED else file_id
+
+
+def remember(key: str, file_id: str):
+    """Store the file_id Telegram returned for a source."""
+    if _file_ids.get(key) == file_id:
+        return
+    _file_ids[key] = file_id
+    db.set_setting(_setting_key(key), file_id)
+
+
+def forget(key: str):
+    """Drop a cached file_id that Telegram no longer accepts."""
+    _file_ids[key] = NOT_CACHED
+    db.set_setting(_setting_key(key), NOT_CACHED)
+
+
+def is_file_error(error: BadRequest) -> bool:
+    """Whether Telegram refused the file_id itself, so a re-upload can help."""
+    message = str(error).lower()
+    return any(text in message for text in FILE_ERRORS)
+
+
+def _upload_source(source):
+    """Turn a URL, local path or raw bytes into something send_photo accepts."""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    if isinstance(source, str) and os.path.exists(source):
+        return open(source, "rb")
+    return source
+
+
+async def send_photo(send, source, key: str = None, **kwargs):
+    """Send a photo, reusing the cached file_id when there is one.
+
+    Args:
+        send: Coroutine function taking `photo=`, e.g. message.reply_photo
+        source: URL, local file path, file_id, raw image bytes, or a coroutine
+            function returning bytes (only called when there is no cached file_id)
+        key: Cache key - required for bytes and callables, defaults to the source itself
+        **kwargs: Passed through to `send` (caption, reply_markup, ...)
+
+    Returns:
+        The sent Message
+    """
+    if is_file_id(source) and key is None:
+        return await send(photo=source, **kwargs)
+
+    key = key or source
+    file_id = get_file_id(key)
+
+    if file_id:
+        try:
+            return await send(photo=file_id, **kwargs)
+        except BadRequest as e:
+            if not is_file_error(e):
+                raise
+            # Expired or invalid file_id - upload the original again
+            logger.warning(f"Cached file_id for {key} rejected ({e}), re-uploading")
+            forget(key)
+
+    if callable(source):
+        source = await source()
+    photo = _upload_source(source)
+    try:
+        message = await send(photo=photo, **kwargs)
+    finally:
+        if hasattr(photo, "close") and not isinstance(photo, io.BytesIO):
+            photo.close()
+
+    if message and message.photo:
+        remember(key, message.photo[-1].file_id)
+    return message
+
+
+async def edit_photo(edit, source, key: str = None, caption: str = None,
+                     parse_mode: str = None, **kwargs):
+    """Replace the photo of an existing message, reusing the cached file_id.
+
+    Args:
+        edit: Coroutine function taking `media=`, e.g. query.edit_message_media
+        source: URL, local file path or file_id
+        key: Cache key, defaults to the source itself
+        caption: New caption
+        parse_mode: Parse mode of the caption
+        **kwargs: Passed through to `edit` (reply_markup, ...)
+
+    Returns:
+        The edited Message
+    """
+    def media(photo):
+        return InputMediaPhoto(media=photo, caption=caption, parse_mode=parse_mode)
+
+    if is_file_id(source) and key is None:
+        return await edit(media=media(source), **kwargs)
+
+    key = key or source
+    file_id = get_file_id(key)
+
+    if file_id:
+        try:
+            return await edit(media=media(file_id), **kwargs)
+        except BadRequest as e:
+            if not is_file_error(e):
+                raise
+            logger.warning(f"Cached file_id for {key} rejected ({e}), re-uploading")
+            forget(key)
+
+    photo = _upload_source(source)
+    try:
+        message = await edit(media=media(photo), **kwargs)
+    finally:
+        if hasattr(photo, "close") and not isinstance(photo, io.BytesIO):
+            photo.close()
+
+    if isinstance(message, Message) and message.photo:
+        remember(key, message.photo[-1].file_id)
+    return message
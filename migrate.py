@@ -0,0 +1,319 @@
+"""Copy bot data between SQLite and PostgreSQL, and back up SQLite files.
+
+copy: the tables in TABLES go from SOURCE to TARGET. The target schema is
+created by database.py, exactly as the bot creates it. Timestamps are
+converted between SQLite's ISO text and PostgreSQL TIMESTAMP. Row counts
+are verified at the end.
+  - users, channel_subscriptions, orders, revenue_ledger and
+    subscription_history are copied in primary key order, in batches of
+    --batch rows, each in its own transaction (COPY through a staging
+    table on PostgreSQL, executemany on SQLite). The last copied key is
+    checkpointed in the target, so an interrupted copy continues where it
+    stopped; --restart copies everything again. Rows are upserted, so
+    repeating a batch is harmless.
+  - plans, settings and the channel registry (channels, bundles,
+    bundle_channels) are small and replace the target's rows in one
+    transaction (including the defaults database.py seeded).
+  - revenue_daily is rebuilt from the copied revenue_ledger.
+Tables in NOT_COPIED are left behind on purpose (listed after every copy):
+  - invite_links: the target bot creates a fresh pool; old links expire
+  - content_catalog: posts are recorded again as they are published;
+    older links are checked against Telegram once, as before the catalog
+  - sent_reminders, job_checkpoints, job_leases, worker_leases,
+    send_budget, config_versions: per-deployment runtime state
+
+backup / restore: consistent copy of a SQLite database file with the
+SQLite online backup API. Backups can be taken while the bot is running;
+stop the bot before restoring or copying into the database it uses.
+
+Usage:
+    python migrate.py copy SOURCE TARGET [--batch N] [--restart]
+    python migrate.py backup DATABASE_FILE BACKUP_FILE
+    python migrate.py restore BACKUP_FILE DATABASE_FILE
+
+SOURCE and TARGET are a postgres:// URL or a SQLite file path.
+"""
+import argparse
+import io
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# table -> (primary key, columns, timestamp columns)
+TABLES = {
+    'users': ('user_id', ('user_id', 'username', 'first_name', 'joined_at'), ('joined_at',)),
+    'channel_subscriptions': (
+        'id', ('id', 'user_id', 'channel_id', 'expiry', 'created_at'), ('expiry', 'created_at')
+    ),
+    'orders': (
+        'id', ('id', 'trx_id', 'user_id', 'plan_id', 'amount', 'method', 'status', 'created_at'),
+        ('created_at',)
+    ),
+    'revenue_ledger': (
+        'id', ('id', 'created_at', 'day', 'user_id', 'plan_id', 'channel_id', 'amount', 'method',
+               'admin_id', 'trx_id'),
+        ('created_at',)
+    ),
+    'subscription_history': (
+        'id', ('id', 'user_id', 'channel_id', 'expiry', 'created_at', 'archived_at'),
+        ('expiry', 'created_at', 'archived_at')
+    ),
+    'plans': ('plan_id', ('plan_id', 'days', 'price', 'label', 'channel'), ()),
+    'settings': ('key', ('key', 'value'), ()),
+    'channels': ('code', ('code', 'chat_id', 'name', 'position'), ()),
+    'bundles': ('code', ('code', 'name', 'position'), ()),
+    'bundle_channels': ('bundle_code, channel_code', ('bundle_code', 'channel_code'), ()),
+}
+
+# Copied whole, replacing the target's rows
+REPLACED_TABLES = ('plans', 'settings', 'channels', 'bundles', 'bundle_channels')
+
+# Tables with a generated id on PostgreSQL - sequences move past the copied ids
+SERIAL_TABLES = ('channel_subscriptions', 'orders', 'revenue_ledger')
+
+# Deliberately not copied (see the module docstring)
+NOT_COPIED = (
+    'invite_links', 'content_catalog', 'sent_reminders', 'job_checkpoints', 'job_leases',
+    'worker_leases', 'send_budget', 'config_versions',
+)
+
+# Pages copied per backup step - writers are not blocked in between
+BACKUP_PAGES = 1024
+
+
+def is_postgres(spec: str) -> bool:
+    return spec.startswith(("postgres://", "postgresql://"))
+
+
+def connect(spec: str):
+    if is_postgres(spec):
+        import psycopg2
+        return psycopg2.connect(spec)
+    return sqlite3.connect(spec)
+
+
+def convert_row(row: tuple, columns: tuple, timestamps: tuple, to_postgres: bool) -> tuple:
+    """Timestamps as datetime for PostgreSQL, as ISO text for SQLite."""
+    converted = []
+    for column, value in zip(columns, row):
+        if column in timestamps and value is not None:
+            if to_postgres and not isinstance(value, datetime):
+                value = datetime.fromisoformat(value)
+            elif not to_postgres and isinstance(value, datetime):
+                value = value.isoformat()
+        converted.append(value)
+    return tuple(converted)
+
+
+def read_batch(conn, table: str, after, limit: int = None) -> list:
+    """Rows of a table in primary key order, after the `after` key."""
+    key, columns, _ = TABLES[table]
+    p = "?" if isinstance(conn, sqlite3.Connection) else "%s"
+    query = f"SELECT {', '.join(columns)} FROM {table}"
+    params = []
+    if after is not None:
+        query += f" WHERE {key} > {p}"
+        params.append(after)
+    query += f" ORDER BY {key}"
+    if limit:
+        query += f" LIMIT {p}"
+        params.append(limit)
+    cursor = conn.cursor()
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+
+def _copy_csv(rows: list) -> io.StringIO:
+    # Every value quoted, so only the unquoted \N marker reads as NULL
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(
+            r"\N" if value is None else '"' + str(value).replace('"', '""') + '"'
+            for value in row
+        ))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def write_batch(conn, table: str, rows: list, replace: bool = False):
+    """Upsert rows into the target in one transaction."""
+    key, columns, _ = TABLES[table]
+    column_list = ", ".join(columns)
+    updates = ", ".join(f"{column} = excluded.{column}" for column in columns if column not in key.split(", "))
+    conflict = f"ON CONFLICT({key}) DO UPDATE SET {updates}" if updates else f"ON CONFLICT({key}) DO NOTHING"
+    cursor = conn.cursor()
+
+    if replace:
+        cursor.execute(f"DELETE FROM {table}")
+
+    if isinstance(conn, sqlite3.Connection):
+        placeholders = ", ".join("?" * len(columns))
+        cursor.executemany(f"""
+            INSERT INTO {table} ({column_list}) VALUES ({placeholders})
+            {conflict}
+        """, rows)
+    else:
+        # COPY cannot upsert - load a staging table and merge it
+        cursor.execute(f"CREATE TEMP TABLE migrate_stage (LIKE {table}) ON COMMIT DROP")
+        cursor.copy_expert(
+            f"COPY migrate_stage ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            _copy_csv(rows)
+        )
+        cursor.execute(f"""
+            INSERT INTO {table} ({column_list})
+            SELECT {column_list} FROM migrate_stage
+            {conflict}
+        """)
+
+    conn.commit()
+
+
+def has_table(conn, table: str) -> bool:
+    """Whether the database has a table (older databases lack newer ones)."""
+    cursor = conn.cursor()
+    if isinstance(conn, sqlite3.Connection):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    else:
+        cursor.execute("SELECT to_regclass(%s)", (table,))
+        return cursor.fetchone()[0] is not None
+    return cursor.fetchone() is not None
+
+
+def count_rows(conn, table: str) -> int:
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def copy_database(source_spec: str, target_spec: str, batch: int, restart: bool) -> bool:
+    """Copy every table from source to target. Returns True if the counts match."""
+    # database.py creates the target schema on import
+    if is_postgres(target_spec):
+        os.environ["DATABASE_URL"] = target_spec
+    else:
+        os.environ["DATABASE_URL"] = ""
+        os.environ["DATABASE_PATH"] = target_spec
+    import database as db
+
+    to_postgres = is_postgres(target_spec)
+    source = connect(source_spec)
+    target = connect(target_spec)
+
+    try:
+        copied_tables = [table for table in TABLES if has_table(source, table)]
+        for table in TABLES:
+            if table not in copied_tables:
+                print(f"{table}: not in the source database, skipped")
+
+        for table in copied_tables:
+            key, columns, timestamps = TABLES[table]
+            started = time.perf_counter()
+
+            if table in REPLACED_TABLES:
+                rows = [convert_row(row, columns, timestamps, to_postgres)
+                        for row in read_batch(source, table, None)]
+                write_batch(target, table, rows, replace=True)
+                print(f"{table}: {len(rows)} rows")
+                continue
+
+            job = f"migrate:{table}"
+            checkpoint = None if restart else db.get_checkpoint(job)
+            after = checkpoint[1] if checkpoint else None
+            if after is not None:
+                print(f"{table}: resuming after {key} {after}")
+
+            copied = 0
+            while True:
+                rows = read_batch(source, table, after, batch)
+                if not rows:
+                    break
+                write_batch(target, table, [convert_row(row, columns, timestamps, to_postgres) for row in rows])
+                after = rows[-1][0]
+                db.set_checkpoint(job, datetime.now(), after)
+                copied += len(rows)
+                elapsed = time.perf_counter() - started
+                print(f"{table}: {copied} rows ({copied / elapsed:.0f} rows/sec)", end="\r")
+            print(f"{table}: {copied} rows copied in {time.perf_counter() - started:.1f}s")
+
+        if to_postgres:
+            # Ids were copied explicitly - move the sequences past them
+            cursor = target.cursor()
+            for table in SERIAL_TABLES:
+                cursor.execute(f"""
+                    SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1))
+                    FROM {table}
+                """)
+            target.commit()
+
+        db.rebuild_revenue_rollups()
+        print("revenue_daily: rebuilt from revenue_ledger")
+
+        ok = True
+        print("\nVerification:")
+        for table in copied_tables:
+            source_count, target_count = count_rows(source, table), count_rows(target, table)
+            matches = source_count == target_count
+            ok = ok and matches
+            print(f"  {table}: source {source_count}, target {target_count}{'' if matches else '  MISMATCH'}")
+        print(f"\nNot copied: {', '.join(NOT_COPIED)}")
+        return ok
+    finally:
+        source.close()
+        target.close()
+
+
+def sqlite_backup(source_path: str, target_path: str):
+    """Copy a SQLite database with the online backup API."""
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+
+    def progress(status, remaining, total):
+        print(f"{total - remaining}/{total} pages", end="\r")
+
+    try:
+        source.backup(target, pages=BACKUP_PAGES, progress=progress)
+        print()
+    finally:
+        target.close()
+        source.close()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Copy bot data between databases, back up SQLite.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    copy_parser = commands.add_parser("copy", help="Copy data from SOURCE to TARGET")
+    copy_parser.add_argument("source")
+    copy_parser.add_argument("target")
+    copy_parser.add_argument("--batch", type=int, default=10000, help="Rows per transaction")
+    copy_parser.add_argument("--restart", action="store_true", help="Ignore checkpoints, copy everything")
+
+    for name, help_text in (("backup", "Back up a SQLite database"), ("restore", "Restore a SQLite backup")):
+        backup_parser = commands.add_parser(name, help=help_text)
+        backup_parser.add_argument("source")
+        backup_parser.add_argument("target")
+
+    args = parser.parse_args()
+
+    if args.command == "copy":
+        if args.source == args.target:
+            parser.error("SOURCE and TARGET are the same database")
+        if copy_database(args.source, args.target, args.batch, args.restart):
+            return 0
+        print("Row counts differ - check the target before using it.")
+        return 1
+
+    if is_postgres(args.source) or is_postgres(args.target):
+        parser.error(f"{args.command} works on SQLite files - use pg_dump for PostgreSQL")
+    if not os.path.exists(args.source):
+        parser.error(f"{args.source} does not exist")
+    sqlite_backup(args.source, args.target)
+    print(f"Copied {args.source} to {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
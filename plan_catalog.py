@@ -0,0 +1,67 @@
+# ==============================================
+# PLAN CATALOG
+# ==============================================
+# The plans loaded from the database, as an immutable snapshot with its
+# lookups precomputed. A reload builds a complete new catalog and replaces
+# the current one with a single assignment, so a handler that took
+# current() keeps a consistent view even while plans are being reloaded.
+from dataclasses import dataclass, field
+from types import MappingProxyType
+
+
+@dataclass(frozen=True, slots=True)
+class Plan:
+    plan_id: str
+    days: int
+    price: int
+    label: str
+    channel: str  # Display name of the channel or bundle
+
+    @property
+    def code(self) -> str:
+        """Channel or bundle code the plan grants ('ch1_7_days' -> 'ch1')."""
+        return self.plan_id.split('_', 1)[0]
+
+
+@dataclass(frozen=True, slots=True)
+class PlanCatalog:
+    version: int = 0
+    by_id: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    # Channel or bundle code -> its plans, shortest first
+    by_channel: MappingProxyType = field(default_factory=lambda: MappingProxyType({}))
+    prices: frozenset = frozenset()
+
+    @classmethod
+    def build(cls, plans: list, version: int) -> "PlanCatalog":
+        """Index a list of Plan objects."""
+        by_channel = {}
+        for plan in sorted(plans, key=lambda p: (p.days, p.price, p.plan_id)):
+            by_channel.setdefault(plan.code, []).append(plan)
+        return cls(
+            version=version,
+            by_id=MappingProxyType({plan.plan_id: plan for plan in plans}),
+            by_channel=MappingProxyType({code: tuple(group) for code, group in by_channel.items()}),
+            prices=frozenset(plan.price for plan in plans),
+        )
+
+    def get(self, plan_id: str):
+        """The plan with this id, or None."""
+        return self.by_id.get(plan_id)
+
+    def for_channel(self, code: str) -> tuple:
+        """Plans of a channel or bundle code, shortest first."""
+        return self.by_channel.get(code, ())
+
+
+_current = PlanCatalog()
+
+
+def current() -> PlanCatalog:
+    """The catalog in use - keep the returned object for the whole request."""
+    return _current
+
+
+def swap(catalog: PlanCatalog):
+    """Make a fully built catalog the current one."""
+    global _current
+    _current = catalog
@@ -0,0 +1,132 @@
+# ==============================================
+# UPI QR RENDERING SERVICE
+# ==============================================
+# QR codes are rendered in a process pool so PNG encoding never blocks the
+# event loop, and kept in a bounded LRU keyed by (UPI id, amount). The
+# transaction id is not part of the cached image, so one image serves every
+# order for the same price. It is shown in the caption, and the "Pay in UPI
+# app" button (webapp.py /upi/<trx_id>) opens a upi://pay link with it as
+# the payment note - the note statement reconciliation matches on. Payers
+# who scan the QR have to type the note themselves; otherwise their credit
+# can only be matched by amount and time.
+#
+# The pool does not render faster than inline (see bench_qr.py) - it keeps
+# the event loop free: a cold render inline stalls every other update for
+# the whole render (p99 ~30 ms stall, vs ~1 ms through the pool).
+# Workers come from a forkserver, never a fork of the bot: forking a process
+# whose threads may hold the sqlite or logging locks can deadlock the child.
+import asyncio
+import io
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import qrcode
+
+import app_settings
+import config
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+# (upi_id, amount) -> PNG bytes, least recently used first
+_cache = OrderedDict()
+
+# Renders in progress, so concurrent misses for one key render once
+_pending = {}
+
+_hits = 0
+_misses = 0
+
+
+def build_upi_string(upi_id: str, amount: int, note: str = None) -> str:
+    """Build the upi://pay payload, optionally with a transaction note."""
+    upi_string = f"upi://pay?pa={upi_id}&pn=Premium&am={amount}"
+    if note:
+        upi_string += f"&tn={note}"
+    return upi_string + "&cu=INR"
+
+
+def render_png(payload: str) -> bytes:
+    """Render a QR code to PNG bytes. Runs inside the process pool."""
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(payload)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    bio = io.BytesIO()
+    img.save(bio, "PNG")
+    return bio.getvalue()
+
+
+def cache_key(upi_id: str, amount: int) -> str:
+    """Key for the rendered QR, also used for its cached Telegram file_id."""
+    return f"qr:{upi_id}:{amount}"
+
+
+def start(workers: int = None):
+    """Start the render process pool."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=workers or config.QR_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+
+
+def shutdown(wait: bool = False):
+    """Stop the render process pool."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+async def get_qr(upi_id: str, amount: int) -> bytes:
+    """Get the QR PNG for a UPI id and amount, rendering it off-loop on a miss."""
+    global _hits, _misses
+    key = (upi_id, amount)
+
+    png = _cache.get(key)
+    if png is not None:
+        _hits += 1
+        _cache.move_to_end(key)
+        return png
+
+    pending = _pending.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    _misses += 1
+    start()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, render_png, build_upi_string(upi_id, amount))
+    _pending[key] = future
+    try:
+        png = await future
+    finally:
+        _pending.pop(key, None)
+
+    _cache[key] = png
+    while len(_cache) > config.QR_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return png
+
+
+async def prerender(amounts, upi_id: str = None):
+    """Render QRs for the given amounts so the UPI screen never waits."""
+    upi_id = upi_id or app_settings.current().upi_id
+    results = await asyncio.gather(
+        *(get_qr(upi_id, amount) for amount in set(amounts)),
+        return_exceptions=True
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        logger.error(f"QR prerender failed for {len(failed)} amounts: {failed[0]}")
+
+
+def stats() -> dict:
+    """Cache size and hit/miss counters."""
+    return {"cached": len(_cache), "hits": _hits, "misses": _misses}
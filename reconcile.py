@@ -0,0 +1,191 @@
+# ==============================================
+# PAYMENT STATEMENT RECONCILIATION
+# ==============================================
+# Matches a bank/UPI statement export (CSV) against unpaid orders. The file
+# is read row by row, so memory depends on the number of unpaid orders, not
+# on the length of the statement. Orders are indexed two ways:
+#   - by transaction ID, for statement rows whose note contains one
+#   - by amount, for rows without an ID: a row matches if exactly one order
+#     of that amount was created within the payment window before it
+import bisect
+import csv
+import re
+from datetime import datetime, timedelta
+
+import trx_ids
+
+# Header names used by common bank and UPI exports (lower-cased)
+DATE_COLUMNS = ("transaction date", "txn date", "date", "value date", "date & time", "time", "timestamp")
+AMOUNT_COLUMNS = ("credit", "credit amount", "cr amount", "deposit", "deposit amt.", "amount", "amount (inr)")
+NOTE_COLUMNS = ("description", "narration", "remarks", "note", "particulars", "details", "transaction details")
+
+DATE_FORMATS = (
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%Y-%m-%d %H:%M",
+    "%d-%m-%Y %H:%M:%S",
+    "%d/%m/%Y %H:%M:%S",
+    "%d-%m-%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%d %b %Y %H:%M:%S",
+    "%d %b %Y, %I:%M %p",
+    "%d-%b-%Y %H:%M",
+    "%Y-%m-%d",
+    "%d-%m-%Y",
+    "%d/%m/%Y",
+    "%d/%m/%y",
+    "%d %b %Y",
+    "%d-%b-%Y",
+)
+
+# DATE_FORMATS, most recently matched first
+_formats = list(DATE_FORMATS)
+
+AMOUNT_PATTERN = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+
+# Rows kept per category for the report
+SAMPLE_SIZE = 20
+
+# Header lines scanned before giving up (exports often start with a preamble)
+MAX_PREAMBLE_ROWS = 50
+
+
+def parse_amount(value: str):
+    """Parse '1,499.00', 'Rs. 299', '₹499 CR' into a number (None if empty)."""
+    # The first number in the cell - "Rs." would otherwise leave a stray dot
+    match = AMOUNT_PATTERN.search(value or "")
+    if not match:
+        return None
+    return float(match.group().replace(",", ""))
+
+
+def parse_time(value: str) -> tuple:
+    """Parse a statement date/time in any of the common formats.
+
+    Returns:
+        (datetime, date_only) - (None, False) if the value is not a date
+    """
+    value = (value or "").strip()
+    for i, fmt in enumerate(_formats):
+        try:
+            when = datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+        if i:
+            # Statements use one format throughout - try it first next time
+            _formats.insert(0, _formats.pop(i))
+        return when, "%H" not in fmt and "%I" not in fmt
+    return None, False
+
+
+def _find_column(header: list, names: tuple):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+
+class Reconciler:
+    """Match statement rows to unpaid orders.
+
+    Args:
+        orders: Unpaid orders as returned by database.get_unpaid_orders()
+        window_minutes: How long after an order its payment may appear
+    """
+
+    def __init__(self, orders: list, window_minutes: int):
+        self.window = timedelta(minutes=window_minutes)
+        self.by_trx_id = {order['trx_id']: order for order in orders}
+
+        # amount -> (sorted creation times, orders in the same order)
+        self.by_amount = {}
+        for order in sorted(orders, key=lambda o: o['created_at']):
+            times, same_amount = self.by_amount.setdefault(order['amount'], ([], []))
+            times.append(order['created_at'])
+            same_amount.append(order)
+
+        self.matched = {}  # trx_id -> (order, how)
+        self.unmatched = 0
+        self.ambiguous = 0
+        self.skipped = 0
+        self.rows = 0
+        self.unmatched_samples = []
+        self.ambiguous_samples = []
+
+    def _match_by_amount(self, amount: float, start: datetime, end: datetime) -> list:
+        if amount != int(amount):
+            return []
+        entry = self.by_amount.get(int(amount))
+        if not entry:
+            return []
+        times, orders = entry
+        # Orders created in [start - window, end]
+        lo = bisect.bisect_left(times, start - self.window)
+        hi = bisect.bisect_right(times, end)
+        return [o for o in orders[lo:hi] if o['trx_id'] not in self.matched]
+
+    def add_row(self, when: datetime, amount: float, note: str, date_only: bool = False):
+        """Match one credit line of the statement.
+
+        Args:
+            when: Time of the payment (None if unknown)
+            amount: Credited amount
+            note: Transaction note / narration
+            date_only: `when` is just a date - match orders from the whole day
+        """
+        self.rows += 1
+        summary = f"{when:%d %b %H:%M} Rs.{amount:g} {note[:40]}".strip() if when else f"Rs.{amount:g}"
+
+        for candidate in trx_ids.ID_PATTERN.findall(note):
+            order = self.by_trx_id.get(candidate)
+            if order and candidate not in self.matched and trx_ids.is_valid(candidate):
+                self.matched[candidate] = (order, "note")
+                return
+
+        candidates = []
+        if when:
+            end = when + timedelta(days=1) if date_only else when
+            candidates = self._match_by_amount(amount, when, end)
+        if len(candidates) == 1:
+            self.matched[candidates[0]['trx_id']] = (candidates[0], "amount")
+        elif candidates:
+            self.ambiguous += 1
+            if len(self.ambiguous_samples) < SAMPLE_SIZE:
+                self.ambiguous_samples.append(f"{summary} ({len(candidates)} orders)")
+        else:
+            self.unmatched += 1
+            if len(self.unmatched_samples) < SAMPLE_SIZE:
+                self.unmatched_samples.append(summary)
+
+    def feed_csv(self, path: str):
+        """Stream a CSV statement from disk into the reconciler."""
+        with open(path, newline="", encoding="utf-8-sig", errors="replace") as f:
+            reader = csv.reader(f)
+
+            # Find the header row below any preamble
+            date_col = amount_col = note_col = None
+            for i, row in enumerate(reader):
+                header = [cell.strip().lower() for cell in row]
+                amount_col = _find_column(header, AMOUNT_COLUMNS)
+                if amount_col is not None:
+                    date_col = _find_column(header, DATE_COLUMNS)
+                    note_col = _find_column(header, NOTE_COLUMNS)
+                    break
+                if i >= MAX_PREAMBLE_ROWS:
+                    break
+            if amount_col is None:
+                raise ValueError("No amount/credit column found in the statement header")
+
+            for row in reader:
+                if len(row) <= amount_col:
+                    continue
+                amount = parse_amount(row[amount_col])
+                if not amount or amount <= 0:
+                    # Debits, blank credits and summary lines
+                    self.skipped += 1
+                    continue
+                when, date_only = None, False
+                if date_col is not None and len(row) > date_col:
+                    when, date_only = parse_time(row[date_col])
+                note = row[note_col] if note_col is not None and len(row) > note_col else " ".join(row)
+                self.add_row(when, amount, note, date_only)
@@ -0,0 +1,332 @@
+# ==============================================
+# OUTBOUND SEND SCHEDULER
+# ==============================================
+# Every Bot API request made through `application.bot` passes through
+# PriorityRateLimiter (plugged in via Application.builder().rate_limiter()).
+# Requests wait in priority lanes for tokens from Telegram's global and
+# per-chat budgets, so a running broadcast never starves interactive replies.
+#
+# Pick a lane per call with `rate_limit_args`, e.g.
+#     await context.bot.send_message(chat_id, text, rate_limit_args=scheduler.BULK)
+# Calls without rate_limit_args run in the INTERACTIVE lane.
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes - lower value is served first
+INTERACTIVE = 0
+TRANSACTIONAL = 1
+BULK = 2
+
+LANE_NAMES = {
+    INTERACTIVE: "interactive",
+    TRANSACTIONAL: "transactional",
+    BULK: "bulk",
+}
+
+# Requests that are not subject to Telegram's messaging limits
+UNLIMITED_ENDPOINTS = frozenset({
+    "getMe",
+    "getUpdates",
+    "setWebhook",
+    "deleteWebhook",
+    "getWebhookInfo",
+    "answerCallbackQuery",
+    "getFile",
+})
+
+# Requests that count towards the per-chat limit of the target chat
+PER_CHAT_PREFIXES = ("send", "copyMessage", "forwardMessage")
+
+# Chat management requests - they do not send messages, so they get their
+# own budget instead of competing with messages for the global one
+CHAT_ADMIN_ENDPOINTS = frozenset({
+    "approveChatJoinRequest",
+    "declineChatJoinRequest",
+    "banChatMember",
+    "unbanChatMember",
+    "createChatInviteLink",
+    "revokeChatInviteLink",
+})
+
+# Number of recent wait samples kept per lane for percentiles
+WAIT_SAMPLES = 1000
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate` tokens per second."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> float:
+        """Take one token.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until one is available
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def is_full(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class LaneStats:
+    """Queue depth and wait time counters for one lane."""
+
+    __slots__ = ("depth", "sent", "total_wait", "max_wait", "waits")
+
+    def __init__(self):
+        self.depth = 0
+        self.sent = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+
+    def record(self, wait: float):
+        self.sent += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.waits.append(wait)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.waits)
+        p99 = waits[min(len(waits) - 1, int(len(waits) * 0.99))] if waits else 0.0
+        return {
+            "depth": self.depth,
+            "sent": self.sent,
+            "avg_wait_ms": round(self.total_wait / self.sent * 1000, 1) if self.sent else 0.0,
+            "p99_wait_ms": round(p99 * 1000, 1),
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """Rate limiter with priority lanes and Telegram's global/per-chat budgets.
+
+    Args:
+        global_rate: Requests per second allowed across all chats
+        chat_rate: Messages per second allowed to a single private chat
+        group_rate: Messages per second allowed to a single group or channel
+        admin_rate: Chat management requests (CHAT_ADMIN_ENDPOINTS) per second
+        shared_budget: Share the global budget with other workers through the database
+        max_retries: How often a request is retried after a RetryAfter error
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30,
+        chat_rate: float = 1,
+        group_rate: float = 20 / 60,
+        admin_rate: float = 100,
+        shared_budget: bool = False,
+        max_retries: int = 2,
+    ):
+        self.global_rate = global_rate
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.shared_budget = shared_budget
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._admin = TokenBucket(admin_rate, admin_rate)
+        self._chats = {}
+        self._waiters = []
+        self._seq = itertools.count()
+        self._wake = None
+        self._pump_task = None
+        self._paused_until = 0.0
+        self._lease = 0
+        self._lease_slot = None
+        self._retry_after_count = 0
+        self._stats = {lane: LaneStats() for lane in LANE_NAMES}
+
+    async def initialize(self) -> None:
+        self._wake = asyncio.Event()
+        self._pump_task = asyncio.create_task(self._pump())
+
+    async def shutdown(self) -> None:
+        if self._pump_task:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+
+    def stats(self) -> dict:
+        """Per-lane queue depth and wait times."""
+        return {
+            "lanes": {name: self._stats[lane].snapshot() for lane, name in LANE_NAMES.items()},
+            "retry_after": self._retry_after_count,
+            "tracked_chats": len(self._chats),
+        }
+
+    # ----------------------------------------------
+    # Token acquisition
+    # ----------------------------------------------
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Negative ids are groups and channels
+            is_group = isinstance(chat_id, str) or chat_id < 0
+            rate = self.group_rate if is_group else self.chat_rate
+            bucket = self._chats[chat_id] = TokenBucket(rate, 3)
+            if len(self._chats) > 10000:
+                self._prune_chats()
+        return bucket
+
+    def _prune_chats(self):
+        """Drop per-chat buckets that are full again - they carry no state."""
+        for chat_id in [c for c, b in self._chats.items() if b.is_full()]:
+            del self._chats[chat_id]
+
+    async def _acquire_chat(self, chat_id):
+        await self._acquire_bucket(self._chat_bucket(chat_id))
+
+    async def _acquire_bucket(self, bucket: TokenBucket):
+        while True:
+            wait = bucket.take()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _acquire_global(self, lane: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), future))
+        self._wake.set()
+        await future
+
+    async def _take_shared(self) -> float:
+        """Take one token from the cross-process budget.
+
+        Returns:
+            0 if a token was taken, otherwise the seconds until the next window
+        """
+        slot = int(time.time())
+        if slot != self._lease_slot:
+            self._lease_slot = slot
+            self._lease = 0
+        if self._lease == 0:
+            import database as db
+            want = max(1, min(len(self._waiters), 5))
+            self._lease = await asyncio.to_thread(
+                db.claim_send_tokens, slot, want, int(self.global_rate)
+            )
+            if self._lease == 0:
+                return slot + 1 - time.time()
+        self._lease -= 1
+        return 0.0
+
+    async def _pump(self):
+        """Hand out global tokens to waiters in priority order."""
+        while True:
+            while not self._waiters:
+                self._wake.clear()
+                await self._wake.wait()
+
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+
+            wait = self._global.take()
+            if not wait and self.shared_budget:
+                try:
+                    wait = await self._take_shared()
+                except Exception as e:
+                    logger.error(f"Shared send budget unavailable: {e}")
+                    wait = 0.0
+                if wait:
+                    # Give back the local token we could not use
+                    self._global.tokens += 1
+            if wait:
+                await asyncio.sleep(wait)
+                continue
+
+            while self._waiters:
+                _, _, future = heapq.heappop(self._waiters)
+                if not future.done():
+                    future.set_result(None)
+                    break
+
+    # ----------------------------------------------
+    # BaseRateLimiter interface
+    # ----------------------------------------------
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        lane = rate_limit_args if rate_limit_args in LANE_NAMES else INTERACTIVE
+        chat_id = data.get("chat_id")
+        stats = self._stats[lane]
+
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            stats.depth += 1
+            try:
+                if endpoint in CHAT_ADMIN_ENDPOINTS:
+                    pause = self._paused_until - time.monotonic()
+                    if pause > 0:
+                        await asyncio.sleep(pause)
+                    await self._acquire_bucket(self._admin)
+                else:
+                    if chat_id is not None and endpoint.startswith(PER_CHAT_PREFIXES):
+                        await self._acquire_chat(chat_id)
+                    await self._acquire_global(lane)
+            finally:
+                stats.depth -= 1
+            stats.record(time.monotonic() - started)
+
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self._retry_after_count += 1
+                delay = e.retry_after
+                if isinstance(delay, timedelta):
+                    delay = delay.total_seconds()
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f"Flood limit hit on {endpoint}, retrying in {delay}s")
+                # Pause everyone - the flood limit is shared by the whole bot
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                await asyncio.sleep(delay)
+
+
+def build_rate_limiter() -> PriorityRateLimiter:
+    """Create the rate limiter from config."""
+    return PriorityRateLimiter(
+        global_rate=config.SEND_GLOBAL_RATE,
+        chat_rate=config.SEND_CHAT_RATE,
+        group_rate=config.SEND_GROUP_RATE_PER_MIN / 60,
+        admin_rate=config.SEND_ADMIN_RATE,
+        shared_budget=config.SEND_SHARED_BUDGET,
+    )
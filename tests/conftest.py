@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The bot's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules importing database.py create their tables on import - keep them
+# in a throwaway SQLite file, never in a configured PostgreSQL database
+os.environ["DATABASE_URL"] = ""
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="bot-tests-"), "test.db")
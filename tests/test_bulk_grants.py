@@ -0,0 +1,61 @@
+import pytest
+
+import bulk_grants
+import config
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    monkeypatch.setattr(config, "CHANNELS", {
+        'ch1': {'chat_id': -1001, 'name': 'HASEENA MAIN'},
+        'ch2': {'chat_id': -1002, 'name': 'HASEENA 2.0'},
+    })
+    monkeypatch.setattr(config, "BUNDLES", {'all': {'name': 'ALL CHANNELS', 'channels': ['ch1', 'ch2']}})
+    monkeypatch.setattr(config, "CHANNEL_NAME_MAP", {
+        'ch1': 'HASEENA MAIN', 'ch2': 'HASEENA 2.0', 'all': 'ALL CHANNELS'
+    })
+
+
+def parse(tmp_path, text: str) -> tuple:
+    path = tmp_path / "grants.csv"
+    path.write_text(text, encoding="utf-8")
+    return bulk_grants.parse_grants_csv(str(path))
+
+
+def test_rows_without_header(tmp_path):
+    grants, errors = parse(tmp_path, "123,ch1,7\n456,all,30\n")
+    assert grants == [(123, 'ch1', 7), (456, 'all', 30)]
+    assert errors == []
+
+
+def test_header_columns_in_any_order(tmp_path):
+    grants, errors = parse(tmp_path, "\ufeffDays,User_ID,Channel\n7,123,ch2\n")
+    assert grants == [(123, 'ch2', 7)]
+    assert errors == []
+
+
+def test_channel_number_and_name_aliases(tmp_path):
+    grants, _ = parse(tmp_path, "1,2,7\n2,haseena main,7\n3,ALL,7\n")
+    assert [channel for _, channel, _ in grants] == ['ch2', 'ch1', 'all']
+
+
+def test_invalid_rows_are_reported_by_line(tmp_path):
+    grants, errors = parse(tmp_path, (
+        "user_id,channel,days\n"
+        "123,ch1,7\n"
+        "\n"
+        "abc,ch1,7\n"
+        "124,ch9,7\n"
+        "125,ch1,0\n"
+        f"126,ch1,{bulk_grants.MAX_DAYS + 1}\n"
+        "127,ch1\n"
+    ))
+    assert grants == [(123, 'ch1', 7)]
+    assert [line_no for line_no, _ in errors] == [4, 5, 6, 7, 8]
+    assert "unknown channel 'ch9'" in errors[1][1]
+
+
+def test_describe_channels_follows_the_registry(monkeypatch):
+    assert bulk_grants.describe_channels() == "ch1, ch2 or all (or 1, 2)"
+    monkeypatch.setattr(config, "BUNDLES", {})
+    assert bulk_grants.describe_channels() == "ch1 or ch2 (or 1, 2)"
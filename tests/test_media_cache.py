@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from telegram.error import BadRequest
+
+import media_cache
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    """In-memory settings table, counting reads."""
+    rows = {}
+    reads = []
+
+    def get_setting(key, default=None):
+        reads.append(key)
+        return rows.get(key, default)
+
+    monkeypatch.setattr(media_cache.db, "get_setting", get_setting)
+    monkeypatch.setattr(media_cache.db, "set_setting", rows.__setitem__)
+    monkeypatch.setattr(media_cache, "_file_ids", {})
+    return SimpleNamespace(rows=rows, reads=reads)
+
+
+def sent(file_id):
+    return SimpleNamespace(photo=[SimpleNamespace(file_id=file_id)])
+
+
+def test_miss_is_looked_up_once(settings):
+    assert media_cache.get_file_id("https://x/a.png") is None
+    assert media_cache.get_file_id("https://x/a.png") is None
+    assert len(settings.reads) == 1
+
+
+def test_forgotten_file_id_stays_a_miss(settings):
+    media_cache.remember("https://x/a.png", "AgAD1")
+    media_cache.forget("https://x/a.png")
+    assert media_cache.get_file_id("https://x/a.png") is None
+    assert media_cache.NOT_CACHED in settings.rows.values()
+    assert settings.reads == []
+
+
+def test_stale_file_id_is_reuploaded(settings):
+    media_cache.remember("https://x/a.png", "AgAD1")
+    calls = []
+
+    async def send(photo, **kwargs):
+        calls.append(photo)
+        if photo == "AgAD1":
+            raise BadRequest("Wrong file identifier/http url specified")
+        return sent("AgAD2")
+
+    asyncio.run(media_cache.send_photo(send, "https://x/a.png"))
+    assert calls == ["AgAD1", "https://x/a.png"]
+    assert media_cache.get_file_id("https://x/a.png") == "AgAD2"
+
+
+def test_caption_error_is_not_retried(settings):
+    media_cache.remember("https://x/a.png", "AgAD1")
+    calls = []
+
+    async def send(photo, **kwargs):
+        calls.append(photo)
+        raise BadRequest("Can't parse entities: can't find end of the entity")
+
+    with pytest.raises(BadRequest):
+        asyncio.run(media_cache.send_photo(send, "https://x/a.png", caption="*oops"))
+    assert calls == ["AgAD1"]
+    assert media_cache.get_file_id("https://x/a.png") == "AgAD1"
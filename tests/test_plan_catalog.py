@@ -0,0 +1,60 @@
+import dataclasses
+
+import pytest
+
+import plan_catalog
+from plan_catalog import Plan, PlanCatalog
+
+PLANS = [
+    Plan("ch1_30_days", 30, 499, "1 Month", "HASEENA MAIN"),
+    Plan("ch1_7_days", 7, 299, "7 Days", "HASEENA MAIN"),
+    Plan("ch2_7_days", 7, 120, "7 Days", "HASEENA 2.0"),
+    Plan("all_7_days", 7, 499, "7 Days", "ALL CHANNELS"),
+]
+
+
+@pytest.fixture
+def restore_current():
+    previous = plan_catalog.current()
+    yield
+    plan_catalog.swap(previous)
+
+
+def test_plan_code():
+    assert Plan("all_90_days", 90, 1999, "3 Months", "ALL CHANNELS").code == "all"
+
+
+def test_build_indexes_plans():
+    catalog = PlanCatalog.build(PLANS, version=3)
+    assert catalog.version == 3
+    assert catalog.get("ch2_7_days") is PLANS[2]
+    assert catalog.get("ch9_7_days") is None
+    assert catalog.prices == {499, 299, 120}
+
+
+def test_for_channel_is_sorted_shortest_first():
+    catalog = PlanCatalog.build(PLANS, version=1)
+    assert [plan.plan_id for plan in catalog.for_channel("ch1")] == ["ch1_7_days", "ch1_30_days"]
+    assert catalog.for_channel("ch3") == ()
+
+
+def test_catalog_is_immutable():
+    catalog = PlanCatalog.build(PLANS, version=1)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        catalog.version = 2
+    with pytest.raises(TypeError):
+        catalog.by_id["ch3_7_days"] = PLANS[0]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        PLANS[0].price = 1
+
+
+def test_swap_replaces_current_and_keeps_old_snapshot(restore_current):
+    old = PlanCatalog.build(PLANS, version=1)
+    plan_catalog.swap(old)
+    taken = plan_catalog.current()
+
+    plan_catalog.swap(PlanCatalog.build(PLANS[:1], version=2))
+    assert plan_catalog.current().version == 2
+    # A handler holding the old catalog still sees all of its plans
+    assert taken is old
+    assert len(taken.by_id) == len(PLANS)
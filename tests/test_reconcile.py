@@ -0,0 +1,103 @@
+from datetime import datetime
+
+import pytest
+
+import reconcile
+import trx_ids
+
+START = datetime(2026, 3, 10, 12, 0)
+
+
+def make_order(worker_id: int, amount: int, created_at: datetime) -> dict:
+    generator = trx_ids.TrxIdGenerator(worker_id, clock=lambda: created_at.timestamp())
+    return {'trx_id': generator.next_id(), 'amount': amount, 'created_at': created_at}
+
+
+def write_statement(tmp_path, lines: list) -> str:
+    path = tmp_path / "statement.csv"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1,499.00", 1499.0),
+    ("Rs. 299", 299.0),
+    ("₹499 CR", 499.0),
+    ("", None),
+    ("-", None),
+])
+def test_parse_amount(value, expected):
+    assert reconcile.parse_amount(value) == expected
+
+
+def test_parse_time_formats():
+    assert reconcile.parse_time("10/03/2026 12:05") == (datetime(2026, 3, 10, 12, 5), False)
+    assert reconcile.parse_time("10 Mar 2026") == (datetime(2026, 3, 10), True)
+    assert reconcile.parse_time("not a date") == (None, False)
+
+
+def test_note_with_transaction_id_matches_that_order():
+    first = make_order(1, 299, START)
+    second = make_order(2, 299, START)
+    reconciler = reconcile.Reconciler([first, second], window_minutes=30)
+    reconciler.add_row(START, 299.0, f"UPI/{second['trx_id']}/payment")
+    assert reconciler.matched == {second['trx_id']: (second, "note")}
+
+
+def test_invalid_check_digit_falls_back_to_amount():
+    order = make_order(1, 299, START)
+    typo = order['trx_id'][:-1] + str((int(order['trx_id'][-1]) + 1) % 10)
+    reconciler = reconcile.Reconciler([order], window_minutes=30)
+    reconciler.add_row(START.replace(minute=10), 299.0, f"UPI {typo}")
+    assert reconciler.matched == {order['trx_id']: (order, "amount")}
+
+
+def test_amount_match_needs_a_single_order_in_the_window():
+    early = make_order(1, 499, START)
+    late = make_order(2, 499, START.replace(minute=20))
+    reconciler = reconcile.Reconciler([early, late], window_minutes=30)
+
+    reconciler.add_row(START.replace(minute=25), 499.0, "UPI payment")
+    assert reconciler.ambiguous == 1
+    assert reconciler.matched == {}
+
+    # Only the later order is still within the window
+    reconciler.add_row(START.replace(minute=45), 499.0, "UPI payment")
+    assert reconciler.matched == {late['trx_id']: (late, "amount")}
+
+
+def test_payment_before_order_or_other_amount_is_unmatched():
+    order = make_order(1, 299, START)
+    reconciler = reconcile.Reconciler([order], window_minutes=30)
+    reconciler.add_row(START.replace(hour=11), 299.0, "too early")
+    reconciler.add_row(START.replace(minute=5), 300.0, "wrong amount")
+    assert reconciler.unmatched == 2
+    assert reconciler.unmatched_samples[0].startswith("10 Mar 11:00 Rs.299")
+
+
+def test_feed_csv_skips_preamble_and_debits(tmp_path):
+    order = make_order(1, 299, START)
+    other = make_order(2, 999, START)
+    path = write_statement(tmp_path, [
+        "Account Statement",
+        "Period,01/03/2026 - 31/03/2026",
+        "Txn Date,Narration,Debit,Credit",
+        f"10/03/2026 12:03,UPI/{order['trx_id']},,299.00",
+        "10/03/2026 12:10,Card purchase,150.00,",
+        "10/03/2026,UPI from customer,,999.00",
+        "Closing balance,,,",
+    ])
+    reconciler = reconcile.Reconciler([order, other], window_minutes=30)
+    reconciler.feed_csv(path)
+
+    assert reconciler.rows == 2
+    assert reconciler.skipped == 2
+    assert reconciler.matched[order['trx_id']][1] == "note"
+    # Date-only row matches orders from the whole day
+    assert reconciler.matched[other['trx_id']][1] == "amount"
+
+
+def test_feed_csv_without_amount_column(tmp_path):
+    path = write_statement(tmp_path, ["Date,Description", "10/03/2026,hello"])
+    with pytest.raises(ValueError):
+        reconcile.Reconciler([], window_minutes=30).feed_csv(path)
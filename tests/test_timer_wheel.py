@@ -0,0 +1,75 @@
+import asyncio
+import time
+
+from timer_wheel import TimerWheel
+
+
+def make_wheel(**kwargs):
+    return TimerWheel(lambda due: None, **kwargs), time.time()
+
+
+def test_timer_fires_when_due_not_before():
+    wheel, now = make_wheel(tick=1.0, slots=8)
+    wheel.schedule("order", now + 5, "payload")
+    assert wheel.advance(now + 3) == []
+    assert wheel.advance(now + 6) == [("order", "payload")]
+    assert len(wheel) == 0
+
+
+def test_reschedule_replaces_timer():
+    wheel, now = make_wheel(tick=1.0, slots=8)
+    wheel.schedule("album", now + 2, 1)
+    wheel.schedule("album", now + 4, 2)
+    assert len(wheel) == 1
+    assert wheel.advance(now + 3) == []
+    assert wheel.advance(now + 5) == [("album", 2)]
+
+
+def test_cancel():
+    wheel, now = make_wheel()
+    wheel.schedule("order", now + 2)
+    assert "order" in wheel
+    assert wheel.cancel("order")
+    assert not wheel.cancel("order")
+    assert wheel.advance(now + 10) == []
+
+
+def test_timers_beyond_one_rotation_wait_for_their_tick():
+    wheel, now = make_wheel(tick=1.0, slots=4)
+    wheel.schedule("far", now + 10)
+    wheel.schedule("near", now + 2)
+    assert wheel.advance(now + 3) == [("near", None)]
+    # The far timer's slot came around at +6 already, but it is not due yet
+    assert wheel.advance(now + 7) == []
+    assert wheel.advance(now + 11) == [("far", None)]
+
+
+def test_past_timer_fires_on_next_advance():
+    wheel, now = make_wheel()
+    wheel.schedule("late", now - 60)
+    assert wheel.advance(now + 1) == [("late", None)]
+
+
+def test_many_timers_fire_in_one_batch():
+    wheel, now = make_wheel(tick=1.0, slots=16)
+    for i in range(1000):
+        wheel.schedule(i, now + 2)
+    due = wheel.advance(now + 3)
+    assert sorted(key for key, _ in due) == list(range(1000))
+
+
+def test_run_hands_due_timers_to_async_callback():
+    fired = []
+
+    async def callback(due):
+        fired.extend(due)
+
+    async def main():
+        wheel = TimerWheel(callback, tick=0.02)
+        wheel.schedule("order", time.time() + 0.05, "x")
+        task = asyncio.create_task(wheel.run())
+        await asyncio.sleep(0.2)
+        task.cancel()
+
+    asyncio.run(main())
+    assert fired == [("order", "x")]
@@ -0,0 +1,117 @@
+from datetime import datetime
+
+import pytest
+
+import trx_ids
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_ids_are_unique_and_ordered():
+    generator = trx_ids.TrxIdGenerator(1)
+    ids = [generator.next_id() for _ in range(20000)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_workers_never_collide_on_the_same_millisecond():
+    clock = FakeClock(1760000000.0)
+    first = trx_ids.TrxIdGenerator(1, clock=clock)
+    second = trx_ids.TrxIdGenerator(2, clock=clock)
+    ids = [first.next_id() for _ in range(100)] + [second.next_id() for _ in range(100)]
+    assert len(set(ids)) == 200
+
+
+def test_sequence_overflow_borrows_next_millisecond():
+    generator = trx_ids.TrxIdGenerator(3, clock=FakeClock(1760000000.0))
+    ids = [generator.next_id() for _ in range(trx_ids.MAX_SEQUENCE * 3)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_clock_rollback_keeps_ids_unique_and_ordered():
+    clock = FakeClock(1760000000.0)
+    generator = trx_ids.TrxIdGenerator(4, clock=clock)
+    before = [generator.next_id() for _ in range(10)]
+    clock.now -= 5  # NTP step backwards
+    after = [generator.next_id() for _ in range(10)]
+    ids = before + after
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+
+
+def test_generated_ids_are_valid():
+    generator = trx_ids.TrxIdGenerator(5)
+    for _ in range(1000):
+        trx_id = generator.next_id()
+        assert trx_ids.ID_PATTERN.fullmatch(trx_id)
+        assert trx_ids.is_valid(trx_id)
+
+
+def test_check_digit_catches_single_digit_errors():
+    trx_id = trx_ids.TrxIdGenerator(6).next_id()
+    prefix = len(trx_ids.PREFIX)
+    for position in range(prefix, len(trx_id)):
+        for digit in "0123456789":
+            if digit != trx_id[position]:
+                typo = trx_id[:position] + digit + trx_id[position + 1:]
+                assert not trx_ids.is_valid(typo)
+
+
+def test_check_digit_catches_adjacent_swaps():
+    generator = trx_ids.TrxIdGenerator(7)
+    prefix = len(trx_ids.PREFIX)
+    for _ in range(50):
+        trx_id = generator.next_id()
+        for position in range(prefix, len(trx_id) - 1):
+            a, b = trx_id[position], trx_id[position + 1]
+            if a != b:
+                swapped = trx_id[:position] + b + a + trx_id[position + 2:]
+                assert not trx_ids.is_valid(swapped)
+
+
+@pytest.mark.parametrize("trx_id", [None, "", "TRX123", "trx" + "0" * 20, "TRX" + "0" * 21, "ABC" + "0" * 20])
+def test_malformed_ids_are_invalid(trx_id):
+    assert not trx_ids.is_valid(trx_id)
+
+
+def test_created_at_and_id_floor():
+    generator = trx_ids.TrxIdGenerator(8)
+    before = datetime.now()
+    trx_id = generator.next_id()
+    assert trx_id >= trx_ids.id_floor(before)
+    assert abs((trx_ids.created_at(trx_id) - before).total_seconds()) < 1
+
+
+def test_ids_need_a_worker_id():
+    with pytest.raises(RuntimeError):
+        trx_ids.TrxIdGenerator().next_id()
+    with pytest.raises(ValueError):
+        trx_ids.TrxIdGenerator(trx_ids.MAX_WORKER_ID + 1)
+
+
+def test_expired_lease_stops_ids_until_renewed():
+    monotonic = FakeClock(100.0)
+    generator = trx_ids.TrxIdGenerator(monotonic=monotonic)
+    generator.set_worker_id(9, lease_until=130.0)
+    generator.next_id()
+
+    monotonic.now = 130.0
+    with pytest.raises(trx_ids.LeaseExpired):
+        generator.next_id()
+
+    generator.extend_lease(200.0)
+    assert trx_ids.is_valid(generator.next_id())
+
+
+def test_fixed_worker_id_has_no_lease():
+    monotonic = FakeClock(0.0)
+    generator = trx_ids.TrxIdGenerator(10, monotonic=monotonic)
+    monotonic.now = 10 ** 9
+    assert trx_ids.is_valid(generator.next_id())
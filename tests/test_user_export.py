@@ -0,0 +1,44 @@
+import csv
+import gzip
+from datetime import datetime
+
+import database as db
+import user_export
+
+
+def read_export(path) -> list:
+    with gzip.open(path, "rt", encoding="utf-8", newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_write_csv_header_and_cells(tmp_path, monkeypatch):
+    rows = [
+        (1, "alice", "Alice, \"A\"", datetime(2026, 1, 2, 3, 4, 5, 678901), "ch1", datetime(2026, 2, 1, 12, 0)),
+        (2, None, "Bob", datetime(2026, 1, 3), None, None),
+    ]
+    monkeypatch.setattr(db, "iter_user_export", lambda batch_size=5000: iter(rows))
+    path = tmp_path / "users.csv.gz"
+
+    assert user_export.write_csv(str(path)) == 2
+    header, first, second = read_export(path)
+    assert tuple(header) == db.EXPORT_COLUMNS
+    assert first == ["1", "alice", "Alice, \"A\"", "2026-01-02T03:04:05", "ch1", "2026-02-01T12:00:00"]
+    assert second == ["2", "", "Bob", "2026-01-03T00:00:00", "", ""]
+
+
+def test_write_csv_without_users(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "iter_user_export", lambda batch_size=5000: iter(()))
+    path = tmp_path / "users.csv.gz"
+    assert user_export.write_csv(str(path)) == 0
+    assert read_export(path) == [list(db.EXPORT_COLUMNS)]
+
+
+def test_write_csv_from_database(tmp_path):
+    db.add_user(900001, "exporter", "Export")
+    db.add_user(900002, None, "Free")
+    db.add_premium(900001, 7, 'ch2')
+    path = tmp_path / "users.csv.gz"
+
+    user_export.write_csv(str(path))
+    rows = {(row[0], row[4]) for row in read_export(path)[1:] if row[0] in ("900001", "900002")}
+    assert rows == {("900001", "ch2"), ("900002", "")}
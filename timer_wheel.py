@@ -0,0 +1,84 @@
+# ==============================================
+# HASHED TIMER WHEEL
+# ==============================================
+# Keeps many deadlines in memory and fires them in batches without polling
+# the database. Each key lives in the slot of its due tick; every tick only
+# the current slot is inspected, so scheduling, rescheduling and
+# cancelling are O(1) no matter how many timers are pending.
+import asyncio
+import inspect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TimerWheel:
+    """Timer wheel firing `callback(list of (key, payload))` once per tick with all due keys.
+
+    Args:
+        callback: Called with the batch of due timers (may be a coroutine function)
+        tick: Seconds per tick - timers fire at most this late
+        slots: Number of wheel slots; timers further out than one rotation
+            simply stay in their slot until their tick comes around
+    """
+
+    def __init__(self, callback, tick: float = 1.0, slots: int = 512):
+        self.callback = callback
+        self.tick = tick
+        self.slots = slots
+        self._wheel = [set() for _ in range(slots)]
+        self._timers = {}  # key -> (due_tick, payload)
+        self._cursor = self._tick_of(time.time())
+
+    def _tick_of(self, when: float) -> int:
+        return int(when // self.tick)
+
+    def __len__(self) -> int:
+        return len(self._timers)
+
+    def __contains__(self, key) -> bool:
+        return key in self._timers
+
+    def schedule(self, key, when: float, payload=None):
+        """Fire `key` at unix time `when`, replacing any timer with the same key."""
+        self.cancel(key)
+        due_tick = max(self._tick_of(when), self._cursor)
+        self._timers[key] = (due_tick, payload)
+        self._wheel[due_tick % self.slots].add(key)
+
+    def cancel(self, key) -> bool:
+        """Remove a timer. Returns False if it was not scheduled."""
+        timer = self._timers.pop(key, None)
+        if timer is None:
+            return False
+        self._wheel[timer[0] % self.slots].discard(key)
+        return True
+
+    def advance(self, now: float = None) -> list:
+        """Move the wheel up to `now` and return the timers that became due."""
+        target = self._tick_of(time.time() if now is None else now)
+        due = []
+        while self._cursor <= target:
+            slot = self._wheel[self._cursor % self.slots]
+            for key in [k for k in slot if self._timers[k][0] <= self._cursor]:
+                slot.discard(key)
+                due.append((key, self._timers.pop(key)[1]))
+            self._cursor += 1
+            if not self._timers:
+                self._cursor = target + 1
+        return due
+
+    async def run(self):
+        """Tick forever, handing due timers to the callback."""
+        while True:
+            await asyncio.sleep(self.tick - time.time() % self.tick)
+            due = self.advance()
+            if not due:
+                continue
+            try:
+                result = self.callback(due)
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Timer wheel callback failed for {len(due)} timers: {e}")
@@ -0,0 +1,144 @@
+# ==============================================
+# TRANSACTION ID GENERATOR
+# ==============================================
+# Snowflake-style ids: 41 bits of milliseconds since ID_EPOCH, 10 bits of
+# worker id and 12 bits of per-millisecond sequence, written as 19 zero-padded
+# digits plus a Damm check digit:
+#
+#     TRX 0000123456789012345 7
+#         `- snowflake ------'  `- check digit
+#
+# Within a worker, (timestamp, sequence) never repeats because the timestamp
+# never goes backwards; across workers, the worker id bits differ because
+# each worker holds an exclusive worker id lease (see database.claim_worker_id).
+# A leased worker id is only used until the lease deadline: if renewals keep
+# failing, next_id() raises LeaseExpired rather than risk another worker
+# claiming the same id and minting identical ids.
+# Ids are generated without any database round trip, sort by creation time
+# as plain strings, and a mistyped digit or swapped pair of digits is
+# rejected by is_valid() before any lookup.
+import re
+import threading
+import time
+from datetime import datetime
+
+PREFIX = "TRX"
+
+# 2024-01-01 00:00:00 UTC in milliseconds
+ID_EPOCH = 1704067200000
+
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+ID_PATTERN = re.compile(r'TRX\d{20}')
+
+# Damm algorithm operation table (weakly totally anti-symmetric quasigroup)
+_DAMM = (
+    (0, 3, 1, 7, 5, 9, 8, 6, 4, 2),
+    (7, 0, 9, 2, 1, 5, 4, 8, 6, 3),
+    (4, 2, 0, 6, 8, 7, 1, 3, 5, 9),
+    (1, 7, 5, 0, 9, 8, 3, 4, 2, 6),
+    (6, 1, 2, 3, 0, 4, 5, 9, 7, 8),
+    (3, 6, 7, 4, 2, 0, 9, 5, 8, 1),
+    (5, 8, 6, 9, 7, 2, 0, 1, 3, 4),
+    (8, 9, 4, 5, 3, 6, 2, 0, 1, 7),
+    (9, 4, 3, 8, 6, 1, 7, 2, 0, 5),
+    (2, 5, 8, 1, 4, 3, 6, 7, 9, 0),
+)
+
+
+def check_digit(digits: str) -> str:
+    """Damm check digit - catches every single-digit error and adjacent swap."""
+    interim = 0
+    for d in digits:
+        interim = _DAMM[interim][int(d)]
+    return str(interim)
+
+
+def is_valid(trx_id: str) -> bool:
+    """Check format and check digit of a transaction ID without a DB lookup."""
+    if not ID_PATTERN.fullmatch(trx_id or ""):
+        return False
+    return check_digit(trx_id[len(PREFIX):]) == "0"
+
+
+def created_at(trx_id: str) -> datetime:
+    """Creation time encoded in a transaction ID."""
+    snowflake = int(trx_id[len(PREFIX):-1])
+    millis = (snowflake >> (WORKER_BITS + SEQUENCE_BITS)) + ID_EPOCH
+    return datetime.fromtimestamp(millis / 1000)
+
+
+def id_floor(when: datetime) -> str:
+    """Smallest transaction ID that could have been created at `when`.
+
+    Use as a range bound, e.g. `trx_id >= id_floor(start)`.
+    """
+    millis = max(0, int(when.timestamp() * 1000) - ID_EPOCH)
+    return f"{PREFIX}{millis << (WORKER_BITS + SEQUENCE_BITS):019d}"
+
+
+class LeaseExpired(RuntimeError):
+    """The worker id lease was not renewed in time - ids could collide."""
+
+
+class TrxIdGenerator:
+    """Monotonic, collision-free transaction ID generator for one worker.
+
+    Args:
+        worker_id: Fixed worker id (e.g. from WORKER_ID), or None to set one later
+        clock: Wall clock in seconds (time.time)
+        monotonic: Clock the lease deadline is measured on (time.monotonic)
+    """
+
+    def __init__(self, worker_id: int = None, clock=time.time, monotonic=time.monotonic):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._monotonic = monotonic
+        self._last_millis = 0
+        self._sequence = 0
+        self._lease_until = None
+        self.worker_id = None
+        if worker_id is not None:
+            self.set_worker_id(worker_id)
+
+    def set_worker_id(self, worker_id: int, lease_until: float = None):
+        """Use `worker_id` - if it is leased, only until `lease_until` (monotonic clock)."""
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        with self._lock:
+            self.worker_id = worker_id
+            self._lease_until = lease_until
+
+    def extend_lease(self, lease_until: float):
+        """Move the lease deadline after a successful renewal."""
+        with self._lock:
+            self._lease_until = lease_until
+
+    def next_id(self) -> str:
+        with self._lock:
+            if self.worker_id is None:
+                raise RuntimeError("Transaction ID worker id has not been assigned")
+            if self._lease_until is not None and self._monotonic() >= self._lease_until:
+                raise LeaseExpired(f"Lease on worker id {self.worker_id} expired")
+
+            millis = int(self._clock() * 1000) - ID_EPOCH
+            if millis <= self._last_millis:
+                # Same millisecond, or the clock stepped back: keep counting
+                # on the last timestamp so ids stay unique and ordered
+                millis = self._last_millis
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # Sequence exhausted - borrow the next millisecond
+                    millis += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_millis = millis
+
+            snowflake = (millis << (WORKER_BITS + SEQUENCE_BITS)) | (self.worker_id << SEQUENCE_BITS) | self._sequence
+
+        digits = f"{snowflake:019d}"
+        return f"{PREFIX}{digits}{check_digit(digits)}"
@@ -1,79 +1,101 @@
-import os
-import asyncio
-import logging
-
-from flask import Flask, request, Response
-from telegram import Update
-
-# Flask app for webhook
-flask_app = Flask(__name__)
-
-# Configure logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
-logger = logging.getLogger(__name__)
-
-# Get environment variables
-PORT = int(os.environ.get("PORT", 10000))
-WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
-
-# Import application after environment is set
-from bot import application
-
-# Global event loop for async operations
-loop = None
-
-
-@flask_app.route("/")
-def home():
-    """Health check endpoint."""
-    return "Bot is running!", 200
-
-
-@flask_app.route("/webhook", methods=["POST"])
-def webhook():
-    """Handle incoming webhook updates (sync wrapper)."""
-    global loop
-    try:
-        update = Update.de_json(request.get_json(force=True), application.bot)
-        # Run async process_update in the existing event loop
-        loop.run_until_complete(application.process_update(update))
-        return Response(status=200)
-    except Exception as e:
-        logger.error(f"Error processing update: {e}")
-        return Response(status=200)
-
-
-async def setup_webhook():
-    """Set up the webhook URL."""
-    if WEBHOOK_URL:
-        webhook_url = f"{WEBHOOK_URL}/webhook"
-        await application.bot.set_webhook(url=webhook_url)
-        logger.info(f"Webhook set to: {webhook_url}")
-    else:
-        logger.warning("WEBHOOK_URL not set! Set it in Render environment variables.")
-
-
-def main():
-    """Initialize and start the bot with webhook."""
-    global loop
-    
-    # Initialize the application
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-    
-    # Initialize bot
-    loop.run_until_complete(application.initialize())
-    
-    # Set webhook
-    loop.run_until_complete(setup_webhook())
-    
-    # Run Flask
-    logger.info(f"Starting web server on port {PORT}")
-    flask_app.run(host="0.0.0.0", port=PORT, debug=False)
-
-
-if __name__ == "__main__":
-    main()
+import os
+import asyncio
+import logging
+import threading
+
+from flask import Flask, request, Response, redirect
+from telegram import Update
+
+# Flask app for webhook
+flask_app = Flask(__name__)
+
+# Configure logging
+logging.basicConfig(
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    level=logging.INFO
+)
+logger = logging.getLogger(__name__)
+
+# Get environment variables
+PORT = int(os.environ.get("PORT", 10000))
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+
+# Import application after environment is set
+from bot import application, post_init, get_upi_link
+import app_settings
+import database as db
+import trx_ids
+
+# Global event loop for async operations - runs forever in a background
+# thread so the send scheduler and other background tasks keep running
+# between webhook requests
+loop = None
+
+
+@flask_app.route("/")
+def home():
+    """Health check endpoint."""
+    return "Bot is running!", 200
+
+
+@flask_app.route("/upi/<trx_id>")
+def upi_pay(trx_id):
+    """Open the payer's UPI app for a pending order, with the transaction ID as note.
+    
+    Telegram buttons only take http(s) links, so the payment screen links
+    here and this redirects to the upi://pay link.
+    """
+    order = db.get_order(trx_id) if trx_ids.is_valid(trx_id) else None
+    if not order or order['status'] != 'pending':
+        return "This payment link has expired.", 404
+    return redirect(get_upi_link(app_settings.current().upi_id, order['amount'], trx_id))
+
+
+@flask_app.route("/webhook", methods=["POST"])
+def webhook():
+    """Handle incoming webhook updates (sync wrapper)."""
+    global loop
+    try:
+        update = Update.de_json(request.get_json(force=True), application.bot)
+        # Run async process_update in the event loop thread
+        future = asyncio.run_coroutine_threadsafe(application.process_update(update), loop)
+        future.result()
+        return Response(status=200)
+    except Exception as e:
+        logger.error(f"Error processing update: {e}")
+        return Response(status=200)
+
+
+async def setup_webhook():
+    """Set up the webhook URL."""
+    if WEBHOOK_URL:
+        webhook_url = f"{WEBHOOK_URL}/webhook"
+        await application.bot.set_webhook(url=webhook_url, allowed_updates=Update.ALL_TYPES)
+        logger.info(f"Webhook set to: {webhook_url}")
+    else:
+        logger.warning("WEBHOOK_URL not set! Set it in Render environment variables.")
+
+
+def main():
+    """Initialize and start the bot with webhook."""
+    global loop
+    
+    # Initialize the application
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    
+    # Initialize bot
+    asyncio.run_coroutine_threadsafe(application.initialize(), loop).result()
+    asyncio.run_coroutine_threadsafe(post_init(application), loop).result()
+    
+    # Set webhook
+    asyncio.run_coroutine_threadsafe(setup_webhook(), loop).result()
+    
+    # Run Flask
+    logger.info(f"Starting web server on port {PORT}")
+    flask_app.run(host="0.0.0.0", port=PORT, debug=False)
+
+
+if __name__ == "__main__":
+    main()